@@ -0,0 +1,212 @@
+import ast
+import json
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.json_utils import load_json
+from utils.file_utils import get_file_fingerprint, has_file_changed, write_file_atomic
+
+# Index of @metadata decorators in python source code (see CodeParser in file_parser.py)
+# The source is parsed once with the ast module, every @metadata(...) call becomes one record keyed by its elementPath
+# NOTE: Only literal arguments are understood, the decorated code is never executed
+
+logger = logging.getLogger(__name__)
+
+# One @metadata(...) decorator. line is the line of the decorator inside the file (1-based)
+MetadataRecord = namedtuple("MetadataRecord", ["name", "value", "unit", "dataType", "metadataTag", "elementPath", "line"])
+
+# Parameters of 'def metadata(name, value, unit, dataType, metadataTag=None, elementPath=None)' in order
+METADATA_PARAMETERS = ["name", "value", "unit", "dataType", "metadataTag", "elementPath"]
+
+# Directories that are never scanned for source files (see SourceTreeIndex)
+SKIPPED_DIRECTORIES = {".git", "__pycache__", ".venv", "venv", ".tox", ".nox", "node_modules", ".mypy_cache", ".pytest_cache"}
+
+# Fewer changed files are parsed in one process (starting worker processes costs more)
+PARALLEL_PARSE_MIN_FILES = 64
+
+
+def parse_metadata(source, file_path="<code>"):
+    """
+    Returns all @metadata decorators of a python source as elementPath -> MetadataRecord
+    Positional and keyword arguments, single/double quotes and decorators over multiple lines are supported.
+    Without elementPath the path is '<class or function name>.<name>' (same as the generated 'def metadata')
+    The first decorator of an elementPath wins
+
+    Parameters:
+        source : String. Python source code
+        file_path : String. Only used for messages
+
+    Returns:
+        Dictionary. elementPath -> MetadataRecord, empty if the source is not valid python
+    """
+    try:
+        tree = ast.parse(source, filename=file_path)
+    except (SyntaxError, ValueError) as e:
+        logger.error(f"Error parsing python source {file_path}: {e}")
+        return {}
+
+    records = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for decorator in node.decorator_list:
+            record = _get_metadata_record(decorator, node.name)
+            if record is not None:
+                records.setdefault(record.elementPath, record)
+    # ast.walk is breadth-first, keep the records in source order
+    return dict(sorted(records.items(), key=lambda item: item[1].line))
+
+
+def _get_metadata_record(decorator, owner_name):
+    # Returns the MetadataRecord of a '@metadata(...)' / '@module.metadata(...)' decorator or None
+    if not isinstance(decorator, ast.Call):
+        return None
+    function = decorator.func
+    function_name = function.id if isinstance(function, ast.Name) else getattr(function, "attr", None)
+    if function_name != "metadata":
+        return None
+
+    arguments = dict(zip(METADATA_PARAMETERS, decorator.args))
+    arguments.update({keyword.arg: keyword.value for keyword in decorator.keywords if keyword.arg in METADATA_PARAMETERS})
+    values = {}
+    for parameter in METADATA_PARAMETERS:
+        if parameter not in arguments:
+            values[parameter] = None
+            continue
+        try:
+            values[parameter] = ast.literal_eval(arguments[parameter])
+        except (ValueError, TypeError, SyntaxError): # e.g. variable or function call
+            values[parameter] = None
+    if values["name"] is None:
+        return None
+    if not values["elementPath"]:
+        values["elementPath"] = f"{owner_name}.{values['name']}"
+    return MetadataRecord(line=decorator.lineno, **values)
+
+
+class SourceTreeIndex:
+    """
+    Global index of the @metadata decorators of all python files below a directory (e.g. firmware or tooling repository)
+    The index is persisted as JSON, refresh() only parses files that have changed since the last run 
+    (new/changed files in worker processes, see PARALLEL_PARSE_MIN_FILES) and drops removed files
+    Lookups use refresh_if_stale(), the directory is only walked again after invalidate() (e.g. once per synchronization)
+
+    Attributes:
+        root : String. Directory that is scanned
+        index_file_path : String. JSON file of the persisted index 
+            {"root", "files": {path: {"fingerprint", "records": [[name, value, unit, dataType, metadataTag, elementPath, line]]}}}
+        workers : Integer. Number of processes for parsing, default is the number of CPU cores
+        elements : Dictionary. elementPath -> (file path, MetadataRecord), the first file (sorted by path) wins
+        stale : Bool. True until the first refresh and after invalidate()
+    """
+
+    def __init__(self, root, index_file_path, workers=None):
+        self.logger = logging.getLogger(__name__ + "-SourceTreeIndex")
+        self.root = os.path.abspath(root)
+        self.index_file_path = index_file_path
+        self.workers = workers
+        self.files = None # path -> {"fingerprint", "records"} (same as the persisted index), loaded on first refresh
+        self.elements = {}
+        self.stale = True
+
+    def refresh(self):
+        """
+        Walks the directory, parses new/changed files and writes the index if something has changed
+
+        Returns:
+            Integer. Number of parsed files
+        """
+        if self.files is None:
+            self.files = self.load()
+
+        changed = False
+        current_paths = set(self.iter_source_files())
+        for file_path in [file_path for file_path in self.files if file_path not in current_paths]:
+            del self.files[file_path]
+            changed = True
+        changed_paths = [file_path for file_path in sorted(current_paths)
+                         if file_path not in self.files or has_file_changed(file_path, self.files[file_path]["fingerprint"])]
+
+        for file_path, fingerprint, records in self.parse_files(changed_paths):
+            if fingerprint is None: # file could not be read
+                self.files.pop(file_path, None)
+            else:
+                self.files[file_path] = {"fingerprint": fingerprint, "records": records}
+            changed = True
+
+        if changed:
+            self.save()
+        self.build_elements()
+        self.stale = False
+        return len(changed_paths)
+
+    def refresh_if_stale(self):
+        """ Refreshes the index only if it has not been refreshed since the last invalidate(). Returns the number of parsed files """
+        return self.refresh() if self.stale else 0
+
+    def invalidate(self):
+        """ Marks the index as outdated, the next refresh_if_stale() walks the directory again """
+        self.stale = True
+
+    def iter_source_files(self):
+        """ Yields the paths of all python files below root (skips SKIPPED_DIRECTORIES) """
+        for directory, directory_names, file_names in os.walk(self.root):
+            directory_names[:] = [name for name in directory_names if name not in SKIPPED_DIRECTORIES]
+            for file_name in file_names:
+                if file_name.endswith(".py"):
+                    yield os.path.join(directory, file_name)
+
+    def parse_files(self, file_paths):
+        """ Returns (file path, fingerprint, records) of the given files, parsed in worker processes if there are many """
+        workers = self.workers or os.cpu_count() or 1
+        if len(file_paths) >= PARALLEL_PARSE_MIN_FILES and workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    return list(executor.map(_parse_file, file_paths, chunksize=max(1, len(file_paths) // (workers * 4))))
+            except (OSError, RuntimeError) as e: # e.g. no worker processes allowed, BrokenProcessPool
+                self.logger.warning(f"Parallel parsing of {self.root} failed, parsing in one process: {e}")
+        return [_parse_file(file_path) for file_path in file_paths]
+
+    def build_elements(self):
+        self.elements = {}
+        for file_path in sorted(self.files):
+            for record in self.files[file_path]["records"]:
+                record = MetadataRecord(*record)
+                if record.elementPath in self.elements:
+                    self.logger.warning(f"Duplicate elementPath {record.elementPath} in {file_path}, using {self.elements[record.elementPath][0]}")
+                    continue
+                self.elements[record.elementPath] = (file_path, record)
+
+    def get(self, elementPath):
+        """ Returns (file path, MetadataRecord) of an elementPath or None. Call refresh_if_stale() before to see file changes """
+        return self.elements.get(elementPath)
+
+    def load(self):
+        """ Loads the persisted index, an index of another root directory is ignored """
+        if not os.path.exists(self.index_file_path):
+            return {}
+        index = load_json(file_path=self.index_file_path)
+        if not isinstance(index, dict) or index.get("root") != self.root:
+            return {}
+        return index.get("files", {})
+
+    def save(self):
+        """ Writes the index (see index_file_path). Returns True if successful """
+        directory = os.path.dirname(self.index_file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return write_file_atomic(self.index_file_path, json.dumps({"root": self.root, "files": self.files}, default=str))
+
+
+def _parse_file(file_path):
+    # Worker process: reads one source file and returns its records as plain lists (cheap to send back and to store as JSON)
+    try:
+        with open(file_path, "rb") as file:
+            content = file.read()
+    except OSError as e:
+        logger.error(f"Error reading source file {file_path}: {e}")
+        return file_path, None, []
+    records = parse_metadata(content.decode("utf-8", errors="replace"), file_path=file_path)
+    return file_path, get_file_fingerprint(file_path, content=content), [list(record) for record in records.values()]
@@ -0,0 +1,341 @@
+import logging
+import operator
+from collections import namedtuple
+from functools import lru_cache
+
+from sysml_syntax import tokenize
+
+# Compiler for the expressions of SysMLv2 constraint defs e.g. 'sum(partMasses) <= massLimit' (see SysmlParser.verify_constraint)
+# An expression is parsed once (Pratt parser) into nested closures, evaluating it is a plain function call
+# Numbers carry their unit (e.g. '1000[g]' -> Quantity(1000.0, "g")), units of the same quantity (e.g. g and kg) are converted
+# NOTE: Only a subset of the SysMLv2 expression language is supported: arithmetic, comparisons, and/or/not,
+# feature references (e.g. 'fc.mass'), collections '(a, b, c)' and the functions inside FUNCTIONS
+
+logger = logging.getLogger(__name__)
+
+
+class ConstraintError(ValueError):
+    """ Raised if an expression cannot be compiled or evaluated (syntax, unknown reference, incompatible units) """
+
+
+# Number with unit, unit is "" for dimensionless numbers
+Quantity = namedtuple("Quantity", ["value", "unit"])
+
+# Compiled expression. evaluate(environment) returns the value, environment maps each reference
+# (tuple of names e.g. ('fc', 'mass')) to a function without arguments that returns its value.
+# If the expression is a comparison, operator is e.g. '<=' and left/right evaluate the operands
+CompiledExpression = namedtuple("CompiledExpression", ["text", "evaluate", "references", "operator", "left", "right"])
+
+# Units that can be converted into each other: unit -> (base unit, factor to the base unit)
+UNIT_FACTORS = {
+    "mg": ("g", 0.001), "g": ("g", 1.0), "kg": ("g", 1000.0), "t": ("g", 1e6),
+    "mm": ("m", 0.001), "cm": ("m", 0.01), "dm": ("m", 0.1), "m": ("m", 1.0), "km": ("m", 1000.0),
+    "ms": ("s", 0.001), "s": ("s", 1.0), "min": ("s", 60.0), "h": ("s", 3600.0),
+    "mA": ("A", 0.001), "A": ("A", 1.0),
+    "mV": ("V", 0.001), "V": ("V", 1.0), "kV": ("V", 1000.0),
+    "mW": ("W", 0.001), "W": ("W", 1.0), "kW": ("W", 1000.0),
+    "Hz": ("Hz", 1.0), "kHz": ("Hz", 1000.0), "MHz": ("Hz", 1e6), "GHz": ("Hz", 1e9),
+}
+
+COMPARISONS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "==": operator.eq, "!=": operator.ne}
+
+# Binding power of the infix operators (higher binds stronger), '**' and '^' are right associative
+BINDING_POWERS = {"or": 10, "xor": 15, "and": 20, **{symbol: 30 for symbol in COMPARISONS},
+                  "+": 40, "-": 40, "*": 50, "/": 50, "%": 50, "**": 60, "^": 60}
+NOT_BINDING_POWER = 25 # 'not a <= b' is 'not (a <= b)'
+UNARY_BINDING_POWER = 55 # '-a * b' is '(-a) * b', '-a ** 2' is '-(a ** 2)'
+
+
+def convert(quantity, unit):
+    """ Returns a quantity in another unit (e.g. 1.2[kg] -> 1200[g]), raises ConstraintError if the units are not compatible """
+    if quantity.unit == unit:
+        return quantity
+    source, target = UNIT_FACTORS.get(quantity.unit), UNIT_FACTORS.get(unit)
+    if source is None or target is None or source[0] != target[0]:
+        raise ConstraintError(f"Incompatible units: [{quantity.unit}] and [{unit}]")
+    return Quantity(quantity.value * source[1] / target[1], unit)
+
+
+def compare(symbol, left, right):
+    """ Compares two values with a comparison operator (e.g. '<='), quantities are converted to the unit of left """
+    if isinstance(left, Quantity) or isinstance(right, Quantity) or isinstance(left, list) or isinstance(right, list):
+        left, right = _as_number(left), _as_number(right)
+        return COMPARISONS[symbol](left.value, convert(right, left.unit).value)
+    if symbol not in ("==", "!="):
+        raise ConstraintError(f"Cannot compare {format_value(left)} {symbol} {format_value(right)}")
+    return COMPARISONS[symbol](left, right)
+
+
+def format_value(value):
+    """ Text of a value for messages e.g. '895[g]', '(50[g], 60[g])' or 'true' """
+    if isinstance(value, Quantity):
+        number = "%d" % value.value if float(value.value).is_integer() else str(value.value)
+        return f"{number}[{value.unit}]" if value.unit else number
+    if isinstance(value, list):
+        return "(" + ", ".join(format_value(item) for item in value) + ")"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return repr(value)
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(text):
+    """
+    Compiles an expression once, the result is cached per text (constraint defs and attribute values are compiled only once)
+
+    Parameters:
+        text : String. Expression e.g. 'sum(partMasses) <= massLimit' or '(fc.mass, motor.mass)'
+
+    Returns:
+        CompiledExpression. Raises ConstraintError if the text is not a valid expression
+    """
+    parser = _ExpressionParser(text)
+    evaluate = parser.parse()
+    if parser.peek() is not None:
+        token = parser.peek()
+        raise ConstraintError(f"Unexpected '{token.value}' at offset {token.start} in expression: {text}")
+    symbol, left, right = parser.comparisons.get(evaluate, (None, None, None))
+    return CompiledExpression(text, evaluate, frozenset(parser.references), symbol, left, right)
+
+
+class _ExpressionParser:
+    """ Pratt parser that builds the closures of one expression (see compile_expression) """
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = [token for token in tokenize(text) if token.kind != "comment"]
+        self.position = 0
+        self.references = set()
+        self.comparisons = {} # closure of a comparison -> (operator, left, right)
+
+    def peek(self, offset=0):
+        position = self.position + offset
+        return self.tokens[position] if position < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise ConstraintError(f"Unexpected end of expression: {self.text}")
+        self.position += 1
+        return token
+
+    def expect(self, value):
+        token = self.next()
+        if token.value != value:
+            raise ConstraintError(f"Expected '{value}' instead of '{token.value}' at offset {token.start} in expression: {self.text}")
+        return token
+
+    def parse(self, binding_power=0):
+        left = self.parse_prefix(self.next())
+        while True:
+            symbol = self.get_infix_operator()
+            if symbol is None or BINDING_POWERS[symbol] <= binding_power:
+                return left
+            self.position += 2 if symbol == "**" else 1
+            # right associative operators parse their right side with a lower binding power
+            right = self.parse(BINDING_POWERS[symbol] - (1 if symbol in ("**", "^") else 0))
+            left = self.build_infix(symbol, left, right)
+
+    def get_infix_operator(self):
+        token = self.peek()
+        if token is None or token.kind not in ("symbol", "name"):
+            return None
+        following = self.peek(1)
+        if token.value == "*" and following is not None and following.value == "*" and following.start == token.end:
+            return "**"
+        return token.value if token.value in BINDING_POWERS else None
+
+    def parse_prefix(self, token):
+        if token.kind == "number":
+            quantity = Quantity(float(token.value), self.parse_unit())
+            return lambda environment: quantity
+        if token.kind == "string":
+            text = token.value[1:-1]
+            return lambda environment: text
+        if token.value == "(":
+            return self.parse_parenthesis()
+        if token.value in ("-", "+"):
+            operand = self.parse(UNARY_BINDING_POWER)
+            if token.value == "+":
+                return lambda environment: _as_number(operand(environment))
+            def negate(environment):
+                value = _as_number(operand(environment))
+                return Quantity(-value.value, value.unit)
+            return negate
+        if token.kind != "name":
+            raise ConstraintError(f"Unexpected '{token.value}' at offset {token.start} in expression: {self.text}")
+        if token.value in ("true", "false"):
+            value = token.value == "true"
+            return lambda environment: value
+        if token.value == "not":
+            operand = self.parse(NOT_BINDING_POWER)
+            return lambda environment: not _as_bool(operand(environment))
+
+        # Feature reference 'fc.mass' / 'Parts::fc' or function call 'sum(...)'
+        path = [token.value]
+        while self.peek() is not None and self.peek().value in (".", "::") \
+                and self.peek(1) is not None and self.peek(1).kind == "name":
+            path.append(self.peek(1).value)
+            self.position += 2
+        if self.peek() is not None and self.peek().value == "(":
+            return self.parse_call(path)
+        return self.build_reference(tuple(path))
+
+    def parse_unit(self):
+        # '1000[g]' -> 'g', the unit is taken as written up to the closing ']' (e.g. '1/min^-1' or 'milli*W')
+        token = self.peek()
+        if token is None or token.value != "[":
+            return ""
+        self.position += 1
+        start = token.end
+        while self.next().value != "]":
+            pass
+        return self.text[start:self.tokens[self.position - 1].start].strip()
+
+    def parse_parenthesis(self):
+        # '(a)' is a group, '(a, b, c)' and '()' are collections
+        items = []
+        is_collection = False
+        while self.peek() is not None and self.peek().value != ")":
+            items.append(self.parse())
+            if self.peek() is not None and self.peek().value == ",":
+                self.position += 1
+                is_collection = True
+        self.expect(")")
+        if len(items) == 1 and not is_collection:
+            return items[0]
+        return lambda environment: [item(environment) for item in items]
+
+    def parse_call(self, path):
+        function = FUNCTIONS.get(path[-1])
+        if function is None:
+            raise ConstraintError(f"Unknown function '{'::'.join(path)}' in expression: {self.text}")
+        self.expect("(")
+        arguments = []
+        while self.peek() is not None and self.peek().value != ")":
+            arguments.append(self.parse())
+            if self.peek() is not None and self.peek().value == ",":
+                self.position += 1
+        self.expect(")")
+        return lambda environment: function(*[argument(environment) for argument in arguments])
+
+    def build_reference(self, path):
+        self.references.add(path)
+        def reference(environment):
+            try:
+                getter = environment[path]
+            except KeyError:
+                raise ConstraintError(f"Unknown reference: {'.'.join(path)}") from None
+            return getter()
+        return reference
+
+    def build_infix(self, symbol, left, right):
+        if symbol in COMPARISONS:
+            def comparison(environment):
+                return compare(symbol, left(environment), right(environment))
+            self.comparisons[comparison] = (symbol, left, right)
+            return comparison
+        if symbol == "and":
+            return lambda environment: _as_bool(left(environment)) and _as_bool(right(environment))
+        if symbol == "or":
+            return lambda environment: _as_bool(left(environment)) or _as_bool(right(environment))
+        if symbol == "xor":
+            return lambda environment: _as_bool(left(environment)) != _as_bool(right(environment))
+        arithmetic = ARITHMETIC[symbol]
+        return lambda environment: arithmetic(_as_number(left(environment)), _as_number(right(environment)))
+
+
+def _as_number(value):
+    if isinstance(value, list):
+        if len(value) == 1:
+            return _as_number(value[0])
+        raise ConstraintError(f"Collection of {len(value)} values used as single value: {format_value(value)}")
+    if not isinstance(value, Quantity):
+        raise ConstraintError(f"Not a number: {format_value(value)}")
+    return value
+
+
+def _as_bool(value):
+    if not isinstance(value, bool):
+        raise ConstraintError(f"Not a boolean: {format_value(value)}")
+    return value
+
+
+def _combine_units(left, right, symbol):
+    if not right:
+        return left
+    if not left:
+        return right if symbol == "*" else f"1/{right}"
+    return f"{left}{symbol}{right}"
+
+
+def _add(left, right):
+    return Quantity(left.value + convert(right, left.unit).value, left.unit)
+
+
+def _subtract(left, right):
+    return Quantity(left.value - convert(right, left.unit).value, left.unit)
+
+
+def _multiply(left, right):
+    return Quantity(left.value * right.value, _combine_units(left.unit, right.unit, "*"))
+
+
+def _divide(left, right):
+    if left.unit and right.unit and (left.unit == right.unit or left.unit in UNIT_FACTORS and right.unit in UNIT_FACTORS):
+        right = convert(right, left.unit) # e.g. 500[g] / 1[kg] -> 0.5
+        unit = ""
+    else:
+        unit = _combine_units(left.unit, right.unit, "/")
+    if right.value == 0:
+        raise ConstraintError("Division by zero")
+    return Quantity(left.value / right.value, unit)
+
+
+def _modulo(left, right):
+    right = convert(right, left.unit)
+    if right.value == 0:
+        raise ConstraintError("Division by zero")
+    return Quantity(left.value % right.value, left.unit)
+
+
+def _power(left, right):
+    if right.unit:
+        raise ConstraintError(f"Exponent has a unit: {format_value(right)}")
+    return Quantity(left.value ** right.value, f"{left.unit}^{format_value(right)}" if left.unit else "")
+
+
+ARITHMETIC = {"+": _add, "-": _subtract, "*": _multiply, "/": _divide, "%": _modulo, "**": _power, "^": _power}
+
+
+def _flatten(values):
+    # sum(a, (b, c)) and sum((a, b, c)) are the same
+    for value in values:
+        if isinstance(value, list):
+            yield from _flatten(value)
+        else:
+            yield _as_number(value)
+
+
+def _sum(*values):
+    total = None
+    for value in _flatten(values):
+        total = value if total is None else _add(total, value)
+    return total if total is not None else Quantity(0.0, "")
+
+
+def _extreme(function, values):
+    values = list(_flatten(values))
+    if not values:
+        raise ConstraintError(f"{function.__name__}() of an empty collection")
+    unit = values[0].unit
+    return Quantity(function(convert(value, unit).value for value in values), unit)
+
+
+FUNCTIONS = {
+    "sum": _sum,
+    "min": lambda *values: _extreme(min, values),
+    "max": lambda *values: _extreme(max, values),
+    "abs": lambda value: Quantity(abs(_as_number(value).value), _as_number(value).unit),
+    "size": lambda *values: Quantity(float(len(list(_flatten(values)))), ""),
+}
@@ -2,18 +2,147 @@ import logging
 import re #regex for parsing 
 import os
 import json
+import hashlib
+from functools import lru_cache
 
-from utils.json_utils import load_json, save_json
+from utils.json_utils import load_json
 from utils.config_utils import load_config
+from utils.file_utils import FileCache, write_file_atomic, get_file_fingerprint
+from sysml_syntax import SysmlModel
+from constraint_expression import ConstraintError, compile_expression, compare, format_value
+
+from code_metadata import parse_metadata, SourceTreeIndex
+from step_index import StepIndex, format_parameter, format_parameter_value, get_parameter, get_parameter_span, find_parameter
 
 # Libraries CodeParser
 import jinja2
 
 # Contains all standardized (for this masters thesis) file parser as a single class for each file format 
 # Each class should have methods to read, load, save, and extract metadata 
-# NOTE: Some have additional writing to mapping.json due to extending information inside the mapping e.g. index from STEP
+# NOTE: File parsers only read domain files, additional information inside the mapping (e.g. index from STEP) is written by the MetadataManager
 # Use 'json_utils' to standardize json file handling such as reading, writing and saving JSON files 
 
+def load_sysml_file(file_path, content, fingerprint):
+    """ 
+    Loader for SYSML_MODEL_CACHE. Decodes the raw file content and parses it into a SysmlModel 
+    If a previous version of the file is cached, only the changed part is parsed again (see SysmlModel.reparse)
+    """
+    # Same newline handling as reading in text mode
+    text = content.decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+    previous_model = SYSML_MODEL_CACHE.get_latest(file_path)
+    if previous_model is not None:
+        return previous_model.reparse(text, fingerprint=fingerprint).commit()
+    return SysmlModel(text, fingerprint=fingerprint)
+
+# Parsed SysML models shared by all SysmlParser instances (GUI popups, CodeParser, MetadataManager)
+# Keyed by (path, mtime, size, content hash), so reopening a popup on an unchanged model does not parse it again
+SYSML_MODEL_CACHE = FileCache(loader=load_sysml_file, max_entries=16, max_bytes=128 * 1024 * 1024)
+
+def load_step_index(file_path, content, fingerprint):
+    """ Loader for STEP_INDEX_CACHE. Memory-maps the STEP file, HEADER and DATA index are read on first access """
+    return StepIndex.from_file(file_path, fingerprint=fingerprint)
+
+# Entity indexes of STEP files shared by all StepParser instances, keyed by (path, mtime, size)
+# STEP files are not read into memory (read_content=False) but memory-mapped by the StepIndex. They are not hashed
+# either (hash_content=False), so HEADER lookups do not read the DATA section
+STEP_INDEX_CACHE = FileCache(loader=load_step_index, max_entries=4, max_bytes=1024 * 1024 * 1024, read_content=False, hash_content=False)
+
+def load_gerber_job_file(file_path, content, fingerprint):
+    """ Loader for GERBER_JOB_CACHE. Parses the JSON content of a GerberJobFile, None if it is not valid JSON """
+    try:
+        return json.loads(content.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        logging.getLogger(__name__ + "-GerberParser").error(f"Error decoding JSON from {file_path}: {e}")
+        return None
+
+# Parsed GerberJobFiles shared by all GerberParser instances, keyed like SYSML_MODEL_CACHE
+# NOTE: cached data is shared, it must not be changed by the caller
+GERBER_JOB_CACHE = FileCache(loader=load_gerber_job_file, max_entries=32, max_bytes=64 * 1024 * 1024)
+
+# One key (e.g. "GeneralSpecs") or list index (e.g. "[0]") of a GerberJobFile element path
+_GERBER_PATH_PATTERN = re.compile(r"\.?([^.\[\]]+)|\[(\d+)\]")
+
+@lru_cache(maxsize=4096)
+def compile_gerber_path(elementPath):
+    """
+    Splits a GerberJobFile element path once into dictionary keys and list indexes 
+    e.g. "DesignRules[0].PadToPad" -> ("DesignRules", 0, "PadToPad")
+
+    Returns:
+        Tuple of keys (str) and indexes (int), None if the path is not valid 
+    """
+    keys = []
+    position = 0
+    for match in _GERBER_PATH_PATTERN.finditer(elementPath):
+        if match.start() != position or (match.group(1) is not None and keys and match.group(0)[0] != "."):
+            return None
+        keys.append(match.group(1) if match.group(1) is not None else int(match.group(2)))
+        position = match.end()
+    if not keys or position != len(elementPath) or elementPath.startswith("."):
+        return None
+    return tuple(keys)
+
+def load_code_metadata(file_path, content, fingerprint):
+    """ Loader for CODE_METADATA_CACHE. Parses the python source once into elementPath -> MetadataRecord (see code_metadata.py) """
+    return parse_metadata(content.decode("utf-8", errors="replace"), file_path=file_path)
+
+# @metadata indexes of source code files shared by all CodeParser instances, keyed like SYSML_MODEL_CACHE
+CODE_METADATA_CACHE = FileCache(loader=load_code_metadata, max_entries=256, max_bytes=256 * 1024 * 1024)
+
+# Marker inside the first line of every generated source file, only files with it are removed by the code generation
+GENERATED_CODE_MARKER = "Generated from SysMLv2 model"
+
+# Code generation templates, one folder per target language e.g. templates/python/, templates/c/
+# Templates named 'part.<extension>.j2' are rendered for every tagged part (<part name>.<extension>),
+# all other templates once for all parts (e.g. __init__.py.j2 -> __init__.py)
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+TEMPLATE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "template_cache") # Compiled templates (jinja2 bytecode cache) shared between program runs
+
+_TEMPLATE_ENVIRONMENT = None
+
+def get_template_environment():
+    """
+    Returns the jinja2 environment of the code generation, created on first use
+    Templates are compiled once per process, the bytecode is cached in TEMPLATE_CACHE_DIR for later runs
+    """
+    global _TEMPLATE_ENVIRONMENT
+    if _TEMPLATE_ENVIRONMENT is None:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+        _TEMPLATE_ENVIRONMENT = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+            bytecode_cache=jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+            keep_trailing_newline=True
+        )
+        _TEMPLATE_ENVIRONMENT.filters["c_string"] = format_c_string
+    return _TEMPLATE_ENVIRONMENT
+
+def get_language_templates(language):
+    """ Returns the template names of a target language e.g. ["python/__init__.py.j2", "python/part.py.j2"] """
+    return get_template_environment().list_templates(filter_func=lambda name: name.startswith(f"{language}/") and name.endswith(".j2"))
+
+def format_c_string(value):
+    """ Template filter: value as C string literal e.g. fc "001" -> "fc \\"001\\"" """
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+def write_if_changed(file_path, content):
+    """ Writes content (text) to file_path only if the content hash differs from the file. Returns True if written """
+    encoded = content.encode("utf-8")
+    fingerprint = get_file_fingerprint(file_path) if os.path.exists(file_path) else None
+    if fingerprint is not None and fingerprint["hash"] == hashlib.sha1(encoded).hexdigest():
+        return False
+    return write_file_atomic(file_path, encoded, mode="wb")
+
+def is_generated_file(file_path):
+    """ True if the first line of the file contains GENERATED_CODE_MARKER """
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            return GENERATED_CODE_MARKER in file.readline()
+    except (OSError, UnicodeDecodeError):
+        return False
+
+# Indexes of whole source directories (see CodeParser.get_source_tree_index), root directory -> SourceTreeIndex
+SOURCE_TREE_INDEXES = {}
+
 class SysmlParser: 
     """ 
     Parses specific sysml files by getting "metadata" / "@" (abreviation) searching for a specific Structure
@@ -40,13 +169,63 @@ class SysmlParser:
             self.logger.error(f"No SysML model path provided.") 
             return
         
-        try:
-            with open(self.sysml_path, 'r') as file:
-                content = file.read()
-                #self.logger.debug(f"Successfully loaded sysml model")
-            return content
-        except Exception as e:
-            self.logger.error(f"Failed to load file {self.sysml_path}: {e}")
+        model = self.get_model()
+        if model is not None:
+            return model.content
+
+    def get_model(self, sysml_file_path=None):
+        """
+        Returns the parsed model (see sysml_syntax.py SysmlModel) of a sysml file from SYSML_MODEL_CACHE. 
+        The file is only read and parsed again if its modification time/size and content hash have changed,
+        otherwise the syntax tree and the qualified name index are reused by all query functions and all instances of this class
+
+        Parameters:
+            sysml_file_path : String. Optional other sysml file, default is self.sysml_path
+
+        Returns:
+            SysmlModel or None if the file cannot be loaded
+        """
+        file_path = sysml_file_path or self.sysml_path
+        if not file_path:
+            return None
+
+        model = SYSML_MODEL_CACHE.get(file_path)
+        if model is None:
+            self.logger.error(f"Failed to load file {file_path}")
+        elif file_path == self.sysml_path:
+            self.sysml_model = model.content
+        return model
+
+    def put_model(self, model, sysml_file_path=None):
+        """
+        Stores the model of content that has just been written to the sysml file (e.g. from SysmlModel.apply_edits),
+        so the file is not parsed again by the next query 
+
+        Parameters:
+            model : SysmlModel. Model of the current file content
+            sysml_file_path : String. Optional other sysml file, default is self.sysml_path
+        """
+        file_path = sysml_file_path or self.sysml_path
+        fingerprint = get_file_fingerprint(file_path)
+        if fingerprint is None:
+            return
+        model.fingerprint = fingerprint
+        SYSML_MODEL_CACHE.put(file_path, None, fingerprint, value=model.commit())
+
+    def get_syntax_tree(self, sysml_file_path=None):
+        """ Returns the root node of the syntax tree of the sysml model or None if the file cannot be loaded """
+        model = self.get_model(sysml_file_path)
+        return model.tree if model is not None else None
+
+    def get_element(self, elementPath, sysml_file_path=None):
+        """
+        Looks up an element by its fully qualified path e.g. 'DroneExample.PartDefinitions.Drone.fc'
+
+        Returns:
+            SysmlNode (with kind, declared_type, value and offsets) or None if not found
+        """
+        model = self.get_model(sysml_file_path)
+        return model.get_element(elementPath) if model is not None else None
 
     def check_metadata_exist(self): 
         """
@@ -61,33 +240,20 @@ class SysmlParser:
             List of of the found metadata definitions names or empty list if not found that structure
         """
         #self.logger.info(f"check_metadata_exist")
-        self.sysml_model = self.load_sysml_model() 
         # 1 Check if sysml model can be loaded from initialized class sysml model path 
-        if not self.sysml_model:
+        tree = self.get_syntax_tree()
+        if tree is None:
             self.logger.warning("No SysML model loaded.")
             return  
         # DEBUG 
         first_few_lines = "\n".join(self.sysml_model.splitlines()[:15]) # Only shows :x lines inside the app.log 
         self.logger.debug(f"Given SysML model: {first_few_lines}")
 
-        # Regex for 'metadata def <name>' and 'metadata def <name>{...}'
-        #metadata_def_pattern = r'metadata\s+def\s+(\w+)\s*(?=\s*(\{|\s*;))'
-        # ['\"] includes optinal ' or " for the name 
-        metadata_def_pattern = r"metadata\s+def\s+['\"]?(\w+)['\"]?\s*(?=\{)"
-
-        #metadata_def_pattern = r'metadata\s+def\s+(\w+)\s*(\{*.?\})?' # . represent any character 
-        metadata_def_matches = re.findall(metadata_def_pattern, self.sysml_model, re.DOTALL) #re.DOTALL includes line breaks
-
-        # Regex for '@<name> about' or 'metadata <name> about'
-        metadata_about_pattern = r"@(\w)\s+|metadata\s+(\w)['\"]?\s+about"
-        metadata_about_matches = re.findall(metadata_about_pattern, self.sysml_model, re.DOTALL)
-
-        self.logger.debug(f"metadata def matches: {metadata_def_matches}")
-        # Extract only the metadata names from the match results
-        metadata_names = [match for match in metadata_def_matches]
+        # Collect names of 'metadata def <name>{...}' (dict keeps the order and removes duplicates)
+        metadata_names = list(dict.fromkeys(
+            node.name for node in tree.iter_nodes() if node.kind == "metadata def" and node.name))
 
         self.logger.debug(f"'Metadata def' names: {metadata_names}")
-        #self.logger.debug(f"'Metadata about' matches: {metadata_about_matches}")
 
         # Return list containing found metadata def names 
         # OPTIONAL: Include about matches for the content 
@@ -99,107 +265,164 @@ class SysmlParser:
 
         Parameters: 
             metadata_name : String. Name of the metadata def to search for inside sysml model, if None is provided automatically searches for metadata def 
+
+        Returns:
+            Dictionary. Name of each tagged element -> list of attribute records (see get_attribute_record)
         """
         #self.logger.info(f"get_metadata_about_elements")
+        model = self.get_model()
+        result = {}
+        for tag, element in self.iter_tagged_elements(metadata_name=metadata_name):
+            # Add 'metadata tag' to know from which each tagged element is coming from 
+            result[element.name] = [self.get_attribute_record(attribute_node, metadata_path=element.name, metadata_tag=tag)
+                                    for attribute_node in self.get_tagged_attributes(element, model)]
+        return result
 
-        if not self.sysml_model:
-            self.logger.warning("No SysML model loaded. Trying to load model content")
-            self.sysml_model = self.load_sysml_model() 
+    def iter_metadata_elements(self, metadata_name = None):
+        """
+        Streams the attributes of all tagged elements (see iter_tagged_elements) without collecting them first
 
-        # NOTE: Currently assumes that we tag whole parts
-        # NOTE: later add attribute tags e.g. partA::id
-        # 2) Find attributes for each tagged part
-        result = {}
+        Parameters:
+            metadata_name : String. Name of the metadata def, if None all metadata defs of the model are used
 
-        if metadata_name is None: 
-            # Find metadata def { ... }
-            metadata_def_list = re.findall(r"\bmetadata\s+def\s+(\w+)\s*(?:\{[^}]*\}|;)", self.sysml_model) #\bmetadata\s+def\s+(\w+)\s*\{
-            #self.logger.debug(f"No specific metadata_name provided. Automatic search for 'metdata def' found: {metadata_def_list}")
-        else:
-            metadata_def_list = [metadata_name]
+        Returns:
+            Generator of (metadata tag, SysmlNode of the tagged element, attribute record (see get_attribute_record))
+        """
+        model = self.get_model()
+        for tag, element in self.iter_tagged_elements(metadata_name=metadata_name):
+            for attribute_node in self.get_tagged_attributes(element, model):
+                yield tag, element, self.get_attribute_record(attribute_node, metadata_path=element.name, metadata_tag=tag)
 
-        if not metadata_def_list: 
-            # automatic search did not found metadata def structure in sysml model 
-            self.logger.warning(f"No metadata definitions found in SysML model.")
-            return {}
+    def iter_tagged_elements(self, metadata_name = None):
+        """
+        Finds all elements tagged with '@<metadata> about a, b::c;' or 'metadata <metadata> about ...' in one visit of the syntax tree
+        Every target of every about clause is resolved (see SysmlModel.resolve_reference), 
+        so '::' qualified targets and nested parts (e.g. 'FlightController::pcb') are found as well 
+
+        Parameters:
+            metadata_name : String. Name of the metadata def, if None all metadata defs of the model are used
+
+        Returns:
+            Generator of (metadata tag, SysmlNode of the tagged element)
+        """
+        model = self.get_model()
+        if model is None:
+            self.logger.warning("No SysML model loaded.")
+            return
+
+        metadata_defs = set()
+        deferred_usages = [] # usages in front of the 'metadata def' of their tag
+        for node in model.tree.iter_nodes():
+            if node.kind == "metadata def" and node.name:
+                metadata_defs.add(node.name)
+            elif node.kind == "metadata" and node.about and (metadata_name is None or node.declared_type == metadata_name):
+                if node.declared_type in metadata_defs:
+                    yield from self._resolve_about_targets(model, node)
+                else:
+                    deferred_usages.append(node)
+
+        for node in deferred_usages:
+            if node.declared_type in metadata_defs:
+                yield from self._resolve_about_targets(model, node)
+            else:
+                self.logger.debug(f"No metadata def found for: {node.declared_type}")
+
+    def get_metadata_tag_index(self, nested=True):
+        """
+        Inverted index metadata tag -> text ranges of everything tagged with it, e.g. to highlight or filter tagged elements
+        The ranges cover the metadata usages ('@PCBDesign about ...;') and the tagged elements. 
+        Built once per model content, the ranges of a tag are sorted and overlapping ranges are merged
+
+        Parameters:
+            nested : Boolean. True: ranges include the nested block '{...}' of the tagged elements, False: only the declaration
 
-        all_elements = []
-        # Loop through all metadata defs 
-        for meta in metadata_def_list:
-            if not meta:
-                continue  # Falls meta None or empty continue 
-
-            # Search for `@<meta> about partA, partB; patterns 
-            metadata_about_pattern = (
-                r"@['\"]?" + re.escape(meta) + r"['\"]?\s+about\s*([\w\s,:;\-\.]+?)\s*;"
-            )
-            matches = re.findall(metadata_about_pattern, self.sysml_model, re.DOTALL)
-
-            elements = []
-            if matches:
-                elements_raw = matches[0]
-                elements = [e.strip().rstrip(';') for e in elements_raw.split(',') if e.strip()]
-                elements = [e.split('::')[-1] for e in elements]  # only last element of metadata tag
-
-            if not elements:
-                self.logger.debug(f"No matches found for metadata: {meta}")
+        Returns:
+            Dictionary. e.g. {'PCBDesign': [(start, end), ...]} with character offsets inside the model content 
+            (see SysmlModel.get_line_column), empty if no model is loaded
+        """
+        model = self.get_model()
+        if model is None:
+            self.logger.warning("No SysML model loaded.")
+            return {}
+        if nested in model.tag_indexes:
+            return model.tag_indexes[nested]
+
+        ranges = {}
+        for tag, element in self.iter_tagged_elements():
+            end = element.end if nested or element.body_span is None else element.body_span[0]
+            ranges.setdefault(tag, []).append((element.start, end))
+        for node in model.tree.iter_nodes():
+            if node.kind == "metadata" and node.declared_type in ranges:
+                ranges[node.declared_type].append((node.start, node.end))
+
+        tag_index = {}
+        for tag, tag_ranges in ranges.items():
+            merged = []
+            for start, end in sorted(tag_ranges):
+                if merged and start <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                else:
+                    merged.append((start, end))
+            tag_index[tag] = merged
+        model.tag_indexes[nested] = tag_index
+        return tag_index
+
+    def _resolve_about_targets(self, model, usage):
+        for target in usage.about:
+            element = model.resolve_reference(target, usage.parent)
+            if element is None:
+                self.logger.warning(f"Element '{target}' tagged with '{usage.declared_type}' not found in SysML model.")
                 continue
+            yield usage.declared_type, element
 
-            
-            #self.logger.debug(f"Found elements for '{meta}': {elements}")
-            all_elements.extend(elements)
-            #self.logger.debug(f"All elements: {all_elements}")
-            
+    def get_tagged_attributes(self, element, model=None):
+        """
+        Returns the attribute nodes with value of a tagged element 
+        Attributes of nested blocks (e.g. 'part def pcb {...}') belong to their own element. 
+        Part usages (e.g. 'part fc : FlightController;') get the attributes of their definition that are not redefined
+        NOTE: attributes without value (e.g. 'attribute mass : MassValue;') are skipped
 
-            # Search for attributes for each part inside tagged metadata 
-            for path in all_elements:
-                #self.logger.debug(f"Current metadata tag: {path}")
-                part_pattern = (
-                    r"part\s+def\s+" + re.escape(path) + r"\s*\{([^}]*)\}"
-                )
-                part_match = re.search(part_pattern, self.sysml_model, re.DOTALL)
-
-                attributes = []
-                if part_match:
-                    #self.logger.debug(f"Current Match: {part_match}")
-                    attributes_block = part_match.group(1)
-
-                    # Search for  `attribute name = value; 
-                    attr_pattern = r"attribute\s+(\w+)\s*=\s*([^;]+);"
-                    attr_matches = re.findall(attr_pattern, attributes_block)
-
-                    for attr_name, attr_value in attr_matches:
-                        unit = ""
-                        if "[" in attr_value and "]" in attr_value: # Unit detection 
-                            unit = attr_value[attr_value.index("[") + 1:attr_value.index("]")]
-                            attr_value = attr_value[:attr_value.index("[")].strip()
-
-                        # DataType
-                        attr_value = attr_value.strip().strip('"')
-                        if attr_value.startswith('"') or attr_value.isalpha():
-                            data_type = "string"
-                        elif "." in attr_value:
-                            data_type = "float"
-                        else:
-                            data_type = "int" if attr_value.isdigit() else "string"
-
-                        attributes.append({
-                            "name": attr_name,
-                            "value": attr_value,
-                            "unit": unit,
-                            "dataType": data_type,
-                            "metadata_path": path, # path inside the sysmlv2 model 
-                            "metadata_tag": meta # tag = namespace of the metadata def <namespace> aka <meta>
-                        })
-                        #self.logger.debug(f"Current attributes: {attributes}")
-                    
-                # Add 'metadata tag' to know from which each tagged element is coming from 
-                if meta not in result:
-                    result[path] = []
-                result[path].extend(attributes)
-
-        #self.logger.debug(f"Extracted metadata: {result}")
-        return result
+        Parameters:
+            element : SysmlNode. Tagged element (see iter_tagged_elements)
+            model : SysmlModel. Model of the element, default is the current model of self.sysml_path
+        """
+        model = model or self.get_model()
+        attribute_nodes = element.find_children("attribute")
+        if not element.kind.endswith(" def") and element.declared_type:
+            definition = model.resolve_reference(element.declared_type, element.parent)
+            if definition is not None and definition is not element:
+                names = {attribute_node.name for attribute_node in attribute_nodes}
+                attribute_nodes += [attribute_node for attribute_node in definition.find_children("attribute")
+                                    if attribute_node.name not in names]
+        return [attribute_node for attribute_node in attribute_nodes if attribute_node.value is not None]
+
+    def get_attribute_record(self, attribute_node, metadata_path, metadata_tag):
+        """ Helper function 
+        Converts an attribute node (e.g. 'attribute max_length = 12.2[mm];') into a dictionary with name, value, unit and dataType
+        """
+        attr_value = attribute_node.value
+        unit = ""
+        if "[" in attr_value and "]" in attr_value: # Unit detection 
+            unit = attr_value[attr_value.index("[") + 1:attr_value.index("]")]
+            attr_value = attr_value[:attr_value.index("[")].strip()
+
+        # DataType
+        attr_value = attr_value.strip().strip('"')
+        if attr_value.startswith('"') or attr_value.isalpha():
+            data_type = "string"
+        elif "." in attr_value:
+            data_type = "float"
+        else:
+            data_type = "int" if attr_value.isdigit() else "string"
+
+        return {
+            "name": attribute_node.name,
+            "value": attr_value,
+            "unit": unit,
+            "dataType": data_type,
+            "metadata_path": metadata_path, # path inside the sysmlv2 model 
+            "metadata_tag": metadata_tag # tag = namespace of the metadata def <namespace> aka <meta>
+        }
     
     def validate_elementPath(self, elementPath):
         """ 
@@ -209,63 +432,26 @@ class SysmlParser:
             BOOL. True if it exists, else False
         """
         #self.logger.info(f"validate_elementPath")
-
-        if not self.sysml_model:
-            self.logger.warning("SysML model is None! Attempting to load model.")
-            self.sysml_model = self.load_sysml_model()
-
-        path_splitted = elementPath.split('.')
-        self.logger.debug(f"Derived path: {path_splitted}")
-        valid_keywords = ["part def", "part", "attribute", "package"]
-
-        try:
-            #self.logger.debug(f"Opening SysMLv2 file with path: {self.sysml_path}")
-            with open(self.sysml_path, 'r') as sysml_file:
-                content = sysml_file.read()
-                # content = self.remove_comments(content)  # Remove comments for cleaner parsing
-        except FileNotFoundError:
+        model = self.get_model()
+        if model is None:
             self.logger.error(f"SysMLv2 File not found: {self.sysml_path}")
-            raise
+            raise FileNotFoundError(f"SysMLv2 File not found: {self.sysml_path}")
 
-        # Initialize current content and expected depth
-        current_content = content
-        expected_depth = 0
-
-        for index, partial_path in enumerate(path_splitted):
-            # Match the current element with valid keywords at the current depth
-            match = re.search(rf'({"|".join(valid_keywords)})\s+{re.escape(partial_path)}(\s*:\s*\w+)?\b', current_content)
-            #self.logger.debug(f"Current Match for '{partial_path}' at depth {expected_depth}: {match}")
-            
-            if not match:
-                self.logger.warning(f"Keyword '{partial_path}' not found or not preceded by valid keyword.")
-                return False
-
-            # Get remaining content after the current match
-            remaining_content = current_content[match.end():]
-            #self.logger.debug(f"Remaining content after '{partial_path}': {remaining_content}")
-
-            # Check if it's the last element and ensure we're not expecting further depth
-            if index == len(path_splitted) - 1:
-                # Final element must not expect further depth
-                # NOTE: We assume that the final element is an attribute or a semicolon
-                if "attribute" in match.group(1) or ";" in remaining_content:
-                    self.logger.debug(f"Final element '{partial_path}' is valid.")
-                    return True
-                else:
-                    self.logger.warning(f"Invalid final element structure for '{partial_path}'.")
-                    return False
-
-            # Look for opening to go one level deeper
-            open_brace_index = remaining_content.find('{')
+        valid_keywords = ["part def", "part", "attribute", "package"]
 
-            if open_brace_index != -1:
-                #self.logger.debug(f"Entering deeper level after '{partial_path}'.")
-                expected_depth += 1
-                current_content = remaining_content[open_brace_index + 1:]
-            else:
-                # If neither an opening nor a closing brace is found, the structure is invalid
-                self.logger.warning(f"Invalid structure: No valid braces after '{partial_path}'.")
+        # Single lookup inside the qualified name index
+        node = model.get_element(elementPath)
+        if node is None:
+            self.logger.warning(f"Element path '{elementPath}' not found in SysMLv2 model.")
+            return False
+
+        # Each element along the path has to be preceded by a valid keyword
+        current_node = node
+        while current_node is not None:
+            if current_node.name and current_node.kind not in valid_keywords:
+                self.logger.warning(f"Keyword '{current_node.name}' not preceded by valid keyword.")
                 return False
+            current_node = current_node.parent
 
         self.logger.debug(f"Path '{elementPath}' is valid in SysMLv2 model.")
         return True
@@ -273,80 +459,150 @@ class SysmlParser:
     def verify_constraint(self, sysml_file_path, constraint_name):
         """
         Searches SysMLv2 Model for constraint definitions and usages. 
-        If a constraint def is found, extract mathematical equation and search for the usage inside the model
-        Automatically 
+        The expression of the constraint def (e.g. 'sum(partMasses) <= massLimit') is evaluated for every usage 
+        with the values bound by the usage (e.g. 'in partMasses = (fc.mass, motor.mass);'), see compile_constraint
 
-        NOTE: Assumptions for the script to parse and verify constraint
-        
         Parameters: 
             constraint_name : String. namespace of constraint def usage 
 
         Returns:
-            Boolean. True if constraint is verified, else false 
+            String. One line per usage e.g. 'Constraint massCheck (895[g] <= 1000[g]) verified -> (TRUE)' or an error message
         """
         #self.logger.debug(f"verify_constraint")
+        try:
+            constraints = self.compile_constraint(constraint_name, sysml_file_path=sysml_file_path)
+        except ConstraintError as e:
+            self.logger.error(f"Could not compile constraint {constraint_name}: {e}")
+            return f"Verification failed: {e}"
 
-        # 1) Search sysmlv2 model for constraint def 
-        # 2) Search for constraint def usages 
-        # 3) Extract relevant information (attributes, parts, ...) for constraint usages 
-        # 4) Extract equation from constraint def 
-        # 5) Calculate mathematical equation from constraint def 
-        # 6) return Bool
-
-        # 1
-        constraint_def, constraint_content = self.find_constraint_definitions(sysml_file_path, constraint_name)
-        #self.logger.debug(f"Found: {constraint_def}")
-        #self.logger.debug(f"With content: {constraint_content}")
-        if not constraint_def or not constraint_content:
-            self.logger.error(f"No Constraint definition: {constraint_name} found or empty definition")
-            return "Could not find provided constraint name or empty constraint definition"
-        
-        # 2) Search for constraint def usages
-        constraint_usage, constraint_usage_content = self.find_constraint_usages(sysml_file_path, constraint_name)
-        if not constraint_usage or not constraint_usage_content:
-            self.logger.error(f"No usage found for constraint: {constraint_name}")
-            return "No usage found for the provided constraint"
-
-        # 3) Extract relevant information from constraint usage
-        constraint_usage_info = self.get_constraint_usage_information(constraint_usage_content)
-        #self.logger.debug(f"info: {constraint_usage_info}")
-        if not constraint_usage_info: 
-            self.logger.error(f"No usage information/description found for constraint: {constraint_name}")
-            return "No usage information found for the provided constraint"
-
-        # 4) Extract equation as a string
-        equation = self.get_constraint_def_equation(constraint_content)
-        if not equation:
-            self.logger.error(f"Could not extract equation from constraint: {constraint_name}")
-            return "Failed to extract equation from constraint definition"
-        
-        # 5) NOTE: for demonstration only one case will be verified
-        # FIXME: For later 
-        if "sum(partMasses)" in equation and "<=" in equation: 
+        messages = []
+        for usage_name, expression, environment in constraints:
             try:
-                part_masses = self.get_attribute_value(constraint_usage_info.get("partMasses", []), sysml_file_path=sysml_file_path)
-                #self.logger.debug(f"partMasses list: {part_masses}")
-                part_masses = sum(part_masses)
-                #self.logger.debug(f"partMasses summed up: {part_masses}")
-                # Get the numeric value from constraint usage information e.g. "massLimit" : "1000[g]"
-                mass_limit_str = constraint_usage_info.get("massLimit", "0[g]")
-                mass_limit = float(re.search(r"[-+]?\d*\.?\d+", mass_limit_str).group(0))
-                #self.logger.debug(f"MassLimit: {mass_limit}")
-
-                result = part_masses <= mass_limit
-                #self.logger.debug(f"Verification result: {result}")
-
-                if result:
-                    return f"Constraint ({part_masses} <= {mass_limit}) verified -> ({str(result).upper()})"
+                if expression.operator is not None:
+                    left, right = expression.left(environment), expression.right(environment)
+                    result = compare(expression.operator, left, right)
+                    equation = f"{format_value(left)} {expression.operator} {format_value(right)}"
                 else:
-                    return f"Constraint ({part_masses}) <= {mass_limit} violated -> ({str(result).upper()})"
-                
-            except ValueError as e:
-                self.logger.error(f"Error verifying equation: {e}")
-                return f"Verification failed: {str(e)}"
-            
-        # last return is an error
-        return "Unsupported equation type"
+                    result = expression.evaluate(environment)
+                    equation = expression.text
+                if not isinstance(result, bool):
+                    raise ConstraintError(f"Expression is not a condition: {expression.text}")
+            except ConstraintError as e:
+                self.logger.error(f"Error verifying constraint {usage_name}: {e}")
+                messages.append(f"Verification of {usage_name} failed: {e}")
+                continue
+            state = "verified" if result else "violated"
+            messages.append(f"Constraint {usage_name} ({equation}) {state} -> ({str(result).upper()})")
+        return "\n".join(messages)
+
+    def compile_constraint(self, constraint_name, sysml_file_path=None):
+        """
+        Compiles the expression of a 'constraint def' for all its usages. The result is cached per model content, 
+        so verifying a constraint again only evaluates closures (see constraint_expression.py)
+        References are resolved through the syntax tree: parameters of the def (e.g. 'in massLimit : MassValue;') get 
+        their value from the usage (e.g. 'in massLimit = 1000[g];') or from a default value inside the def, feature paths
+        (e.g. 'fc.mass') are resolved from the usage upwards and through the types of the parts (e.g. 'part fc : FlightController;').
+        Parts with multiplicity (e.g. 'part motor : Motor[4];') contribute one value per part, ranges (e.g. '[2..4]') their upper bound
+
+        Parameters:
+            constraint_name : String. Name of the constraint def
+            sysml_file_path : String. Optional other sysml file, default is self.sysml_path
+
+        Returns:
+            List of (usage name, CompiledExpression, environment). Raises ConstraintError if the constraint cannot be compiled
+        """
+        model = self.get_model(sysml_file_path)
+        if model is None:
+            raise ConstraintError(f"SysMLv2 File not found: {sysml_file_path or self.sysml_path}")
+        if constraint_name in model.constraints:
+            return model.constraints[constraint_name]
+
+        definition = next((node for node in model.tree.iter_nodes() 
+                           if node.kind == "constraint def" and node.name == constraint_name), None)
+        if definition is None:
+            raise ConstraintError(f"Could not find constraint definition: {constraint_name}")
+        # Result of a constraint def is its last expression
+        expression_node = next((node for node in reversed(definition.children) if node.kind == "expression"), None)
+        if expression_node is None:
+            raise ConstraintError(f"Failed to extract equation from constraint definition: {constraint_name}")
+        expression = compile_expression(model.get_text((expression_node.start, expression_node.end)))
+
+        usages = [node for node in model.tree.iter_nodes() if node.kind == "constraint" and node.declared_type == constraint_name]
+        if not usages:
+            raise ConstraintError(f"No usage found for constraint: {constraint_name}")
+
+        constraints = []
+        for usage in usages:
+            # Values of the parameters: binding inside the usage, else default value of the def
+            parameters = {node.name: node for node in definition.children if node.kind == "feature" and node.name}
+            parameters.update({node.name: node for node in usage.children if node.kind == "feature" and node.name and node.value is not None})
+            environment = {}
+            for reference in expression.references:
+                parameter = parameters.get(reference[0])
+                if parameter is None:
+                    environment[reference] = self._compile_feature_reference(model, reference, definition, set())
+                elif len(reference) > 1:
+                    raise ConstraintError(f"Features of parameter '{reference[0]}' are not supported: {'.'.join(reference)}")
+                elif parameter.value is None:
+                    raise ConstraintError(f"No value for parameter '{reference[0]}' in usage {usage.name} of {constraint_name}")
+                else:
+                    environment[reference] = self._compile_feature_value(model, parameter, set())
+            constraints.append((usage.name or constraint_name, expression, environment))
+
+        model.constraints[constraint_name] = constraints
+        return constraints
+
+    def _compile_feature_value(self, model, node, resolving):
+        # Returns a function that evaluates the value of a feature (e.g. '50[g]' or '(fc.mass, motor.mass)')
+        if id(node) in resolving:
+            raise ConstraintError(f"Circular reference: {node.qualified_name}")
+        resolving = resolving | {id(node)}
+        expression = compile_expression(node.value)
+        environment = {reference: self._compile_feature_reference(model, reference, node.parent, resolving)
+                       for reference in expression.references}
+        return lambda: expression.evaluate(environment)
+
+    def _compile_feature_reference(self, model, reference, scope, resolving):
+        # Resolves a feature path (e.g. ('motor', 'mass')) from scope and returns a function that evaluates its value
+        element = model.resolve_reference(reference[0], scope)
+        count = self._get_multiplicity(element) if element is not None else 1
+        for name in reference[1:]:
+            if element is None:
+                break
+            element = self._find_feature(model, element, name)
+            if element is not None:
+                count *= self._get_multiplicity(element)
+        if element is None:
+            raise ConstraintError(f"Unknown reference '{'.'.join(reference)}' in {scope.qualified_name}")
+        if element.value is None:
+            raise ConstraintError(f"'{'.'.join(reference)}' ({element.qualified_name}) has no value")
+
+        value = self._compile_feature_value(model, element, resolving)
+        if count == 1:
+            return value
+        return lambda: [value()] * count
+
+    def _find_feature(self, model, element, name):
+        # Feature of an element or of its type e.g. 'mass' of 'part fc : FlightController;' is 'attribute mass' of FlightController
+        visited = set()
+        while element is not None and id(element) not in visited:
+            visited.add(id(element))
+            features = element.find_children(name=name)
+            if features:
+                return features[0]
+            if not element.declared_type:
+                return None
+            element = model.resolve_reference(element.declared_type, element.parent)
+        return None
+
+    def _get_multiplicity(self, element):
+        # 'part motor : Motor[4];' -> 4, '[2..4]' -> 4, definitions and features without multiplicity -> 1
+        if not element.multiplicity or element.kind.endswith(" def"):
+            return 1
+        upper = element.multiplicity.split("..")[-1].strip()
+        if not upper.isdigit():
+            raise ConstraintError(f"Unbounded multiplicity [{element.multiplicity}] of {element.qualified_name}")
+        return int(upper)
 
     def find_constraint_definitions(self, sysml_file_path, constraint_name):
         """
@@ -359,20 +615,15 @@ class SysmlParser:
         Returns: 
             constraint_name, content inside '{}' if found, else None 
         """
-        try:
-            with open(sysml_file_path, "r", encoding="utf-8") as file:
-                sysml_text = file.read()
-        except FileNotFoundError:
+        model = self.get_model(sysml_file_path)
+        if model is None:
             self.logger.error(f"Error (find_constraint_definitions): File '{sysml_file_path}' not found.")
             return None, None
 
-        # Regex für Constraint-Definitionen
-        constraint_pattern = r"constraint def (\w+)\s*\{(.*?)\}"
-        matches = re.findall(constraint_pattern, sysml_text, re.DOTALL)
-
-        for name, body in matches:
-            if name == constraint_name:
-                return name, body  # Inhalt zurückgeben, ohne Leerzeichen
+        # Search 'constraint def <name> {...}' nodes
+        for node in model.tree.iter_nodes():
+            if node.kind == "constraint def" and node.name == constraint_name and node.body_span:
+                return node.name, model.get_text(node.body_span)  # Inhalt zurückgeben
 
         return None, None  # Falls keine passende Constraint gefunden wurde
 
@@ -387,153 +638,18 @@ class SysmlParser:
         Returns:
             List of tuples (usage_name, usage_content) if found, else an empty list.
         """
-        try:
-            with open(sysml_file_path, "r", encoding="utf-8") as file:
-                sysml_text = file.read()
-        except FileNotFoundError:
+        model = self.get_model(sysml_file_path)
+        if model is None:
             self.logger.error(f"Error (find_constraint_usages): File '{sysml_file_path}' not found.")
             return None, None 
 
-        # Regex for Constraint-Usages (e.g. "constraint massCheck : MassConstraint { ... }")
-        usage_pattern = rf"constraint (\w+)\s*:\s*{constraint_name}\s*\{{(.*?)\}}"
-        matches = re.findall(usage_pattern, sysml_text, re.DOTALL)
-
-        if not matches:
-            self.logger.warning(f"No usages found for constraint: {constraint_name}")
-            return None, None 
-
-        usage_name, usage_body = matches[0]
-        return usage_name, usage_body
-
-    def get_constraint_usage_information(self, usage_content):
-        """
-        Dynamically extracts relevant attributes and their assigned values from a constraint usage block.
-
-        Parameters:
-            usage_content : String. The content inside a constraint usage block.
+        # Constraint usages (e.g. "constraint massCheck : MassConstraint { ... }")
+        for node in model.tree.iter_nodes():
+            if node.kind == "constraint" and node.declared_type == constraint_name and node.body_span:
+                return node.name, model.get_text(node.body_span)
 
-        Returns:
-            Dictionary with extracted attributes and their values.
-        """
-        extracted_data = {}
-
-        # Remove unnecessary whitespace and normalize line breaks
-        usage_content = usage_content.strip()
-
-        # Split into individual statements based on semicolons, but preserve content across lines
-        # Use a regex to handle statements that might span multiple lines
-        statements = re.split(r';\s*(?![^\(]*\))', usage_content)  # Split on ; unless inside parentheses
-
-        for statement in statements:
-            statement = statement.strip()
-            if not statement:  # Skip empty statements
-                continue
-
-            # Look for assignments in the form: "in variableName = value"
-            match = re.match(r"in\s+(\w+)\s*=\s*(.+)", statement, re.DOTALL)
-            if match:
-                var_name, var_value = match.groups()
-                var_value = var_value.strip()
-
-                # If the value is a list (e.g., (x, y, z)), handle multi-line content
-                if var_value.startswith("(") and ")" in var_value:
-                    # Extract content inside parentheses
-                    list_content = re.search(r'\((.+)\)', var_value, re.DOTALL).group(1)
-                    # Split by commas and strip whitespace
-                    extracted_data[var_name] = [v.strip() for v in list_content.split(",") if v.strip()]
-                else:
-                    extracted_data[var_name] = var_value
-
-        return extracted_data if extracted_data else None
-
-    def get_constraint_def_equation(self, constraint_content):
-        """
-        Parses constraint definition content and searches for equations
-        """
-        # self.logger.info(f"get_constraint_def_equation)
-
-        # Remove white spaces 
-        constraint_content = constraint_content.strip()
-
-        # Simple pattern: Look for a line with a mathematical operator after 'in' declarations
-        lines = constraint_content.splitlines()
-        for line in lines[::-1]:  # Start from last element due to equation often beeing the last element
-            line = line.strip()
-            if not line.startswith("in") and any(op in line for op in ["<=", ">=", "<", ">", "=", "!="]):
-                #self.logger.debug(f"Extracted equation: {line}")
-                return line
-        self.logger.warning(f"No equation found in constraint definition content: {constraint_content}")
-        return None
-
-    def get_attribute_value(self, attribute_paths : list[str], sysml_file_path : str) -> list[float]: 
-        """
-        Parses through Sysml model and extracts numeric values for given attribute paths e.g. fc.mass (attribute mass of part FlightController) -> MassValue
-        """
-        part_name_map = {
-        'fc': 'FlightController',
-        'cs': 'Chassis',
-        'enc': 'Enclosure',
-        'motor': 'Motor',
-        'prop': 'Propellor',
-        'cam': 'Camera',
-        'batt': 'Battery',
-        'pdb': 'PowerDistributionBoard',
-        'esc': 'ElectronicSpeedController',
-        'trans': 'Transmitter',
-        'rec': 'Receiver',
-        'gpsm': 'GPSModule'
-        }
-
-        # Multiplicity map
-        multiplicity_map = {
-            'motor': 4,  # motor[4]
-            'prop': 4    # prop[4]
-        }
-
-        try:
-            # Load Sysml model 
-            with open(sysml_file_path, "r", encoding="utf-8") as file:
-                sysml_text = file.read()
-            
-            pattern = r"part def (\w+)\s*\{[^}]*attribute mass\s*=\s*(\d+\.?\d*)\[g\][^}]*\}"
-            parts = dict(re.findall(pattern, sysml_text, re.DOTALL))
-            #self.logger.debug(f"Extracted parts with mass: {parts}")
-
-            # list for numeric values 
-            values = []
-            for path in attribute_paths:
-                # Check if path is format abbreviation.attribute (e.g. fc.mass)
-                if '.' not in path or path.split('.')[-1] != 'mass':
-                    self.logger.warning(f"Invalid attribute path: {path}, expected 'part.mass'")
-                    values.append(0.0)
-                    continue
-                    
-                # extract abbreviation from path (e.g. "fc" from "fc.mass")
-                part_short = path.split('.')[0] # first element 
-                part_name = part_name_map.get(part_short) #get full name from part name map 
-                if not part_name:
-                    self.logger.warning(f"Unknown part short name: {part_short}")
-                    values.append(0.0)
-                    continue
-
-                # get numeric value
-                mass_str = parts.get(part_name, '0')
-                mass_value = float(mass_str)
-
-                # if needed, use multiplicity
-                multiplicity = multiplicity_map.get(part_short, 1)
-                total_mass = mass_value * multiplicity
-                values.append(total_mass)
-                #self.logger.debug(f"Resolved {path} -> {part_name}.mass = {total_mass}[g]")
-
-            return values
-
-        except FileNotFoundError:
-            self.logger.error(f"File not found: {sysml_file_path}")
-            return [0.0] * len(attribute_paths)
-        except Exception as e:
-            self.logger.error(f"Error parsing SysML model: {e}")
-            return [0.0] * len(attribute_paths)
+        self.logger.warning(f"No usages found for constraint: {constraint_name}")
+        return None, None 
 
 class GerberParser:     
     """
@@ -553,16 +669,101 @@ class GerberParser:
             Value of element from given element path (mapping.json), None if key not found 
         """
         # self.logger.info(f"get_gerber_job_file_value")
-        gbr_job_file = load_json(self.file_path)
+        return self.get_value_from_data(self.get_job_file(), elementPath)
+
+    def get_values(self, element_paths):
+        """
+        Parses GerberJobFile once and returns the values of all given element paths
+        
+        Parameters:
+            element_paths : List. Element paths e.g. ["GeneralSpecs.Size.X", "DesignRules[0].PadToPad"]
+
+        Returns:
+            Dictionary. elementPath -> value, None if key not found 
+        """
+        gbr_job_file = self.get_job_file()
+        return {elementPath: self.get_value_from_data(gbr_job_file, elementPath) for elementPath in element_paths}
+
+    def set_values(self, values):
+        """
+        Writes values into the GerberJobFile with one write (e.g. SysMLv2 values pushed by the MetadataManager)
+        Only existing element paths are changed, key order is preserved. Numbers stay numbers if the new value is numeric 
+        Line endings, final newline and indentation of the file are kept (unchanged lines stay unchanged in a diff)
+        
+        Parameters:
+            values : Dictionary. elementPath -> new value e.g. {"GeneralSpecs.Size.X": 20, "DesignRules[0].PadToPad": "0.1"}
+
+        Returns:
+            Bool. True if all values have been written
+        """
+        if not self.file_path:
+            self.logger.warning("No file path provided.")
+            return False
+        # Load a fresh copy, cached job files are shared and must not be changed
+        try:
+            with open(self.file_path, "rb") as file:
+                text = file.read().decode("utf-8")
+            gbr_job_file = json.loads(text)
+        except (OSError, UnicodeDecodeError, json.JSONDecodeError) as e:
+            self.logger.error(f"Could not load GerberJobFile {self.file_path}: {e}")
+            return False
+
+        for elementPath, value in values.items():
+            keys = compile_gerber_path(elementPath) or (None,)
+            parent = gbr_job_file
+            for key in keys[:-1]:
+                parent = parent[key] if self.has_key(parent, key) else None
+            key = keys[-1]
+            if not self.has_key(parent, key):
+                self.logger.error(f"Element path '{elementPath}' not found in {self.file_path}, nothing written.")
+                return False
+            parent[key] = self.convert_value(value, parent[key])
+
+        # Same format as the original file e.g. KiCad: indent 2, CRLF, final newline
+        newline = "\r\n" if "\r\n" in text else "\n"
+        indent = re.search(r"\n([ \t]+)\S", text)
+        indent = indent.group(1) if indent else (2 if "\n" in text.strip() else None)
+        content = json.dumps(gbr_job_file, indent=indent, ensure_ascii=text.isascii())
+        content = content.replace("\n", newline) + (newline if text.endswith("\n") else "")
+        if not write_file_atomic(self.file_path, content.encode("utf-8"), mode="wb"):
+            return False
+        GERBER_JOB_CACHE.invalidate(self.file_path)
+        return True
+
+    def has_key(self, data, key):
+        """ Helper function. True if data is a dictionary containing key (str) or a list containing index key (int) """
+        return (isinstance(key, str) and isinstance(data, dict) and key in data) \
+            or (isinstance(key, int) and isinstance(data, list) and key < len(data))
+
+    def convert_value(self, value, current_value):
+        """ Helper function. Converts a new value (e.g. "20" from a SysMLv2 model) to the JSON type of the current value """
+        if isinstance(value, str) and isinstance(current_value, (int, float)) and not isinstance(current_value, bool):
+            try:
+                number = float(value)
+            except ValueError:
+                return value
+            return int(number) if number.is_integer() and isinstance(current_value, int) else number
+        return value
+
+    def get_job_file(self):
+        """ Returns the parsed GerberJobFile from GERBER_JOB_CACHE (only parsed again after the file has changed) or None """
+        if not self.file_path:
+            return None
+        return GERBER_JOB_CACHE.get(self.file_path)
 
-        keys = elementPath.split(".")  # Split path into individual keys
+    def get_value_from_data(self, gbr_job_file, elementPath):
+        """ Returns value of the elementPath inside the loaded GerberJobFile (dictionary), None if key not found """
+        keys = compile_gerber_path(elementPath)  # e.g. ("DesignRules", 0, "PadToPad")
+        if keys is None:
+            self.logger.warning(f"Element path '{elementPath}' is invalid.")
+            return None
         current_data = gbr_job_file  # Start from the root of the loaded JSON
 
         for key in keys:
             #self.logger.debug(f"key: {key}")
             # Check if the current key exists in the current level of the JSON data
-            if isinstance(current_data, dict) and key in current_data:
-                current_data = current_data[key]  # Navigate deeper into the JSON
+            if self.has_key(current_data, key):
+                current_data = current_data[key]  # Navigate deeper into the JSON (dictionary key or list index)
 
             else:
                 # If the key is not found, log and return None (or raise an exception if needed)
@@ -579,7 +780,9 @@ class CodeParser:
     def __init__(self, code_file_path = None):
         self.logger = logging.getLogger(__name__ + "-CodeParser")
         self.mapping_data = load_json("./config/mapping.json")
+        # Source file or directory (e.g. package or whole repository, all python files below are searched)
         self.code_file_path = code_file_path
+        self.index_dir = "./config/code_index" # Persisted indexes of source directories
 
     def save_code(self, code, filename="generated_code.py"):
         """ Saves generated code to a file """
@@ -604,115 +807,184 @@ class CodeParser:
 
         Returns the value of the elementPath from the mapping.json inside the code and searches for element"""
         self.logger.info("get_value")
+        value = self.get_values([elementPath]).get(elementPath)
+        if value is None and self.code_file_path:
+            # Error if we looped through and found nothing
+            raise ValueError(f"No Metadata value found for: {elementPath}")
+        return value
+
+    def get_values(self, element_paths):
+        """ 
+        Parses code once and extracts the values of all given element paths (see get_value)
+
+        Parameters:
+            element_paths : List. Element paths e.g. ["FlightController.id", "FlightController.max_width"]
+
+        Returns:
+            Dictionary. elementPath -> value, None if no @metadata decorator with the elementPath exists
+        """
         # 1) Load file 
         # Check if code file path is set
         if not self.code_file_path: 
             self.logger.warning(f"Code file is not provided.")
-            return None
+            return {elementPath: None for elementPath in element_paths}
         # Check if code file path exist
         if not os.path.exists(self.code_file_path):
             self.logger.error(f"Error: File {self.code_file_path} does not exist")
             raise FileNotFoundError(f"File {self.code_file_path} not found")
         
-        # 2) Read and parse file 
-        try:
-            with open(self.code_file_path, "r") as file:
-                code_content = file.readlines() 
-        except Exception as e: 
-            self.logger.error(f"Error parsing file: {e}")
-
-        # 3) Search for "@metadata(...)"
+        # 2) Index of all "@metadata(...)" decorators, parsed once per file content (see code_metadata.py)
         # @metadata("max_width", "70", "mm", "int", "PCBDesign", "FlightController.max_width")
-        metadata_pattern = re.compile(
-            r'@metadata\("([^"]*)",\s*"([^"]*)",\s*"([^"]*)",\s*"([^"]*)",\s*"([^"]*)",\s*"([^"]*)"\)'
-        )
-        
-        # Looping through source code content
-        for line in code_content: 
-            line = line.strip()
-            #self.logger.debug(f"LINE: {line}")
-            metadata_match = metadata_pattern.search(line)
-            if metadata_match: 
-                #self.logger.debug(f"metadata match found: {metadata_match}")
-                name, value, unit, dataType, metadata_tag, path = metadata_match.groups()
-                #self.logger.debug(f"path: {path}")
-                if path == elementPath: 
-                    #self.logger.debug(f"Found value: {value}")
-                    return value
-            
-        # 4) Error if we looped through and found nothing
-        self.logger.error(f"No value found for given elementPath: {elementPath}")
-        raise ValueError(f"No Metadata value found for: {elementPath}")
+        if os.path.isdir(self.code_file_path):
+            # Directory: global index of all source files, walked again only after invalidate_source_tree_indexes()
+            source_tree_index = self.get_source_tree_index()
+            source_tree_index.refresh_if_stale()
+            # One index lookup per element path (file path, record)
+            found = [source_tree_index.get(elementPath) for elementPath in element_paths]
+            records = [entry[1] if entry is not None else None for entry in found]
+        else:
+            metadata_records = self.get_metadata_records()
+            records = [metadata_records.get(elementPath) for elementPath in element_paths]
+
+        values = {}
+        for elementPath, record in zip(element_paths, records):
+            values[elementPath] = record.value if record is not None else None
+            if values[elementPath] is None:
+                self.logger.error(f"No value found for given elementPath: {elementPath}")
+        return values
+
+    def get_metadata_records(self, code_file_path=None):
+        """
+        Returns all @metadata decorators of a source file as elementPath -> MetadataRecord (name, value, unit, dataType, 
+        metadataTag, elementPath, line). The file is only parsed again after it has changed 
 
-    def generate_code_from_sysml(self, sysml_file_path: str = None, output_file: str = "generated_code.py"): 
+        Parameters:
+            code_file_path : String. Optional other source file, default is self.code_file_path
+        """
+        records = CODE_METADATA_CACHE.get(code_file_path or self.code_file_path)
+        return records if records is not None else {}
+
+    def get_source_tree_index(self, root=None):
+        """
+        Returns the index of all @metadata decorators below a source directory (see code_metadata.SourceTreeIndex) 
+        The index is persisted inside index_dir (one file per directory) and shared by all CodeParser instances 
+
+        Parameters:
+            root : String. Source directory, default is self.code_file_path
+        """
+        root = os.path.abspath(root or self.code_file_path)
+        if root not in SOURCE_TREE_INDEXES:
+            index_name = hashlib.sha1(root.encode("utf-8")).hexdigest()[:16] + ".json"
+            SOURCE_TREE_INDEXES[root] = SourceTreeIndex(root, os.path.join(self.index_dir, index_name))
+        return SOURCE_TREE_INDEXES[root]
+
+    def invalidate_source_tree_indexes(self, root=None):
+        """
+        Marks source directory indexes as outdated, the next lookup (get_values, find_element) walks the directory again 
+        and parses changed files. Lookups in between reuse the index (e.g. all lookups of one synchronization)
+
+        Parameters:
+            root : String. Source directory, default are all indexed directories
+        """
+        for index_root, source_tree_index in SOURCE_TREE_INDEXES.items():
+            if root is None or index_root == os.path.abspath(root):
+                source_tree_index.invalidate()
+
+    def find_element(self, elementPath, root=None):
+        """
+        Finds the source file of an elementPath inside a source directory 
+
+        Returns:
+            Tuple (file path, line, value) or None if no @metadata decorator with the elementPath exists
+        """
+        source_tree_index = self.get_source_tree_index(root)
+        source_tree_index.refresh_if_stale()
+        found = source_tree_index.get(elementPath)
+        if found is None:
+            return None
+        file_path, record = found
+        return file_path, record.line, record.value
+
+    def generate_code_from_sysml(self, sysml_file_path: str = None, output_file: str = "generated_code.py", output_dir: str = "models/sw_domain"): 
         """ 
         Generates Python code structure from SysMLv2 model using extracted metadata 
-        and saves it as a .py source file.
+        and saves it as a python package with one module per tagged part (e.g. generated_code/FlightController.py).
+        See generate_code 
+
+        Parameters:
+            sysml_file_path (str): Path to the SysMLv2 model file.
+            output_file (str): Name of the generated package, file extension is removed (default: generated_code.py -> generated_code/).
+            output_dir (str): Folder of the generated package (default: models/sw_domain).
+
+        Returns:
+            dict: Path of each generated module -> code
+        """ 
+        return self.generate_code(sysml_file_path, language="python", output_dir=os.path.join(output_dir, os.path.splitext(output_file)[0]))
+
+    def generate_code(self, sysml_file_path: str = None, language: str = "python", output_dir: str = "models/sw_domain/generated_code"): 
+        """ 
+        Generates source code of a target language from the metadata of a SysMLv2 model with the templates 
+        inside templates/<language>/ (one file per tagged part + files for all parts e.g. __init__.py).
+        Files are rendered one by one and only written if their content has changed, 
+        generated files of parts that are not tagged anymore are removed 
 
         Parameters:
             sysml_file_path (str): Path to the SysMLv2 model file.
-            output_file (str): Name of the output Python file (default: generated_code.py).
+            language (str): Folder inside templates/ e.g. "python" or "c".
+            output_dir (str): Folder of the generated files.
+
+        Returns:
+            dict: Path of each generated file -> code
         """ 
-        #self.logger.debug("generate_code_from_sysml")
+        #self.logger.debug("generate_code")
+        template_names = get_language_templates(language)
+        if not template_names:
+            self.logger.error(f"No templates found for language: {language} in {TEMPLATE_DIR}")
+            return {}
 
         self.sp = SysmlParser(sysml_path=sysml_file_path)
         
-        # Extract sysmlv2 metadata
-        sysml_metadata = self.sp.get_metadata_about_elements()
-        # {  'PCBDesign': [{'name': 'id', 'value': 'abc123', 'unit': '', 'dataType': 'string', 'metadata_path': 'FlightController'}, 
-        # {'name': 'name', 'value': 'fc-123', 'unit': '', 'dataType': 'string', 'metadata_path': 'FlightController'}, 
-        # ...
-        # 'PCB': [{'name': 'id', 'value': 'esc-001', 'unit': '', 'dataType': 'string', 'metadata_path': 'ElectronicSpeedController'}, 
-        # {'name': 'name', 'value': 'ESC 30A', 'unit': '', 'dataType': 'string', 'metadata_path': 'ElectronicSpeedController'}, ...}
- 
-
-        # Jinja2 Template
-        template = jinja2.Template("""
-# Generated from SysMLv2 model
-from typing import Any
-
-def metadata(name: str, value: Any, unit: str, dataType: str, metadataTag: str = None, elementPath: str = None):
-    def wrapper(cls):
-        if not hasattr(cls, 'metadata'):
-            cls.metadata = []
-        cls.metadata.append({
-            "name": name,
-            "value": value,
-            "unit": unit,
-            "dataType": dataType,
-            "metadata_tag": metadataTag,
-            "elementPath": elementPath or f"{cls.__name__}.{name}",
-        })
-        return cls
-    return wrapper
-
-{% for element_name, attribute_list in sysml_metadata.items() %}
-{% for attribute in attribute_list -%}
-@metadata("{{ attribute.name }}", "{{ attribute.value }}", "{{ attribute.unit }}", "{{ attribute.dataType }}", "{{ attribute.metadata_tag }}", "{{ attribute.metadata_path }}.{{ attribute.name }}")
-{% endfor %}
-class {{ element_name }}:
-    def __init__(self, **kwargs):
-        {% for attribute in attribute_list -%}
-        self.{{ attribute.name }} = "{{ attribute.value }}"
-        {% endfor %}
-
-{% endfor %}
-""")
-
-        # Generate Python-Code from template 
-        generated_code = template.render(sysml_metadata=sysml_metadata)
-
-        # Save generated code 
-        output_dir = "models/sw_domain"
+        # Render one file per tagged part and template while the tagged elements are streamed from the 
+        # parsed model (cached per file content), templates are compiled once (see get_template_environment)
+        environment = get_template_environment()
+        part_templates, model_templates = [], []
+        for template_name in template_names:
+            file_name = os.path.basename(template_name)[:-len(".j2")]
+            if file_name.startswith("part."):
+                part_templates.append((file_name[len("part"):], environment.get_template(template_name)))
+            else:
+                model_templates.append((file_name, environment.get_template(template_name)))
+
+        model = self.sp.get_model()
+        generated = {}
+        element_names = {} # dict keeps the order and removes duplicates
+        for tag, element in self.sp.iter_tagged_elements():
+            attribute_list = [self.sp.get_attribute_record(attribute_node, metadata_path=element.name, metadata_tag=tag)
+                              for attribute_node in self.sp.get_tagged_attributes(element, model)]
+            # e.g. [{'name': 'id', 'value': 'fc-001', 'unit': '', 'dataType': 'string', 'metadata_path': 'FlightController', 'metadata_tag': 'PCBDesign'}, ...]
+            for extension, template in part_templates:
+                generated[os.path.join(output_dir, element.name + extension)] = \
+                    template.render(element_name=element.name, attribute_list=attribute_list)
+            element_names[element.name] = None
+        for file_name, template in model_templates:
+            generated[os.path.join(output_dir, file_name)] = template.render(element_names=list(element_names))
+
+        # Save generated code, unchanged files keep their modification time 
         os.makedirs(output_dir, exist_ok=True)  # In case folder does not exist -> create folder 
-        output_path = os.path.join(output_dir, output_file)
-
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(generated_code)
-
-        #self.logger.info(f"Python source code generated and saved to: {output_path}")
-        return generated_code
+        for output_path, generated_code in generated.items():
+            write_if_changed(output_path, generated_code)
+        extensions = tuple(os.path.splitext(output_path)[1] for output_path in generated)
+        for file_name in os.listdir(output_dir):
+            file_path = os.path.join(output_dir, file_name)
+            if file_name.endswith(extensions) and file_path not in generated and is_generated_file(file_path):
+                os.remove(file_path)
+
+        #self.logger.info(f"Source code generated and saved to: {output_dir}")
+        return generated
         
+# Bytes copied at once from the memory-mapped STEP file when values are written (see StepParser.set_values)
+STEP_COPY_CHUNK_SIZE = 16 * 1024 * 1024
+
 class StepParser:
     """A parser for STEP files (STEP AP242) used in Mechanical Engineering."""
 
@@ -757,23 +1029,167 @@ class StepParser:
             self.logger.error(f"Failed to load STEP file '{step_file_path}': {e}")
             return ""
    
-    def get_value(self, elementPath):
+    def get_index(self, step_file_path=None):
+        """
+        Returns the entity index (step_index.StepIndex) of a STEP file, default is self.step_file_path
+        The DATA section is scanned once per file content, the index is shared by all StepParser instances
+
+        Returns:
+            StepIndex | None: Entity index, None if the file cannot be read
+        """
+        step_file_path = step_file_path or self.step_file_path
+        if not step_file_path:
+            self.logger.warning("No file path provided.")
+            return None
+        return STEP_INDEX_CACHE.get(step_file_path)
+
+    def get_value(self, elementPath, index=None):
         """
         Extracts a value from the STEP file based on the given elementPath.
-        It also keeps track of the index position for later updates.
-        Writes "index" parameter inside mapping.json 
+        DATA elements are addressed by entity id and parameter position ("index" inside mapping.json).
+        NOTE: Only reads the STEP file, positions of new mappings are found with find_value_index
         
         Parameters:
             elementPath (str): The STEP path to search for (e.g., "DATA.#11458=CARTESIAN_POINT" or "FILE_NAME").
+            index (str, optional): Parameter position of DATA elements e.g. "1" or "3.0" for the first item 
+                of the list parameter at position 3. Defaults to "0".
             
         Returns:
             str | None: The extracted value, or None if not found.
         """
         #self.logger.info(f"get_value")
 
-        # Load step file content
-        self.step_file_content = self.load_step_file(step_file_path=self.step_file_path)
+        # Memory-mapped STEP file with lazy HEADER and DATA index (the file is not read into a string)
+        step_index = self.get_index()
+        if step_index is None:
+            return None
+        return self.extract_value(step_index, elementPath, index)
+
+    def get_values(self, element_paths):
+        """
+        Opens the STEP file once and extracts the values of all given element paths (see get_value)
+
+        Parameters:
+            element_paths (list): STEP paths e.g. ["FILE_NAME.name", "DATA.#11458=CARTESIAN_POINT"]
+                or (elementPath, index) tuples for DATA elements e.g. ("DATA.#10=PRODUCT", "3.0")
+
+        Returns:
+            dict: element path (or tuple) -> extracted value, None if not found
+        """
+        step_index = self.get_index()
+        if step_index is None:
+            return {element_key: None for element_key in element_paths}
+        values = {}
+        for element_key in element_paths:
+            elementPath, index = element_key if isinstance(element_key, tuple) else (element_key, None)
+            values[element_key] = self.extract_value(step_index, elementPath, index)
+        return values
+
+    def find_value_index(self, elementPath, value):
+        """
+        Finds the parameter position of a value inside a DATA element e.g. to create the "index" of a STEP mapping 
+        Nested list parameters are searched as well (depth-first, first match wins)
+
+        Parameters:
+            elementPath (str): DATA path e.g. "DATA.#11458=CARTESIAN_POINT"
+            value (str): Value to search for
+
+        Returns:
+            str | None: Position e.g. "1" or "3.0" (see get_value), None if not found
+        """
+        match = re.search(r"#(\d+)", elementPath)
+        step_index = self.get_index()
+        if not match or not elementPath.startswith("DATA.") or step_index is None:
+            return None
+        parameters = step_index.get_parameters(match.group(0))
+        if parameters is None:
+            return None
+        return find_parameter(parameters, str(value))
+
+    def set_values(self, values):
+        """
+        Writes values of DATA elements into the STEP file with one write 
+        Only the parameter spans are replaced (found with the entity index), the rest of the file is copied unchanged 
+        Each value is checked on its own: HEADER elements, unknown elements/parameters and values that do not fit the 
+        parameter type (see format_parameter_value) are skipped and logged, the remaining values are still written
+        
+        Parameters:
+            values : Dictionary. (elementPath, index) or elementPath (index "0") -> new value 
+                e.g. {("DATA.#10=PRODUCT", "0"): "Motor v2"}
 
+        Returns:
+            Set. Keys of values that have been written (empty if nothing has been written)
+        """
+        step_index = self.get_index()
+        if step_index is None:
+            return set()
+        content = step_index.content
+
+        edits = [] # (start, end, new parameter bytes, key), offsets inside the file
+        for element_key, value in values.items():
+            elementPath, index = element_key if isinstance(element_key, tuple) else (element_key, None)
+            index = index if index not in (None, "") else "0"
+            if not elementPath.startswith("DATA."):
+                self.logger.warning(f"'{elementPath}' is not a DATA element, only DATA elements can be written. Skipped.")
+                continue
+            match = re.search(r"#(\d+)", elementPath)
+            entity = step_index.get_entity(match.group(0)) if match else None
+            if entity is None:
+                self.logger.error(f"DATA element '{elementPath}' not found in {self.step_file_path}. Skipped.")
+                continue
+            # latin-1 keeps character offsets equal to byte offsets
+            entity_text = content[entity.start:entity.end].decode("latin-1")
+            span = get_parameter_span(entity_text, index)
+            if span is None:
+                self.logger.error(f"Parameter '{index}' of '{elementPath}' not found in {self.step_file_path}. Skipped.")
+                continue
+            start, end, _ = span
+            text = format_parameter_value(entity_text[start:end], value)
+            if text is None:
+                self.logger.error(f"Value '{value}' does not fit parameter '{index}' of '{elementPath}' "
+                                  f"({entity_text[start:end]}). Skipped.")
+                continue
+            edits.append((entity.start + start, entity.start + end, text.encode("utf-8"), element_key))
+
+        edits.sort(key=lambda edit: edit[:2])
+        accepted = []
+        for edit in edits:
+            if accepted and edit[0] < accepted[-1][1]:
+                self.logger.error(f"Parameter of '{edit[3]}' overlaps parameter of '{accepted[-1][3]}'. Skipped.")
+                continue
+            accepted.append(edit)
+        edits = [edit[:3] for edit in accepted]
+        if not edits:
+            return set()
+
+        def iter_chunks():
+            # Unchanged parts are copied from the memory map, the file is not decoded or formatted again
+            position = 0
+            for start, end, text in edits + [(len(content), len(content), b"")]:
+                for chunk_start in range(position, start, STEP_COPY_CHUNK_SIZE):
+                    yield content[chunk_start:min(chunk_start + STEP_COPY_CHUNK_SIZE, start)]
+                yield text
+                position = end
+
+        # Index of the old content is closed before the file is replaced (memory-mapped files cannot be replaced on Windows)
+        STEP_INDEX_CACHE.invalidate(self.step_file_path)
+        if not write_file_atomic(self.step_file_path, iter_chunks(), mode="wb", before_replace=step_index.close):
+            return set()
+        return {edit[3] for edit in accepted}
+
+    def extract_value(self, step_index, elementPath, index=None):
+        """
+        Extracts a value based on the given elementPath from the index of an opened STEP file (see get_index)
+        HEADER elements are searched only inside the HEADER section, DATA elements are looked up in the entity index
+
+        Parameters:
+            step_index (StepIndex): Index of the STEP file
+            elementPath (str): The STEP path to search for (see get_value)
+            index (str, optional): Parameter position of DATA elements (see get_value)
+
+        Returns:
+            str | None: The extracted value, or None if not found.
+        """
         # Differentiate between HEADER data and DATA section
         if elementPath.startswith("DATA."):
             # Extract the numeric index from the elementPath (e.g., #11458)
@@ -784,43 +1200,24 @@ class StepParser:
 
             element_id = match.group(0)  # Example: "#11458"
 
-            # Search for the line in the STEP file containing the element
-            pattern = rf"{element_id}\s*=\s*([\w_]+)\((.*?)\);"
-            match = re.search(pattern, self.step_file_content, re.DOTALL) # DOTALL allows multiline matches
-            #self.logger.debug(f"Match for '{element_id}': {match}")
+            # Look up the element in the entity index of the STEP file (built once per file content)
+            entity = step_index.get_entity(element_id)
+            #self.logger.debug(f"Entity for '{element_id}': {entity}")
 
-            if not match:
+            if not entity:
                 self.logger.warning(f"Element '{element_id}' not found in the STEP file.")
                 return None
 
-            element_type = match.group(1) # e.g. "NEXT_ASSEMBLY_USAGE_OCCURRENCE"
-            element_data = match.group(2) # value inside the brackets. e.g. (#58,#116) -> "#58,#116"
-            
-            # Split each element inside the element_data / brackets (e.g., #58,#116)
-            # re.sub Removes single or double quotes from the values
-            values = [re.sub(r"^['\"]|['\"]$", "", i.strip()) for i in element_data.split(",")]
-            #self.logger.debug(f"Extracted values: {values}")
-
-            # Load mapping.json to update the index for the current element
-            mapping = load_json("config/mapping.json")
-            index = 0 
-
-            for element in mapping["STEP"]:
-                if element.get("index") != "":
-                    index = int(element["index"])
-                    element["value"] = values[index]  # Update value from STEP file
-                    break
-                else:
-                    for idx, value in enumerate(values):
-                        if value == element["value"]:
-                            element["index"] = str(idx)
-                            save_json("config/mapping.json", mapping)
-                            index = idx
-                            break
-                    else:
-                        continue
-                    break
-            return values[index] 
+            element_type = entity.type # e.g. "NEXT_ASSEMBLY_USAGE_OCCURRENCE"
+
+            # Parameters inside the brackets (decoded on first access) e.g. (#58,#116) -> ["#58", "#116"]
+            # Strings are unquoted, nested lists are returned as STEP text e.g. "(#12,#13)"
+            parameters = step_index.get_parameters(element_id)
+            value = get_parameter(parameters, index if index not in (None, "") else "0")
+            if value is None:
+                self.logger.warning(f"Parameter '{index}' of element '{element_id}' ({element_type}) not found in the STEP file.")
+                return None
+            return format_parameter(value)
         
         # Handle HEADER section (e.g., "FILE_NAME.name")
         else:
@@ -832,49 +1229,12 @@ class StepParser:
 
             section_name, attribute = keys
 
-            # Search for the section in the STEP file (e.g., FILE_NAME(...);)
-            section_pattern = rf"{section_name}\((.*?)\);"
-            section_match = re.search(section_pattern, self.step_file_content, re.DOTALL)  # DOTALL allows multiline matches
-
-            if not section_match:
+            # HEADER is parsed once per file content (cached with the STEP index), strings may contain ',' or ';'
+            if section_name.upper() not in step_index.header:
                 self.logger.warning(f"Section '{section_name}' not found in the STEP file.")
                 return None
 
-            section_content = section_match.group(1)
-            values = [value.strip() for value in section_content.split(",")]
-
-            # Define attribute position mappings for known sections
-            metadata = {
-                "FILE_NAME": {
-                    "name": 0,
-                    "time_stamp": 1,
-                    "author": 2,
-                    "organization": 3,
-                    "preprocessor_version": 4,
-                    "originating_system": 5,
-                    "authorization": 6
-                },
-                "FILE_DESCRIPTION": {
-                    "description": 0,
-                    "implementation_level": 1
-                }
-            }
-
-            # Retrieve the value based on the attribute position
-            if section_name in metadata and attribute in metadata[section_name]:
-                index = metadata[section_name][attribute]
-
-                if index < len(values):  # Ensure index is within range
-                    raw_value = values[index]  # Example: /* name */ 'Agri_UAV2'
-
-                    # Extract value enclosed in single or double quotes (e.g., "'Agri_UAV2'" -> "Agri_UAV2")
-                    match = re.search(r"'(.*?)'|\"(.*?)\"", raw_value)
-                    clean_value = match.group(1) if match else raw_value
-
-                    return clean_value
-                else:
-                    self.logger.warning(f"Index {index} out of range for section '{section_name}'.")
-                    return None
-            else:
+            value = step_index.get_header_value(section_name, attribute)
+            if value is None:
                 self.logger.warning(f"Attribute '{attribute}' not found in section '{section_name}'.")
-                return None
\ No newline at end of file
+            return value
\ No newline at end of file
@@ -230,7 +230,7 @@ class GUI:
         display_frame.rowconfigure(0, weight=0)
         display_frame.rowconfigure(1, weight=1)
         display_frame.columnconfigure(0, weight=1)
-        display_frame.columnconfigure((1,2), weight=0)
+        display_frame.columnconfigure((1,2,3), weight=0)
 
         # LABELS for the content frames
         display_frame_label = ctk.CTkLabel(display_frame, text="SysMLv2 File", height=30, font=("default",14), text_color="black")
@@ -241,93 +241,106 @@ class GUI:
         btn_load_model = ctk.CTkButton(display_frame, text="Load SysMLv2 Model", width=100, command=lambda: self.select_file(model_type="sysml", text_widget=sysml_file_text_widget))
 
 
+        # Dropdown to show only the elements tagged with the selected metadata (values are set when elements are highlighted)
+        selected_metadata = StringVar(value="All")
+        metadata_filter_dropdown = ctk.CTkOptionMenu(display_frame, values=["All"], variable=selected_metadata, width=100,
+                                                     command=lambda metadata: self.show_only_tagged_elements(text_widget=sysml_file_text_widget, metadata_name=metadata))
+
         # Button to parse and highlight elements that are tagged with a specific structure (here: '@<name> about')
         btn_highlight_tagged_elements_by_metadata = ctk.CTkButton(display_frame, text="Highlight elements by metadata", width=100,
-                                                                  command=lambda: self.highlight_tagged_elements_by_metadata(text_widget=sysml_file_text_widget)) 
+                                                                  command=lambda: self.highlight_tagged_elements_by_metadata(text_widget=sysml_file_text_widget, 
+                                                                                                                             metadata_dropdown=metadata_filter_dropdown)) 
         
         ###### LAYOUT ######
         btn_load_model.grid(row=0, column=1, padx=(5, 5), pady=(5,0), sticky="ew")
         btn_highlight_tagged_elements_by_metadata.grid(row=0, column=2, padx=(5, 5), pady=(5,0), sticky="ew") 
+        metadata_filter_dropdown.grid(row=0, column=3, padx=(5, 5), pady=(5,0), sticky="ew")
 
         # RIGHT FRAME GRID LAYOUT 
         display_frame_label.grid(row=0, column=0, pady=(5,0), sticky="ew") 
-        sysml_file_text_widget.grid(row=1, column=0, columnspan=3, padx=5, pady=5, sticky="nsew")   
+        sysml_file_text_widget.grid(row=1, column=0, columnspan=4, padx=5, pady=5, sticky="nsew")   
 
-    def highlight_tagged_elements_by_metadata(self, text_widget, highlight_nested_element = True):
+    def highlight_tagged_elements_by_metadata(self, text_widget, highlight_nested_element = True, metadata_dropdown = None):
         """Parses and highlights elements by metadata inside the 'popup_edit_sysml_model' 
         Uses file_parser.py with the Sysml_parser class for function usage
-        1) Checks if certain metadata structure (look up file_parser.py) is given inside the sysml file or not 
-        2) Parses and highlights sysml file to search for given metadata and metadata about paths
+        1) Gets the inverted index metadata tag -> text ranges of the tagged elements (built once per file content)
+        2) Highlights all ranges of a metadata tag with one tag_add call (text widget tag 'highlight-<metadata>')
         Uses:
             sysml_parser class functions
-                check_metadata_exist 
+                get_metadata_tag_index 
 
         Parameters:
             highlight_nested_element : Boolean. Flag to show/don't show nested elements (starting/ending from '{...}')
                                                 Default = True 
+            metadata_dropdown : CTkOptionMenu. Optional dropdown of the metadata filter, gets the found metadata as values
                                     
         Returns: Adjusted ctk.Text Widget with highlighted elements 
         """
         #self.logger.info(f"highlight_tagged_elements_by_metadata")
-        # Get the current user given sysml path 
-        
         # Check if sysml model full path is not None:
-        if self.sysml_file_path: 
-            #self.logger.debug(f"Found valid sysml model path: {self.sysml_file_path}")
-
-            try: 
-                # Create sysml_parser class to get class functions 
-                self.sysml_model = SysmlParser(sysml_path=self.sysml_file_path) 
-                #self.logger.debug(f"Successfully created sysml_parser class instance")
-                # Check if sysml model has a certain metadata structure 
-                found_metadata = self.sysml_model.check_metadata_exist()
-
-                # Check if found_metadata (list) is not empty
-                if found_metadata: 
-                    #self.logger.debug(f"Found Metadata: {found_metadata}")
-                    sysml_file_content = self.load_file_content(file_path=self.sysml_file_path, text_widget=text_widget)
-
-                    # Loop through every metadata def name
-                    for metadata in found_metadata:
-                        metadata_about_tags = self.sysml_model.get_metadata_about_elements(metadata_name=metadata)
-                        if sysml_file_content:
-                            #self.logger.debug(f"SysML file content loaded.")
-                            lines = sysml_file_content.splitlines()
-
-                            inside_nested_block = False  # Tracks whether we're inside a nested block
-                            nested_start_line = 0  # Stores the start line of a nested block
-
-                            for line_num, line in enumerate(lines, start=1): 
-                                for about_tag in metadata_about_tags:  
-                                    if about_tag in line:
-                                        #self.logger.debug(f"Found {about_tag} in line: {line}")
-                                        start_index = f"{line_num}.0"
-                                        end_index = f"{line_num}.end"
-                                        text_widget.tag_add("highlight", start_index, end_index)
-                                        text_widget.tag_config("highlight", background="yellow", foreground="black")
-                                        #self.logger.debug(f"Highlighted keyword: {about_tag} on line {line_num}")
-                                        
-                                        # Start nested block tracking
-                                        if highlight_nested_element and "{" in line:
-                                            inside_nested_block = True
-                                            nested_start_line = line_num
-
-                                # Handle nested elements spanning multiple lines
-                                if inside_nested_block:
-                                    if "{" in line and line_num == nested_start_line:
-                                        continue  # Skip starting line, already handled
-                                    
-                                    nested_start_index = f"{line_num}.0"
-                                    nested_end_index = f"{line_num}.end"
-                                    text_widget.tag_add("highlight", nested_start_index, nested_end_index)
-                                    #self.logger.debug(f"Highlighted nested content on line {line_num}")
+        if not self.sysml_file_path: 
+            return
 
-                                    # End nested block when encountering closing brace
-                                    if "}" in line:
-                                        inside_nested_block = False
+        try: 
+            # Create sysml_parser class to get class functions 
+            self.sysml_model = SysmlParser(sysml_path=self.sysml_file_path) 
+            tag_index = self.sysml_model.get_metadata_tag_index(nested=highlight_nested_element)
+            if not tag_index:
+                self.logger.info(f"No tagged elements found in: {self.sysml_file_path}")
+                return
+
+            # Text widget has to show the content the ranges belong to 
+            self.load_file_content(file_path=self.sysml_file_path, text_widget=text_widget)
+            for metadata, ranges in tag_index.items():
+                tag_name = f"highlight-{metadata}"
+                text_widget.tag_config(tag_name, background="yellow", foreground="black")
+                text_widget.tag_add(tag_name, *self.get_text_indices(ranges))
+
+            if metadata_dropdown is not None:
+                metadata_dropdown.configure(values=["All"] + list(tag_index))
+                metadata_dropdown.set("All") # content has been loaded again, nothing is hidden
+
+        except Exception as e: 
+            self.logger.info(f"Error trying to create a sysml_parser class instance with error: {e}")
+
+    def show_only_tagged_elements(self, text_widget, metadata_name):
+        """Hides all text of the 'popup_edit_sysml_model' that is not tagged with the selected metadata 
+        Uses the same inverted index as highlight_tagged_elements_by_metadata, the text between the tagged ranges
+        is hidden with one tag_add call (text widget tag 'hidden', elide). 'All' shows the whole model again 
 
-            except Exception as e: 
-                self.logger.info(f"Error trying to create a sysml_parser class instance with error: {e}")
+        Parameters:
+            metadata_name : String. Name of the metadata def or 'All'
+        """
+        #self.logger.info(f"show_only_tagged_elements")
+        text_widget.tag_remove("hidden", "1.0", tk.END)
+        if not self.sysml_file_path or metadata_name == "All":
+            return
+
+        try:
+            self.sysml_model = SysmlParser(sysml_path=self.sysml_file_path)
+            ranges = self.sysml_model.get_metadata_tag_index().get(metadata_name, [])
+            model = self.sysml_model.get_model()
+            if model is None:
+                return
+            hidden_ranges = []
+            previous_end = 0
+            for start, end in ranges + [(len(model.content), len(model.content))]:
+                if previous_end < start:
+                    hidden_ranges.append((previous_end, start))
+                previous_end = end
+            if hidden_ranges:
+                text_widget.tag_config("hidden", elide=True)
+                text_widget.tag_add("hidden", *self.get_text_indices(hidden_ranges))
+
+        except Exception as e:
+            self.logger.info(f"Error trying to filter tagged elements with error: {e}")
+
+    def get_text_indices(self, ranges):
+        """Converts character ranges of the loaded sysml model into text widget indices 'line.column' 
+        Returns a flat list [start1, end1, start2, end2, ...] to pass all ranges to one tag_add call 
+        """
+        model = self.sysml_model.get_model()
+        return ["%d.%d" % model.get_line_column(offset) for span in ranges for offset in span]
 
     def popup_map_data(self):
         """Opens a popup to map the data.
@@ -642,6 +655,9 @@ class GUI:
         # column 0 := hash; first treeview heading 
         selected_commit_hash = self.version_tree.item(selected_item, "values")[0]
         self.logger.debug(f"User selected commit with hash: {selected_commit_hash}")
+        # Write pending mapping changes (mapping log) to mapping.json before comparing it with git
+        if self.mm:
+            self.mm.export_mapping()
         # Call Versioncontrol function to get the git diff 
         diff = self.vc.get_diff_with_specific_commit(file_path=file_path, commit_hash=selected_commit_hash)
         if not diff: 
@@ -767,7 +783,7 @@ class GUI:
                 popup.title(title)
                 popup.geometry("500x100")
 
-                text_color = "green" if "(TRUE)" else "red"
+                text_color = "red" if "(FALSE)" in message or "failed" in message else "green"
                 label = tk.Label(popup, text=message, font=("Arial", 12, "bold"), fg=text_color)
                 label.pack(pady=20)
 
@@ -819,6 +835,8 @@ def main():
     # Start the Tkinter app
     app = GUI(config=DEFAULT_CONFIG, metadatamanager=mm, versioncontrol=vc)
     app.root.mainloop() 
+    # Compact mapping log into mapping.json after closing the app
+    mm.export_mapping()
 
 if __name__ == "__main__":
     main() 
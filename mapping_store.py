@@ -0,0 +1,334 @@
+import json
+import logging
+import os
+
+from utils.json_utils import load_json
+from utils.file_utils import get_file_fingerprint, has_file_changed, write_file_atomic
+
+class MappingStore:
+    """
+    Keeps the content of mapping.json in memory together with hash indexes for fast lookups
+    Used by the MetadataManager instead of loading and scanning mapping.json for every operation
+
+    Indexes:
+        uuid -> element (for the source/target UUIDs inside "Mappings")
+        (domain, elementPath) -> element (duplicate checks e.g. mapping["SysMLv2"] element with same elementPath)
+        (domain, filePath, elementPath) -> element
+    NOTE: domain is the section name inside mapping.json e.g. "SysMLv2", "GerberJobFile", "STEP", "Source Code"
+
+    Changes are not written by dumping the whole mapping again. They are appended as JSON lines to a log file
+    next to mapping.json (e.g. config/mapping.json.log) which is replayed on load. The log is compacted into mapping.json
+    when it has grown to the size of mapping.json (entries or bytes, at least compact_after entries), so every compaction 
+    is paid by as many appended changes as the mapping has entries (O(1) amortized per change, also for 100k mappings).
+    export() writes the mapping.json schema on demand (GUI, version control)
+    """
+
+    # Sections of mapping.json that do not contain domain elements
+    RESERVED_SECTIONS = ["SysMLv2", "Mappings"]
+
+    # Fingerprint of a mapping.json that does not exist (yet), the store is an empty mapping until the file is created
+    MISSING_FILE = {"missing": True}
+
+    def __init__(self, mapping_file_path, compact_after=500):
+        self.logger = logging.getLogger(__name__ + "-MappingStore")
+        self.mapping_file_path = mapping_file_path
+        self.log_file_path = mapping_file_path + ".log"
+        self.compact_after = compact_after # Minimum number of log entries before the log is compacted into mapping.json
+        self.mapping = None # Content of mapping.json + log (same structure), loaded on first access
+        self.fingerprint = None # fingerprint of mapping.json when it was loaded/saved last
+        self.log_size = 0 # size of the log file in bytes when it was replayed/written last
+        self.log_entries = 0
+        self.file_entries = 0 # number of elements and mappings inside mapping.json (without the log)
+        self.pending = [] # log entries that have not been written yet (see save)
+        self.dropped = 0 # pending entries that could not be applied again after a reload, save() fails until they are reported
+        self.mapping_keys = set() # (sourceUUID, targetUUID) of all entries inside "Mappings"
+        self.elements_by_uuid = {}
+        self.elements_by_path = {}
+        self.elements_by_location = {}
+        self.domain_by_uuid = {}
+
+    def get_mapping(self):
+        """
+        Returns the mapping (same structure as mapping.json).
+        mapping.json is only loaded again if it or the log has been changed outside of this store
+        """
+        if self.mapping is None or self.has_mapping_file_changed() or self.get_log_size() != self.log_size:
+            self.load()
+        return self.mapping
+
+    def has_mapping_file_changed(self):
+        if self.fingerprint is self.MISSING_FILE:
+            return os.path.exists(self.mapping_file_path)
+        return has_file_changed(self.mapping_file_path, self.fingerprint)
+
+    def get_log_size(self):
+        try:
+            return os.path.getsize(self.log_file_path)
+        except OSError:
+            return 0
+
+    def load(self):
+        """ 
+        Loads mapping.json, replays the log and rebuilds all indexes
+        Changes that have not been saved yet (e.g. mapping.json was changed by another program) are applied again on top
+        """
+        if os.path.exists(self.mapping_file_path):
+            mapping = load_json(file_path=self.mapping_file_path)
+            fingerprint = get_file_fingerprint(self.mapping_file_path)
+            if mapping is None:
+                self.logger.error(f"Could not load mapping file: {self.mapping_file_path}")
+        else:
+            mapping, fingerprint = None, self.MISSING_FILE
+        if mapping is None:
+            mapping = {"SysMLv2": [], "Mappings": []}
+        mapping.setdefault("SysMLv2", [])
+        mapping.setdefault("Mappings", [])
+        self.mapping = mapping
+        self.fingerprint = fingerprint or self.MISSING_FILE
+        self.file_entries = self.count_entries()
+
+        self.elements_by_uuid = {}
+        self.elements_by_path = {}
+        self.elements_by_location = {}
+        self.domain_by_uuid = {}
+        self.mapping_keys = set()
+        for domain, elements in mapping.items():
+            if domain == "Mappings" or not isinstance(elements, list):
+                continue
+            for element in elements:
+                if isinstance(element, dict):
+                    self._index_element(domain, element)
+        for mapping_entry in mapping["Mappings"]:
+            self.mapping_keys.add((mapping_entry.get("sourceUUID"), mapping_entry.get("targetUUID")))
+
+        pending = self.pending
+        self.pending = []
+        self.replay_log()
+        for log_entry in pending:
+            if self._apply(log_entry):
+                self.pending.append(log_entry)
+            else:
+                self.logger.error(f"Unsaved change cannot be applied to the reloaded mapping: {log_entry}")
+                self.dropped += 1
+
+    def discard(self):
+        """ Drops all changes that have not been saved yet and loads mapping.json and the log again (e.g. rollback of a failed bulk mapping) """
+        self.pending = []
+        self.dropped = 0
+        self.load()
+
+    def replay_log(self):
+        """
+        Applies all entries of the log to the loaded mapping.
+        Entries that are already part of mapping.json (e.g. log has not been removed after compaction) are skipped.
+        An incomplete last line (e.g. program stopped while writing) is ignored
+        """
+        self.log_size = 0
+        self.log_entries = 0
+        if not os.path.exists(self.log_file_path):
+            return
+        try:
+            with open(self.log_file_path, "rb") as file:
+                content = file.read()
+        except OSError as e:
+            self.logger.error(f"Could not read mapping log: {self.log_file_path}: {e}")
+            return
+
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            try:
+                log_entry = json.loads(line)
+            except json.JSONDecodeError:
+                self.logger.warning(f"Skipping incomplete entry in mapping log: {self.log_file_path}")
+                break
+            self._apply(log_entry)
+            self.log_entries += 1
+        self.log_size = len(content)
+
+    def save(self):
+        """
+        Appends all changes since the last save to the log (instead of writing the whole mapping.json again)
+        Compacts the log into mapping.json if it has grown to the size of mapping.json (see needs_compaction)
+
+        Returns:
+            True if successful, False if writing failed or unsaved changes have been lost 
+        """
+        if self.mapping is None:
+            return False
+        self.get_mapping() # unsaved changes are applied to a changed mapping.json/log before they are appended
+        if self.dropped:
+            # Reported once, the remaining changes are saved anyway
+            self.logger.error(f"{self.dropped} unsaved changes of the mapping were lost: {self.mapping_file_path}")
+            self.dropped = 0
+            self.save()
+            return False
+        if self.pending:
+            lines = "".join(json.dumps(log_entry) + "\n" for log_entry in self.pending)
+            try:
+                with open(self.log_file_path, "a") as file:
+                    file.write(lines)
+                    file.flush()
+                    os.fsync(file.fileno())
+            except OSError as e:
+                self.logger.error(f"Could not write mapping log: {self.log_file_path}: {e}")
+                return False
+            self.log_entries += len(self.pending)
+            self.log_size = self.get_log_size()
+            self.pending = []
+        if self.needs_compaction():
+            return self.compact()
+        return True
+
+    def needs_compaction(self):
+        """ 
+        True if the log has at least compact_after entries and as many entries or bytes as mapping.json itself 
+        (a threshold growing with the mapping, a fixed number of entries would make N changes cost O(N²) rewrites)
+        """
+        if self.log_entries < self.compact_after:
+            return False
+        return self.log_entries >= self.file_entries or self.log_size >= self.fingerprint.get("size", 0)
+
+    def count_entries(self):
+        """ Returns the number of elements and mappings of the loaded mapping """
+        return sum(len(entries) for entries in self.mapping.values() if isinstance(entries, list))
+
+    def compact(self):
+        """ Writes the whole mapping (including the log) to mapping.json and removes the log. Returns True if successful """
+        if not self._write_mapping_file():
+            return False
+        if os.path.exists(self.log_file_path):
+            try:
+                os.remove(self.log_file_path)
+            except OSError as e:
+                self.logger.error(f"Could not remove mapping log: {self.log_file_path}: {e}")
+                return False
+        self.log_size = 0
+        self.log_entries = 0
+        return True
+
+    def export(self, file_path=None):
+        """
+        Writes the mapping with the schema of mapping.json e.g. for the GUI or version control
+
+        Parameters:
+            file_path : String. Target file, default is mapping.json itself (log gets compacted)
+
+        Returns:
+            True if successful
+        """
+        if file_path is None or os.path.abspath(file_path) == os.path.abspath(self.mapping_file_path):
+            return self.compact()
+        return write_file_atomic(file_path, json.dumps(self.get_mapping(), indent=4))
+
+    def _write_mapping_file(self):
+        mapping = self.get_mapping()
+        if not write_file_atomic(self.mapping_file_path, json.dumps(mapping, indent=4)):
+            return False
+        self.pending = []
+        self.fingerprint = get_file_fingerprint(self.mapping_file_path) or self.MISSING_FILE
+        self.file_entries = self.count_entries()
+        return True
+
+    def get_element(self, uuid):
+        """ Returns the element (SysMLv2 or domain) with the given uuid or None """
+        self.get_mapping()
+        return self.elements_by_uuid.get(uuid)
+
+    def get_domain(self, uuid):
+        """ Returns the section name (e.g. "GerberJobFile") of the element with the given uuid or None """
+        self.get_mapping()
+        return self.domain_by_uuid.get(uuid)
+
+    def find_element(self, domain, element_path, file_path=None):
+        """
+        Returns the first element of a domain with the given elementPath (and filePath if provided) or None
+        """
+        self.get_mapping()
+        if file_path is None:
+            return self.elements_by_path.get((domain, element_path))
+        return self.elements_by_location.get((domain, file_path, element_path))
+
+    def get_domain_models(self):
+        """ Returns dictionary domain name -> list of elements, excluding "SysMLv2" and "Mappings" """
+        mapping = self.get_mapping()
+        return {key: value for key, value in mapping.items() if key not in self.RESERVED_SECTIONS}
+
+    def add_element(self, domain, element):
+        """ Appends an element to a domain section (created if missing) and indexes it. Written with save() """
+        self.get_mapping()
+        self._apply({"op": "element", "domain": domain, "element": element})
+        self.pending.append({"op": "element", "domain": domain, "element": element})
+
+    def add_mapping(self, mapping_entry):
+        """ Appends an entry {"sourceUUID", "targetUUID", "created"} to "Mappings". Written with save() """
+        self.get_mapping()
+        self._apply({"op": "mapping", "entry": mapping_entry})
+        self.pending.append({"op": "mapping", "entry": mapping_entry})
+
+    def update_element(self, uuid, fields):
+        """ 
+        Changes fields (e.g. {"value": ..., "lastModified": ...}) of the element with the given uuid. Written with save()
+
+        Returns:
+            False if there is no element with the given uuid, else True
+        """
+        self.get_mapping()
+        if not self._apply({"op": "update", "uuid": uuid, "fields": fields}):
+            self.logger.warning(f"Element not found in mapping: {uuid}")
+            return False
+        self.pending.append({"op": "update", "uuid": uuid, "fields": fields})
+        return True
+
+    def iter_mappings(self, mapping_entries=None):
+        """
+        Resolves source and target elements of mapping entries with the uuid index
+
+        Parameters:
+            mapping_entries : List. Entries of "Mappings" to resolve, default are all entries
+
+        Returns:
+            Generator of (mapping_entry, source_element, target_element). Missing elements are None
+        """
+        mapping = self.get_mapping()
+        if mapping_entries is None:
+            mapping_entries = mapping["Mappings"]
+        for mapping_entry in mapping_entries:
+            yield (mapping_entry,
+                   self.elements_by_uuid.get(mapping_entry.get("sourceUUID")),
+                   self.elements_by_uuid.get(mapping_entry.get("targetUUID")))
+
+    def _apply(self, log_entry):
+        # Returns False if the entry cannot be applied (unknown operation or update of a missing element)
+        operation = log_entry.get("op")
+        if operation == "element":
+            element = log_entry["element"]
+            if element.get("uuid") in self.elements_by_uuid:
+                return True
+            self.mapping.setdefault(log_entry["domain"], []).append(element)
+            self._index_element(log_entry["domain"], element)
+        elif operation == "mapping":
+            mapping_entry = log_entry["entry"]
+            key = (mapping_entry.get("sourceUUID"), mapping_entry.get("targetUUID"))
+            if key in self.mapping_keys:
+                return True
+            self.mapping["Mappings"].append(mapping_entry)
+            self.mapping_keys.add(key)
+        elif operation == "update":
+            element = self.elements_by_uuid.get(log_entry["uuid"])
+            if element is None:
+                return False
+            element.update(log_entry["fields"])
+        else:
+            self.logger.warning(f"Unknown entry in mapping log: {log_entry}")
+            return False
+        return True
+
+    def _index_element(self, domain, element):
+        uuid = element.get("uuid")
+        if uuid:
+            self.elements_by_uuid.setdefault(uuid, element)
+            self.domain_by_uuid.setdefault(uuid, domain)
+        element_path = element.get("elementPath")
+        self.elements_by_path.setdefault((domain, element_path), element)
+        self.elements_by_location.setdefault((domain, element.get("filePath"), element_path), element)
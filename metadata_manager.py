@@ -1,10 +1,14 @@
 import logging 
 import os 
+import json
 import uuid 
-import re # Regex 
 from tkinter import messagebox
 
 from utils.json_utils import save_json, load_json
+from utils.file_utils import write_file_atomic, get_file_fingerprint, has_file_changed
+from mapping_store import MappingStore
+from file_parser import SysmlParser
+from sysml_syntax import SysmlModel, apply_edits
 from datetime import datetime
 
 class MetadataManager:
@@ -21,6 +25,10 @@ class MetadataManager:
         self.config = config
         self.mapping_template_file_path = "./config/mapping_template.json"
         self.mapping_file_path = "./config/mapping.json"
+        self.mapping_store = None # In-memory mapping.json with uuid/elementPath indexes, see get_mapping_store
+        self.domain_state = None # Fingerprints of domain files from the last synchronization, see get_domain_state
+        self.domain_state_file_path = None
+        self.domain_state_changed = False
         # NOTE: not only dependend on repo path inside config.json also dependend on which OS the mapping has been made
         self.repo_path = self.config["repo_path"] # Change it between windows and macOS 
         self.vc = versioncontrol
@@ -32,9 +40,8 @@ class MetadataManager:
         # Parameters will be set later by functions 
         self.sysml_model = None
         self.domain_model = None
-        # List of keywords for regex search inside the sysml file 
+        # SysMLv2 keywords of elements that can be mapped 
         self.keywords = ["part", "part def", "package", "attribute"]
-        self.keywords_pattern = "|".join(self.keywords)
         self.datatypes = ["Real", "Integer", "String", "Boolean", "Enumeration"]
 
         #Create mapping_template automatically, if not already existing 
@@ -53,6 +60,55 @@ class MetadataManager:
             #self.logger.info(f"Mapping file already exists at {self.mapping_file_path}")
             return 
         
+    def get_mapping_store(self):
+        """Returns the MappingStore of the current mapping file path (created again if the path has been changed)"""
+        if self.mapping_store is None or self.mapping_store.mapping_file_path != self.mapping_file_path:
+            self.mapping_store = MappingStore(self.mapping_file_path)
+        return self.mapping_store
+
+    def get_domain_state(self):
+        """
+        Returns the synchronization state of the domain files (sidecar file next to mapping.json e.g. config/mapping.state.json)
+            "files" : domain filePath -> fingerprint {"mtime", "size", "hash"} (last seen)
+            "elements" : uuid -> {"filePath", "elementPath", "index", "value", "hash"} (hash of the domain file when the value was extracted)
+        """
+        state_file_path = os.path.splitext(self.mapping_file_path)[0] + ".state.json"
+        if self.domain_state is None or self.domain_state_file_path != state_file_path:
+            self.domain_state_file_path = state_file_path
+            self.domain_state = None
+            self.domain_state_changed = False
+            if os.path.exists(state_file_path):
+                self.domain_state = load_json(file_path=state_file_path)
+            if not isinstance(self.domain_state, dict):
+                self.domain_state = {}
+            self.domain_state.setdefault("files", {})
+            self.domain_state.setdefault("elements", {})
+        return self.domain_state
+
+    def save_domain_state(self):
+        """Writes the synchronization state of the domain files (see get_domain_state)"""
+        if self.domain_state is None:
+            return False
+        if write_file_atomic(self.domain_state_file_path, json.dumps(self.domain_state, indent=4)):
+            self.domain_state_changed = False
+            return True
+        return False
+
+    def get_domain_file_hash(self, file_path):
+        """
+        Returns the content hash of a domain file. The file is only hashed again if mtime or size
+        changed since the fingerprint inside the domain state has been taken 
+        """
+        files = self.get_domain_state()["files"]
+        fingerprint = files.get(file_path)
+        if fingerprint is None or has_file_changed(file_path, fingerprint):
+            fingerprint = get_file_fingerprint(file_path)
+            if fingerprint is None:
+                return None
+            files[file_path] = fingerprint
+            self.domain_state_changed = True
+        return fingerprint["hash"]
+
     def map_metadata(self, sysml_path, sysml_element_path, sysml_element_value, sysml_element_unit, domain_file_format, domain_path, domain_element_path, domain_element_value, domain_element_unit): 
         """
         Links/Maps metadata from domain models with SysMLv2 data that the user selected inside the GUI 
@@ -70,6 +126,42 @@ class MetadataManager:
         """
         #self.logger.info(f"map_metadata")
 
+        # Load existing mapping.json (kept in memory by the mapping store) to extend with data 
+        store = self.get_mapping_store()
+        try:
+            new_mapping = self.create_mapping(store, sysml_path, sysml_element_path, sysml_element_value, sysml_element_unit, 
+                                              domain_file_format, domain_path, domain_element_path, domain_element_value, 
+                                              domain_element_unit, show_dialogs=True)
+        except LookupError:
+            return False  # Skip adding new mapping (already mapped or domain path not valid)
+
+        # Save updated mapping (appended to the mapping log, see MappingStore)
+        if store.save():
+            #self.logger.debug(f"Mapping successfully saved at: {self.mapping_file_path}")
+            # Update Sysml model (First save mapping.json), only the new mapping has to be synchronized
+            self.update_sysml_model(mapping_entries=[new_mapping])
+            return True
+        else: 
+            return False 
+        
+    def create_mapping(self, store, sysml_path, sysml_element_path, sysml_element_value, sysml_element_unit, domain_file_format, domain_path, domain_element_path, domain_element_value, domain_element_unit, show_dialogs=False):
+        """
+        Validates one mapping and adds the SysMLv2 element, the domain element and the mapping entry to the mapping store
+        The store is not saved, used by map_metadata and map_metadata_bulk 
+
+        Parameters: 
+            store : MappingStore. Mapping the elements are added to
+            (sysml_path ... domain_element_unit see map_metadata)
+            show_dialogs : Bool. Shows errors/infos with a messagebox (GUI)
+
+        Returns:
+            Dictionary. New entry of "Mappings" {"sourceUUID", "targetUUID", "created"}
+
+        Raises:
+            FileNotFoundError if the sysml or domain file does not exist
+            ValueError if datatype or unit are not matching or fields are missing 
+            LookupError if an element is already mapped or the domain element path is not valid
+        """
         # Validate file existence
         if not os.path.exists(sysml_path):
             self.logger.error(f"SysMLv2 file does not exist: {sysml_path}")
@@ -80,9 +172,6 @@ class MetadataManager:
         self.logger.info(f"VALIDATION: SysMLv2 filepath: {sysml_path}, VALID: True")
         self.logger.info(f"VALIDATION: Domain filepath: {domain_path}, VALID: True")
 
-        # Load existing mapping.json to extend with data 
-        mapping = load_json(file_path=self.mapping_file_path)
-
         # Generate UUIDs for each element
         uuid_sysml_element = str(uuid.uuid4())
         uuid_domain_element = str(uuid.uuid4())
@@ -122,7 +211,8 @@ class MetadataManager:
         if sysml_element_datatype and domain_element_datatype:
             if sysml_element_datatype != domain_element_datatype:
                 self.logger.error(f"Datatype mismatch: SysMLv2: {sysml_element_datatype}, Domain: {domain_element_datatype}")
-                messagebox.showerror("Datatype Mismatch", f"Datatype mismatch: SysMLv2: {sysml_element_datatype}, Domain: {domain_element_datatype}")
+                if show_dialogs:
+                    messagebox.showerror("Datatype Mismatch", f"Datatype mismatch: SysMLv2: {sysml_element_datatype}, Domain: {domain_element_datatype}")
                 raise ValueError(f"Datatype mismatch: SysMLv2: {sysml_element_datatype}, Domain: {domain_element_datatype}")
 
 
@@ -131,12 +221,14 @@ class MetadataManager:
         if sysml_element_unit and domain_element_unit:
             if sysml_element_unit != domain_element_unit:
                 self.logger.error(f"Unit mismatch: SysMLv2: {sysml_element_unit}, Domain: {domain_element_unit}")
-                messagebox.showerror("Unit Mismatch", f"Unit mismatch: SysMLv2: {sysml_element_unit}, Domain: {domain_element_unit}")
+                if show_dialogs:
+                    messagebox.showerror("Unit Mismatch", f"Unit mismatch: SysMLv2: {sysml_element_unit}, Domain: {domain_element_unit}")
                 raise ValueError(f"Unit mismatch: SysMLv2: {sysml_element_unit}, Domain: {domain_element_unit}")
         # Check if only one element has a unit, which is inconsistent
         elif sysml_element_unit or domain_element_unit:
             self.logger.error(f"Unit mismatch: SysMLv2: {sysml_element_unit}, Domain: {domain_element_unit}")
-            messagebox.showerror("Unit Mismatch", f"Unit mismatch: SysMLv2: {sysml_element_unit}, Domain: {domain_element_unit}")
+            if show_dialogs:
+                messagebox.showerror("Unit Mismatch", f"Unit mismatch: SysMLv2: {sysml_element_unit}, Domain: {domain_element_unit}")
             raise ValueError(f"Unit mismatch: SysMLv2: {sysml_element_unit}, Domain: {domain_element_unit}")
         # If neither element has a unit, no validation is needed
         self.logger.info(f"VALIDATION: SysMLv2 unit: {sysml_element_unit}, VALID: True")
@@ -160,7 +252,7 @@ class MetadataManager:
             "name" : domain_element_path.split(".")[-1], #last element from element path 
             "value" : domain_element_value,
             "unit" : domain_element_unit, 
-            "index" : "0", # Used for precise positioning e.g. #10=CONTEXT_DEPENDENT_SHAPE_REPRESENTATION(#56,#116) -> index : 1 for value #116
+            "index" : self.find_domain_element_index(domain_file_format, domain_path, domain_element_path, domain_element_value), 
             "dataType" : domain_element_datatype,
             "elementPath" : domain_element_path,
             "filePath" : domain_path, 
@@ -192,27 +284,24 @@ class MetadataManager:
 
         
         #self.logger.debug(f"CHECKING EXISTING MAPPINGS")
-        # Check if user selected elements have been already mapped 
-        sysml_exists = any(e for e in mapping["SysMLv2"] if e["elementPath"] == sysml_element_path)
+        # Check if user selected elements have been already mapped (index lookup)
+        sysml_exists = store.find_element("SysMLv2", sysml_element_path) is not None
         #self.logger.debug(f"sysml element: {sysml_exists}")
         if sysml_exists:
             self.logger.warning(f"SysMLv2 element already exists: {sysml_element_path} at {sysml_path}")
-            messagebox.showinfo("Element Exists", f"The SysMLv2 element {sysml_element_path} already exists in the mapping.")
-            return False  # Skip adding new mapping
+            if show_dialogs:
+                messagebox.showinfo("Element Exists", f"The SysMLv2 element {sysml_element_path} already exists in the mapping.")
+            raise LookupError(f"SysMLv2 element already exists: {sysml_element_path}")  # Skip adding new mapping
 
 
         # Check if Domain element already exists in mapping.json
-        domain_exists = any(e for e in mapping.get(domain_file_format, []) if e["elementPath"] == domain_element_path) # and e["filePath"] == domain_path
+        domain_exists = store.find_element(domain_file_format, domain_element_path) is not None # and e["filePath"] == domain_path
         #self.logger.debug(f"domain element: {domain_exists}")
         if domain_exists:
             self.logger.warning(f"Domain element already exists: {domain_element_path} at {domain_path}")
-            messagebox.showinfo("Element Exists", f"The Domain element {domain_element_path} already exists in the mapping.")
-            return False  # Skip adding new mapping
-
-        # Ensure the domain file format exists in the mapping, else create a new section
-        if domain_file_format not in mapping:
-            #self.logger.debug(f"{domain_file_format} section not found in mapping.json. Creating new section.")
-            mapping[domain_file_format] = []
+            if show_dialogs:
+                messagebox.showinfo("Element Exists", f"The Domain element {domain_element_path} already exists in the mapping.")
+            raise LookupError(f"Domain element already exists: {domain_element_path}")  # Skip adding new mapping
 
         # Test if domain elementPath is valid aka get_value function works
         if domain_file_format == "GerberJobFile":
@@ -222,218 +311,492 @@ class MetadataManager:
            self.logger.debug(f"Value: {value}")
            if not value:
                self.logger.warning(f"Domain Path is not valid!")
-               return False
+               raise LookupError(f"Domain element path is not valid: {domain_element_path}")
 
         # Completeness check for sysml_element and domain_element
         # Check if all fields inside sysml_element and domain_element are filled
         required_sysml_fields = ["uuid", "name", "value", "unit", "dataType", "elementPath", "filePath", "created", "lastModified"]
         required_domain_fields = required_sysml_fields + ["index"]
+        if domain_file_format == "STEP" and domain_element["index"] == "":
+            # Position of the value has not been found yet (e.g. 0. vs 0), it is searched again by discover_step_indexes
+            required_domain_fields = required_sysml_fields
 
         log_completeness(sysml_element, "SysMLv2", required_fields=required_sysml_fields)
         log_completeness(domain_element, domain_file_format, required_fields=required_domain_fields)
 
-        # Append elements to sysmlv2
-        mapping["SysMLv2"].append(sysml_element)
-        mapping[f"{domain_file_format}"].append(domain_element)
-        mapping["Mappings"].append(new_mapping)
+        # Append elements to sysmlv2 and domain section (domain section is created if missing)
+        store.add_element("SysMLv2", sysml_element)
+        store.add_element(domain_file_format, domain_element)
+        store.add_mapping(new_mapping)
+        return new_mapping
 
     
-        # Save updated mapping.json
-        if save_json(file_path=self.mapping_file_path, data=mapping):
-            #self.logger.debug(f"Mapping successfully saved at: {self.mapping_file_path}")
-            # Update Sysml model (First save mapping.json)
-            self.update_sysml_model()
-            return True
-        else: 
-            return False 
-        
-    def update_sysml_model(self):
+
+    def map_metadata_bulk(self, mapping_specs):
+        """
+        Maps many pairs of SysMLv2 and domain elements at once without GUI dialogs (e.g. for integration jobs)
+        Every mapping is validated like in map_metadata, the SysMLv2 element paths are also validated with the (cached) sysml models.
+        Invalid mappings are collected instead of raising errors, all valid mappings are saved once and synchronized once
+
+        Parameters: 
+            mapping_specs : Iterable of dictionaries with the parameters of map_metadata 
+                e.g. {"sysml_path": ..., "sysml_element_path": ..., ..., "domain_element_unit": ...}
+
+        Returns:
+            Dictionary. {"mapped": [new entries of "Mappings"], "errors": [{"index", "spec", "error"}]}
+        """
+        #self.logger.info(f"map_metadata_bulk")
+        store = self.get_mapping_store()
+        sysml_parsers = {} # sysml_path -> SysmlParser (parsed models are shared via the model cache)
+        mapped = []
+        errors = []
+
+        for index, spec in enumerate(mapping_specs):
+            try:
+                sysml_path = spec["sysml_path"]
+                if os.path.exists(sysml_path):
+                    if sysml_path not in sysml_parsers:
+                        sysml_parsers[sysml_path] = SysmlParser(config=self.config, sysml_path=sysml_path)
+                    if not sysml_parsers[sysml_path].validate_elementPath(elementPath=spec["sysml_element_path"]):
+                        raise LookupError(f"SysMLv2 element path is not valid: {spec['sysml_element_path']}")
+                mapped.append(self.create_mapping(store, **spec))
+            except (LookupError, ValueError, TypeError, OSError) as e:
+                self.logger.warning(f"Skipping mapping {index}: {e}")
+                errors.append({"index": index, "spec": spec, "error": str(e)})
+
+        if not mapped:
+            return {"mapped": mapped, "errors": errors}
+
+        # Single synchronization of the SysMLv2 models, which saves the new mappings together with the current domain values
+        if not self.update_sysml_model(mapping_entries=mapped):
+            store.discard() # Roll back the unsaved mappings
+            return {"mapped": [], "errors": errors + [{"index": None, "spec": None, "error": "Could not save mapping"}]}
+        return {"mapped": mapped, "errors": errors}
+
+    def export_mapping(self, file_path=None):
+        """
+        Writes the complete mapping with the mapping.json schema (compacts the mapping log if no file_path is given)
+        Has to be called before mapping.json is read by other tools e.g. git/version control
+        """
+        if self.domain_state_changed:
+            self.save_domain_state()
+        return self.get_mapping_store().export(file_path)
+
+    def get_domain_element_key(self, domain_name, domain_element):
+        """ Returns the address of a domain element for get_domain_values: elementPath, for STEP (elementPath, index) """
+        if domain_name == "STEP":
+            return (domain_element.get("elementPath"), domain_element.get("index", ""))
+        return domain_element.get("elementPath")
+
+    def get_domain_values(self, domain_name, file_path, element_paths):
+        """
+        Extracts the current values of element paths from one domain file with the file parser of the domain model 
+        The domain file is parsed once for all element paths 
+
+        Parameters:
+            domain_name : String. Domain model (section inside mapping.json) e.g. "GerberJobFile", "STEP", "Source Code"
+            file_path : String. Path to the domain file 
+            element_paths : List. Element paths inside the domain file (see get_domain_element_key)
+
+        Returns:
+            Dictionary. elementPath -> value, None if there is no file parser for the domain model 
+        """
+        # TODO: select right file parser based on domain file format,  instead of static file parser, select right file parser based on domain file format 
+        if domain_name == "GerberJobFile": 
+            self.fp_gerber.file_path = file_path # Overwrite current file path in file parser object
+            return self.fp_gerber.get_values(element_paths)
+        elif domain_name == "STEP":
+            # Overwrite current file path in file parser object (content is loaded again by the parser)
+            self.fp_step.step_file_path = file_path
+            return self.fp_step.get_values(element_paths)
+        elif domain_name == "Source Code": 
+            self.fp_code.code_file_path = file_path
+            return self.fp_code.get_values(element_paths)
+        self.logger.warning(f"Unsupported domain model: {domain_name}. Please add a file parser for this domain model.")
+        return None
+
+    def find_domain_element_index(self, domain_file_format, domain_path, domain_element_path, domain_element_value):
+        """
+        Returns the "index" of a new domain element, used for precise positioning 
+        e.g. #10=CONTEXT_DEPENDENT_SHAPE_REPRESENTATION(#56,#116) -> index : 1 for value #116
+        Only STEP DATA elements are searched (read only, the STEP index is cached), all other elements use "0"
+        If the value is not found the index stays empty ("") and is searched again by discover_step_indexes
+        """
+        if domain_file_format != "STEP" or self.fp_step is None or not str(domain_element_path).startswith("DATA."):
+            return "0"
+        if not domain_path or not os.path.exists(domain_path):
+            self.logger.warning(f"STEP file not found: {domain_path}, index of '{domain_element_path}' is searched later")
+            return ""
+        self.fp_step.step_file_path = domain_path
+        index = self.fp_step.find_value_index(domain_element_path, domain_element_value)
+        if index is None:
+            self.logger.warning(f"Value '{domain_element_value}' not found in STEP element '{domain_element_path}', index is searched later")
+            return ""
+        return index
+
+    def discover_step_indexes(self, save=True, domain_elements=None):
+        """
+        Records the parameter position ("index") of all STEP DATA elements inside mapping.json that have none yet
+        The position of the mapped value is searched inside the entity e.g. "#116" in #10=...(#56,#116) -> "1"
+        Each STEP file is indexed once, all positions are written with one save of the mapping 
+
+        Parameters:
+            save : Bool. Saves the mapping if positions have been found, False if the caller saves it later (update_sysml_model)
+            domain_elements : List. STEP elements to check (e.g. sources of the synchronized mappings), default are all STEP elements
+
+        Returns:
+            Integer. Number of found positions
+        """
+        if self.fp_step is None:
+            return 0
+        store = self.get_mapping_store()
+        pending_elements = {} # STEP filePath -> list of domain elements without index
+        if domain_elements is None:
+            domain_elements = store.get_domain_models().get("STEP", [])
+        for domain_element in domain_elements:
+            if not isinstance(domain_element, dict) or domain_element.get("index") not in (None, ""):
+                continue
+            if not str(domain_element.get("elementPath", "")).startswith("DATA."):
+                continue
+            file_path = domain_element.get("filePath")
+            if file_path and os.path.exists(file_path):
+                pending_elements.setdefault(file_path, []).append(domain_element)
+
+        found = 0
+        for file_path, elements in pending_elements.items():
+            self.fp_step.step_file_path = file_path
+            for domain_element in elements:
+                index = self.fp_step.find_value_index(domain_element["elementPath"], domain_element.get("value"))
+                if index is None:
+                    self.logger.warning(f"Value '{domain_element.get('value')}' not found in STEP element '{domain_element['elementPath']}'")
+                    continue
+                store.update_element(domain_element.get("uuid"), {"index": index})
+                found += 1
+
+        if found and save and not store.save():
+            self.logger.error(f"Could not save mapping: {self.mapping_file_path}")
+        return found
+
+    def set_domain_values(self, domain_name, file_path, values):
+        """
+        Writes values into one domain file with the file parser of the domain model (one write per file)
+
+        Parameters:
+            domain_name : String. Domain model (section inside mapping.json) e.g. "GerberJobFile", "STEP"
+            file_path : String. Path to the domain file 
+            values : Dictionary. Element key (see get_domain_element_key) -> new value 
+
+        Returns:
+            Set. Element keys that have been written (empty if the file has not been written)
+        """
+        if domain_name == "GerberJobFile": 
+            self.fp_gerber.file_path = file_path
+            return set(values) if self.fp_gerber.set_values(values) else set()
+        elif domain_name == "STEP":
+            # STEP values are checked per element, unsupported elements/values are skipped
+            self.fp_step.step_file_path = file_path
+            return self.fp_step.set_values(values)
+        self.logger.warning(f"Writing values is not supported for domain model: {domain_name}.")
+        return set()
+
+    def update_domain_models(self, mapping_entries=None):
+        """
+        Pushes values of mapped SysMLv2 elements into the domain files (opposite direction of update_sysml_model) 
+        e.g. if the SysMLv2 model is the source of truth. Values are collected first and each domain file is written once
+
+        Parameters:
+            mapping_entries : List. Entries of "Mappings" to synchronize, default are all mappings
+
+        Returns:
+            Bool. False if a domain file or the mapping could not be written
+        """
+        store = self.get_mapping_store()
+        domain_models = store.get_domain_models()
+        sysml_parser = self.fp_sysml or SysmlParser(config=self.config)
+        success = True
+
+        # 1) Collect changed SysMLv2 values, grouped by domain file
+        pending_writes = {} # (domain name, filePath) -> {element key: value}
+        changed_elements = {} # (domain name, filePath) -> list of (element key, source_element, target_element, value)
+        for mapping_entry, source_element, target_element in store.iter_mappings(mapping_entries):
+            domain_name = store.get_domain(mapping_entry.get("sourceUUID"))
+            if source_element is None or target_element is None or domain_name not in domain_models \
+                    or store.get_domain(mapping_entry.get("targetUUID")) != "SysMLv2":
+                self.logger.error(f"Source or target element not found in mapping.json: {mapping_entry}")
+                continue
+
+            # Current value inside the SysMLv2 file (parsed model is cached per file content)
+            sysml_file_path = os.path.join(self.repo_path, target_element["filePath"])
+            node = sysml_parser.get_element(target_element["elementPath"], sysml_file_path=sysml_file_path)
+            if node is None or node.kind != "attribute" or not node.value:
+                self.logger.warning(f"SysMLv2 attribute without value not found: {target_element['elementPath']}")
+                continue
+            record = sysml_parser.get_attribute_record(node, target_element["elementPath"], "")
+            if record["unit"] != (source_element.get("unit") or ""):
+                self.logger.warning(f"Unit mismatch, not written: SysMLv2: {record['unit']}, Domain: {source_element.get('unit')}")
+                continue
+            if record["value"] == str(source_element.get("value")):
+                continue
+
+            file_key = (domain_name, source_element.get("filePath"))
+            element_key = self.get_domain_element_key(domain_name, source_element)
+            pending_writes.setdefault(file_key, {})[element_key] = record["value"]
+            changed_elements.setdefault(file_key, []).append((element_key, source_element, target_element, record["value"]))
+
+        # 2) Write each domain file once and update the mapping
+        timestamp = datetime.now().strftime("%d.%m.%Y")
+        for (domain_name, domain_file_path), values in pending_writes.items():
+            written = self.set_domain_values(domain_name, domain_file_path, values)
+            if len(written) != len(values):
+                self.logger.error(f"Could not write {len(values) - len(written)} of {len(values)} values into domain file: {domain_file_path}")
+                success = False
+            if not written:
+                continue
+            # Domain elements keep the value as the file parser reads it back (e.g. number 3.5 of a GerberJobFile, 
+            # "3.5" of the SysMLv2 model), otherwise the next update_sysml_model sees a change
+            current_values = self.get_domain_values(domain_name, domain_file_path, list(written)) or {}
+            for element_key, source_element, target_element, value in changed_elements[(domain_name, domain_file_path)]:
+                if element_key not in written:
+                    continue
+                store.update_element(source_element["uuid"], {"value": current_values.get(element_key, value), "lastModified": timestamp})
+                store.update_element(target_element["uuid"], {"value": value, "lastModified": timestamp})
+
+        if store.pending and not store.save():
+            self.logger.error(f"Could not save mapping: {self.mapping_file_path}")
+            return False
+        return success
+
+    def update_sysml_model(self, mapping_entries=None):
         """
         Updates/changes sysml model with domain metadata that has been mapped via mapping.json 
         Overwrites mapped element values (also checks if new values are set from domain files)
+
+        Parameters:
+            mapping_entries : List. Entries of "Mappings" to synchronize, default are all mappings
+
+        Returns:
+            Bool. False if the mapping could not be saved (SysMLv2 models are not changed then)
         """
         #self.logger.info(f"update_sysml_model")
-        # 1) Load mapping.json 
-        mapping = load_json(file_path=self.mapping_file_path)
+        # 1) Load mapping.json (kept in memory by the mapping store)
+        store = self.get_mapping_store()
 
         # 2) Extract relevant domain models (excluding SysMLv2 and Mappings)
-        domain_models = {key: value for key, value in mapping.items() if key not in ["SysMLv2", "Mappings"]}
+        domain_models = store.get_domain_models()
+        # Domain elements to check: all of them, or only the sources of the given mappings (uuid index of the store)
+        domain_elements = [] # list of (domain name, domain_element)
+        if mapping_entries is None:
+            for domain_name, model in domain_models.items():
+                # Ensure model is a list
+                if not isinstance(model, list):
+                    self.logger.warning(f"Skipping {domain_name}, expected a list but found {type(model)}")
+                    continue
+                domain_elements.extend((domain_name, domain_element) for domain_element in model)
+        else:
+            source_uuids = set()
+            for mapping_entry in mapping_entries:
+                source_uuid = mapping_entry.get("sourceUUID")
+                domain_name = store.get_domain(source_uuid)
+                if domain_name in domain_models and source_uuid not in source_uuids:
+                    source_uuids.add(source_uuid)
+                    domain_elements.append((domain_name, store.get_element(source_uuid)))
+        # Positions of new STEP mappings are saved together with the extracted values
+        self.discover_step_indexes(save=False, domain_elements=[domain_element for domain_name, domain_element in domain_elements 
+                                                                if domain_name == "STEP" and isinstance(domain_element, dict)])
+
+        # Values that have been extracted from unchanged domain files are not extracted again
+        extracted_elements = self.get_domain_state()["elements"]
         updated = False
         #self.logger.debug("Checking if there are new values in domain files...")
     
-        for domain_name, model in domain_models.items():
-            #self.logger.debug(f"Current domain file model: {domain_name}")
+        # Collect domain elements whose values have to be extracted, grouped by domain file (each file is parsed once)
+        pending_extractions = {} # (domain name, filePath) -> list of (domain_element, extracted)
+        for domain_name, domain_element in domain_elements:
+            #self.logger.debug(f"Current domain element: {domain_element}")
+
+            # Ensure domain_element is a dictionary
+            if not isinstance(domain_element, dict):
+                self.logger.warning(f"Skipping element, expected a dictionary but found {type(domain_element)}")
+                continue
+
+            domain_element_uuid = domain_element.get("uuid")
+            domain_element_value = domain_element.get("value")
+            domain_elementPath = domain_element.get("elementPath")
+            domain_element_filePath = domain_element.get("filePath")
 
-            # Ensure model is a list
-            if not isinstance(model, list):
-                self.logger.warning(f"Skipping {domain_name}, expected a list but found {type(model)}")
+            # Check if file path is valid
+            if not domain_element_filePath or not os.path.exists(domain_element_filePath):
+                self.logger.warning(f"File path does not exist: {domain_element_filePath}")
+                continue
+            # STEP DATA elements without position would be read from the wrong parameter
+            if domain_name == "STEP" and str(domain_elementPath).startswith("DATA.") and domain_element.get("index") in (None, ""):
+                self.logger.warning(f"Position of STEP element '{domain_elementPath}' not found yet, skipped")
                 continue
-            
-            for domain_element in model:  # model is now a list, so iterate directly
-                #self.logger.debug(f"Current domain element: {domain_element}")
 
-                # Ensure domain_element is a dictionary
-                if not isinstance(domain_element, dict):
-                    self.logger.warning(f"Skipping element, expected a dictionary but found {type(domain_element)}")
-                    continue
+            # Skip element if its domain file has not been changed since the value has been extracted last time
+            # Directories (e.g. "Source Code" of a whole repository) are checked by their file parser
+            file_hash = None if os.path.isdir(domain_element_filePath) else self.get_domain_file_hash(domain_element_filePath)
+            extracted = {"filePath": domain_element_filePath, "elementPath": domain_elementPath, 
+                         "index": domain_element.get("index", ""), "value": domain_element_value, "hash": file_hash}
+            if file_hash is not None and extracted_elements.get(domain_element_uuid) == extracted:
+                continue
 
-                domain_element_uuid = domain_element.get("uuid")
-                domain_element_value = domain_element.get("value")
-                domain_elementPath = domain_element.get("elementPath")
-                domain_element_filePath = domain_element.get("filePath")
+            pending_extractions.setdefault((domain_name, domain_element_filePath), []).append((domain_element, extracted))
 
-                # Check if file path is valid
-                if not domain_element_filePath or not os.path.exists(domain_element_filePath):
-                    self.logger.warning(f"File path does not exist: {domain_element_filePath}")
-                    continue
+        # Source directories are walked once per synchronization, not per lookup
+        if self.fp_code is not None and any(domain_name == "Source Code" for domain_name, _ in pending_extractions):
+            self.fp_code.invalidate_source_tree_indexes()
+        for (domain_name, domain_file_path), elements in pending_extractions.items():
+            # Retrieve CURRENT domain element values (one parser call per domain file)
+            element_keys = [self.get_domain_element_key(domain_name, domain_element) for domain_element, _ in elements]
+            current_values = self.get_domain_values(domain_name, domain_file_path, element_keys)
+            if current_values is None:
+                continue
 
-                # TODO: select right file parser based on domain file format,  instead of static file parser, select right file parser based on domain file format 
-                # Retrieve CURRENT domain element value
-                if domain_name == "GerberJobFile": 
-                    self.fp_gerber.file_path = domain_element_filePath # Overwrite current file path in file parser object
-                    current_domain_element_value = self.fp_gerber.get_value(elementPath=domain_elementPath)
-                elif domain_name == "STEP":
-                    # Overwrite current file path in file parser object and manually load content again
-                    self.fp_step.step_file_path = domain_element_filePath
-                    #self.fp_step.load_step_file(step_file_path=domain_element_filePath)
-                    current_domain_element_value = self.fp_step.get_value(elementPath=domain_elementPath)
-
-                elif domain_name == "Source Code": 
-                    #self.logger.debug(f"Found Source Code. Checking mapped element")
-                    #TODO: write get value with elementPath (e.g. @metadata("id", "abc123", "", "string", "PCBDesign", "FlightController.id"))
-                    self.fp_code.code_file_path = domain_element_filePath
-                    current_domain_element_value = self.fp_code.get_value(elementPath = domain_elementPath)
-                else:
-                    self.logger.warning(f"Unsupported domain model: {domain_name}. Please add a file parser for this domain model.")
-                    continue
+            for (domain_element, extracted), element_key in zip(elements, element_keys):
+                domain_element_uuid = domain_element.get("uuid")
+                current_domain_element_value = current_values.get(element_key)
 
                 #####################
                 if current_domain_element_value:
                     #self.logger.debug(f"Element Path is valid with element value: {current_domain_element_value}")
 
                     # Update mapping if value has changed
-                    if current_domain_element_value != domain_element_value:
-                        domain_element["value"] = current_domain_element_value 
-                        # Update lastModified with current timestamp
+                    if current_domain_element_value != domain_element.get("value"):
+                        # Update value and lastModified with current timestamp
                         timestamp = datetime.now().strftime("%d.%m.%Y")
-                        domain_element["lastModified"] = timestamp
+                        store.update_element(domain_element_uuid, {"value": current_domain_element_value, "lastModified": timestamp})
                         updated = True
                         #self.logger.debug(f"Updated sysml element in mapping to: {current_domain_element_value}")
+                    extracted["value"] = current_domain_element_value
+                    if domain_element_uuid and extracted["hash"] is not None and extracted_elements.get(domain_element_uuid) != extracted:
+                        extracted_elements[domain_element_uuid] = extracted
+                        self.domain_state_changed = True
 
                 else: 
                     self.logger.warning("Element Path is not valid")
 
-        # Save changes if any updates were made
-        if updated:
-            save_json(file_path=self.mapping_file_path, data=mapping)
+        # Save changes if any updates were made (also unsaved mappings e.g. from map_metadata_bulk)
+        if updated or store.pending:
+            if not store.save():
+                self.logger.error(f"Could not save mapping: {self.mapping_file_path}")
+                return False
+        # The domain state is only a cache: synchronizations of single mappings (map_metadata) keep it in memory,
+        # it is written by full synchronizations and export_mapping
+        if self.domain_state_changed and mapping_entries is None:
+            self.save_domain_state()
             #self.logger.debug(f"Successfully saved changes from domain file to mapping and sysmlv2 model")
 
-        # 3) Loop through all mappings and update SysMLv2 model with domain metadata
+        # 3) Loop through all mappings and collect the updates of the SysMLv2 models with domain metadata
         # Overwrite values of mapped elements in "SysMLv2" with values from "GerberJobFile" etc."
-        for mapping_entry in mapping["Mappings"]:
+        pending_updates = {} # target file path -> list of (elementPath, value, unit)
+        for mapping_entry, source_element, target_element in store.iter_mappings(mapping_entries):
             source_uuid = mapping_entry["sourceUUID"]
             target_uuid = mapping_entry["targetUUID"]
 
-            # Find source and target elements
-            source_element = next(
-                (elem for domain in domain_models.values() for elem in domain if elem["uuid"] == source_uuid), None) 
-            target_element = next(
-                (elem for elem in mapping["SysMLv2"] if elem["uuid"] == target_uuid), None)
-            
-            # Check if both elements were found
-            if source_element is None or target_element is None:
+            # Check if both elements were found (source has to be a domain element and target a SysMLv2 element)
+            if source_element is None or target_element is None \
+                    or store.get_domain(source_uuid) not in domain_models or store.get_domain(target_uuid) != "SysMLv2":
                 self.logger.error(f"Source or target element not found in mapping.json: {source_uuid}, {target_uuid}")
                 continue
 
-            # Open Sysml file based on given filePath for each element inside "SysMLv2" and check file existent
+            # Group updates by the Sysml file based on given filePath for each element inside "SysMLv2" and check file existent
             target_file_path = os.path.join(self.repo_path, target_element["filePath"])
+            if target_file_path not in pending_updates:
+                if not os.path.exists(target_file_path):
+                    self.logger.error(f"SysMLv2 file does not exist: {target_file_path}")
+                    continue
+                pending_updates[target_file_path] = []
+            pending_updates[target_file_path].append((target_element['elementPath'], source_element['value'], source_element['unit']))
+
+        # 4) Apply all updates of one SysMLv2 file as span edits in one sweep and write each file only once
+        sysml_parser = self.fp_sysml or SysmlParser(config=self.config)
+        for target_file_path, updates in pending_updates.items():
             #self.logger.debug(f"Opening SysMLv2 file with target file path: {target_file_path}")
-            if not os.path.exists(target_file_path):
-                self.logger.error(f"SysMLv2 file does not exist: {target_file_path}")
+            # Parsed model (node offsets) is cached per file content
+            model = sysml_parser.get_model(target_file_path)
+            if model is None:
+                continue
+
+            edits = self.get_value_edits(model, updates)
+            if not edits:
                 continue
+            # Model of the updated content is derived from the edits (values are not parsed again), 
+            # it takes over the syntax tree of the cached model only when it replaces it (put_model)
+            updated_model = model.apply_edits(edits)
 
-            # Read sysml file and update the content
-            with open(target_file_path, "r") as file:
-                sysml_content = file.readlines() #returns list of string lines 
- 
-            updated_content = self.update_value_in_sysml_model(sysml_content, target_element['elementPath'], source_element['value'], source_element['unit'])
-            #self.logger.debug(f"Updated content: {updated_content}")
-            # Write updated content back to file
-            with open(target_file_path, "w") as file:
-                file.writelines(updated_content)
+            # Write updated content back to file (temp file + rename), skip unchanged files to keep their mtime
+            if updated_model.content != model.content and write_file_atomic(target_file_path, updated_model.content):
+                sysml_parser.put_model(updated_model, target_file_path)
         #self.logger.debug(f"Sucecssfully updated SysMLv2 model with domain metadata") 
-        
+        return True
+
+    def update_values_in_sysml_model(self, model, updates):
+        """
+        Helper Function
+        Replaces the values of attributes inside a parsed SysMLv2 model (located by the node offsets, see sysml_syntax.py). 
+        Only the value spans are replaced, the formatting of the rest of the file is kept 
+
+        Parameters:
+            model : SysmlModel. Parsed SysMLv2 file 
+            updates : List of (element_path, source_value, unit). If an element is updated twice the last value wins 
+
+        Returns:
+            String. Updated content of the SysMLv2 file
+        """
+        return apply_edits(model.content, self.get_value_edits(model, updates))
+
+    def get_value_edits(self, model, updates):
+        """
+        Helper Function
+        Returns the span edits (start, end, replacement) of updates (see update_values_in_sysml_model)
+        """
+        edits = {} # (start, end) -> replacement
+        for element_path, source_value, unit in updates:
+            node = model.get_element(element_path)
+            if node is None or node.kind != "attribute":
+                self.logger.warning(f"SysMLv2 attribute not found: {element_path}")
+                continue
+            start, end, replacement = self.get_value_edit(model.content, node, source_value, unit)
+            edits[(start, end)] = replacement
+        # Values that are already up to date are not edited (unchanged files are not written)
+        return [(start, end, replacement) for (start, end), replacement in edits.items() if model.content[start:end] != replacement]
+
+    def get_value_edit(self, content, node, source_value, unit=""):
+        """
+        Helper Function
+        Returns the span edit (start, end, replacement) that sets the value of an attribute node 
+        e.g. 'attribute len = 1.0[mm];' -> value span of '1.0[mm]' is replaced with '12.5[mm]'
+        Attributes without value (e.g. 'attribute mass : MassValue;') get ' = <value>' before the ';' 
+        """
+        # Check data type of source value (and convert to number float if possible)
+        try:
+            source_value = f"{float(source_value)}{f'[{unit}]' if unit else ''}"
+        except (TypeError, ValueError):
+            source_value = f'"{source_value}"'
+
+        if node.value_span is not None:
+            return node.value_span[0], node.value_span[1], source_value
+        # Insert after the last header token (keeps comments/whitespace before ';' or '{')
+        insert_at = node.header_end
+        while insert_at > node.start and content[insert_at - 1].isspace():
+            insert_at -= 1
+        return insert_at, insert_at, f" = {source_value}"
+
     def update_value_in_sysml_model(self, content, element_path, source_value, unit=""): 
         """
         Helper Function
         Updates the value of the target element in the SysMLv2 file content with the source value from the domain model file
+        NOTE: Parses the content, use update_values_in_sysml_model for many updates of one file 
         
         Parameters:
             content : list of strings. Content of the SysMLv2 file
             element_path : str. Path to the target element in the SysMLv2 file
             source_value : str. Value of the source element from the domain model file 
-        """
-        #self.logger.info(f"update_value_in_sysml_model")
-        element_path_splitted = element_path.split(".")
-        #self.logger.debug(f"Element path splitted: {element_path_splitted} with length: {len(element_path_splitted)}")
-        depth = 0
-        in_target_block = False
-        updated_content = []
-        is_number = False
-
-        # Check data type of source value (and convert to  number float if possible)
-        try:
-            source_value = float(source_value)
-            is_number = True
-        except ValueError:
-            source_value = f'"{source_value}"'
 
-        for line in content:
-            stripped_line = line.strip()
-            #self.logger.debug(f"Depth: {depth}. Current Line: {stripped_line}")
-            match = None
-            # Navigate to the target element
-            if depth < len(element_path_splitted): 
-                if re.match(rf"^\s*({self.keywords_pattern})\s+{re.escape(element_path_splitted[depth])}\s*\{{?", stripped_line):
-                    #self.logger.info(f"Match found for element path: {element_path_splitted[depth]}")
-                    depth += 1
-
-                    if depth == (len(element_path_splitted)-1):
-                        in_target_block = True
-                        #self.logger.debug(f"In target block TRUE")
-                    
-                if in_target_block: 
-                    #self.logger.debug(f"Inside Targetblock")
-                    #match = re.match(r"^\s*attribute\s+(\w+)\s*(:|=)\s*(\w+)\s*(;|\s+)", stripped_line)
-                    #match = re.search(r"^\s*attribute\s+(\w+)\s*(:|=)\s*(\w+|\S+)\s*(;|\s+)", stripped_line)
-                    #match = re.search(r"^\s*attribute\s+(\w+)\s*(:|=)\s*(\w+|\S+)(?:\s*(;)?\s*(.*))?$", stripped_line)
-                    match = re.search(r"^\s*attribute\s+(\w+)\s*(:|=)\s*([^;]+)(?:\s*(;))?(?:(.*))?$", stripped_line) #[^;] .. everything except optional ; 
-
-                    if match:
-                        depth = (len(element_path_splitted)-1)  # we are at the last element of given path 
-                        attribute_name = match.group(1)
-                        operator = "=" if match.group(2) == ":" else match.group(2)
-                        attribute_value = match.group(3)
-                        unit_target_value = f"[{unit}]" if is_number and unit else ""
-                        # unit_target_value = f"[{unit}]" if is_number else "" 
-                        #current_value = match.group(3)
-                        semicolon = match.group(4) #or ";"   
-                        rest_of_line = match.group(5) 
-
-                        if attribute_name == element_path_splitted[-1]:
-                            indentation = " " * (depth * 4)
-                            # Replace value of the target element with source value (mapped domain model value)
-                            updated_line = f"{indentation}attribute {attribute_name} {operator} {source_value}{unit_target_value}{semicolon}{rest_of_line}\n"
-                            #self.logger.debug(f"Updating line to: {updated_line.strip()}")
-                            updated_content.append(updated_line)
-                            in_target_block = False  # Exit target block after updating value
-                        else:
-                            updated_content.append(line)
-                    else: 
-                        updated_content.append(line)
-                else: 
-                    updated_content.append(line)
-            else:
-                updated_content.append(line)
-        return updated_content
+        Returns:
+            list of strings. Updated content 
+        """
+        model = SysmlModel("".join(content))
+        return self.update_values_in_sysml_model(model, [(element_path, source_value, unit)]).splitlines(keepends=True)
 
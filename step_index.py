@@ -0,0 +1,569 @@
+import logging
+import math
+import mmap
+import os
+import re
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# Entity index and parameter decoder for STEP files (ISO 10303-21, e.g. AP242)
+# The DATA section is scanned once into an offset index #id -> (type, parameter span),
+# parameter lists are only decoded when an entity is accessed
+# NOTE: This is NOT a full EXPRESS/STEP implementation, only what the StepParser (file_parser.py) needs
+
+logger = logging.getLogger(__name__)
+
+# Entity instance returned by the index. start/end is the byte span of the parameter list without the outer brackets
+# e.g. #11=PRODUCT_DEFINITION('design','',#13,#14); -> type 'PRODUCT_DEFINITION', span of "'design','',#13,#14"
+# Complex instances (#5=(A(...)B(...));) have the type '' and the span of "A(...)B(...)"
+StepEntity = namedtuple("StepEntity", ["type", "start", "end"])
+
+# '#id = TYPE (' followed by everything up to the ';' that ends the instance (';' inside strings is skipped)
+# Written as "other (string other)*" so that there is only one way to match (no backtracking on unterminated instances),
+# a string ends at a quote that is not followed by another one ('' is an escaped quote)
+_ENTITY_PATTERN = re.compile(rb"#(\d+)\s*=\s*([A-Za-z0-9_]*)\s*\(([^;']*(?:'[^']*(?:''[^']*)*'(?!')[^;']*)*);")
+
+_DATA_SECTION_PATTERN = re.compile(rb"\bDATA\s*(?:\([^;]*\))?\s*;")
+
+_HEADER_SECTION_PATTERN = re.compile(rb"\bHEADER\s*;(.*?)\bENDSEC\s*;", re.DOTALL)
+
+# Instance inside the HEADER section e.g. FILE_NAME('Drone',...); (';' inside strings is skipped)
+_HEADER_ENTITY_PATTERN = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)\s*\(((?:[^;']|'(?:[^']|'')*')*)\)\s*;")
+
+_COMMENT_PATTERN = re.compile(r"/\*.*?\*/|('(?:[^']|'')*')", re.DOTALL)
+
+# Attribute names of the HEADER instances by position (ISO 10303-21), other instances use the position as name
+HEADER_ATTRIBUTES = {
+    "FILE_DESCRIPTION": ["description", "implementation_level"],
+    "FILE_NAME": ["name", "time_stamp", "author", "organization", "preprocessor_version", "originating_system", "authorization"],
+    "FILE_SCHEMA": ["schema_identifiers"]
+}
+
+# End of an entity followed by the next one, the DATA section can be split there
+_CHUNK_BOUNDARY_PATTERN = re.compile(rb";[ \t]*\r?\n#")
+
+# DATA sections smaller than this are scanned in one process (starting worker processes costs more)
+PARALLEL_SCAN_MIN_BYTES = 64 * 1024 * 1024
+
+_PARAMETER_TOKEN_PATTERN = re.compile(r"""
+      (?P<ws>\s+)
+    | (?P<comment>/\*.*?(?:\*/|\Z))
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<open>\()
+    | (?P<close>\))
+    | (?P<comma>,)
+    | (?P<word>[^\s,()'/]+|/)
+""", re.VERBOSE | re.DOTALL)
+
+
+def find_data_section(content, start=0):
+    """
+    Returns the offset right after 'DATA;' (start of the first entity) or None if there is no DATA section
+
+    Parameters:
+        content : Bytes (or mmap). Content of the STEP file
+        start : Integer. Offset to start searching (e.g. end of the HEADER section)
+    """
+    match = _DATA_SECTION_PATTERN.search(content, start)
+    return match.end() if match else None
+
+
+def open_step_file(file_path):
+    """
+    Opens a STEP file as read-only memory map. Only the pages that are accessed are read from disk,
+    so memory stays flat regardless of the file size
+
+    Returns:
+        mmap (or b"" for an empty file)
+    """
+    with open(file_path, "rb") as file:
+        try:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # empty file cannot be mapped
+            return b""
+
+
+def read_header_section(content):
+    """
+    Returns the text between 'HEADER;' and 'ENDSEC;' or None. Only the beginning of the file is read, DATA is not touched
+
+    Parameters:
+        content : Bytes (or mmap). Content of the STEP file
+    """
+    match = _HEADER_SECTION_PATTERN.search(content)
+    if not match:
+        return None
+    return match.group(1).decode("utf-8", errors="replace")
+
+
+def parse_header(header_text):
+    """
+    Parses the HEADER section into section -> attribute -> decoded parameter (see decode_parameters)
+    e.g. FILE_NAME('Drone','2025-01-01',('author'),...); -> {"FILE_NAME": {"name": "Drone", "time_stamp": "2025-01-01", "author": ["author"], ...}}
+    Commas and semicolons inside strings are kept, comments (/* name */) are removed
+
+    Parameters:
+        header_text : String. Text of the HEADER section (see read_header_section)
+    """
+    # Remove comments outside of strings
+    header_text = _COMMENT_PATTERN.sub(lambda match: match.group(1) or " ", header_text)
+    header = {}
+    for match in _HEADER_ENTITY_PATTERN.finditer(header_text):
+        section_name = match.group(1).upper()
+        if section_name in header:
+            continue
+        parameters = decode_parameters(match.group(2))
+        attributes = HEADER_ATTRIBUTES.get(section_name, [])
+        header[section_name] = {attributes[position] if position < len(attributes) else str(position): parameter
+                                for position, parameter in enumerate(parameters)}
+    return header
+
+
+def format_header_value(value):
+    """ Returns a header attribute as text, lists of strings are joined e.g. ["author", "co-author"] -> "author, co-author" """
+    if isinstance(value, list):
+        return ", ".join(format_header_value(item) for item in value)
+    return value
+
+
+def iter_entities(content, start=0, end=None):
+    """
+    Iterates the entity instances of a STEP DATA section in file order without building an index
+
+    Parameters:
+        content : Bytes (or mmap). Content of the STEP file
+        start, end : Integer. Offsets of the part that is scanned (default whole content)
+
+    Returns:
+        Generator of (entity id (int), StepEntity(type, start, end))
+    """
+    for entity_id, entity_type, entity_start, entity_end in _iter_entity_tuples(content, start, end):
+        yield entity_id, StepEntity(entity_type, entity_start, entity_end)
+
+
+def _iter_entity_tuples(content, start=0, end=None):
+    # Same as iter_entities with plain tuples (id, type, start, end), creating StepEntity objects costs a lot for big files
+    if end is None:
+        end = len(content)
+    types = {} # reuse one str object per entity type
+    for match in _ENTITY_PATTERN.finditer(content, start, end):
+        entity_type = types.get(match.group(2))
+        if entity_type is None:
+            entity_type = types[match.group(2)] = match.group(2).decode("ascii")
+        parameters_end = content.rfind(b")", match.start(3), match.end(3))
+        if parameters_end < 0:
+            logger.warning(f"Skipping malformed STEP entity at offset {match.start()}")
+            continue
+        yield int(match.group(1)), entity_type, match.start(3), parameters_end
+
+
+def scan_entities(content, start=0, end=None):
+    """
+    Scans entity instances of a STEP DATA section in one pass
+
+    Parameters:
+        content : Bytes (or mmap). Content of the STEP file
+        start, end : Integer. Offsets of the part that is scanned (default whole content)
+
+    Returns:
+        Dictionary. entity id (int) -> (type, start, end), see StepIndex.get_entity
+    """
+    entities = {}
+    for entity_id, entity_type, entity_start, entity_end in _iter_entity_tuples(content, start, end):
+        if entity_id not in entities:
+            entities[entity_id] = (entity_type, entity_start, entity_end)
+    return entities
+
+
+def split_data_section(content, start, end, chunk_count):
+    """
+    Splits the DATA section into about equally sized chunks at ';\n#' boundaries (end of one entity, start of the next)
+    NOTE: A string parameter that contains ';' followed by a new line and '#' would be split, this does not occur in CAD exports
+
+    Parameters:
+        content : Bytes (or mmap). Content of the STEP file
+        start, end : Integer. Offsets of the DATA section
+        chunk_count : Integer. Number of chunks
+
+    Returns:
+        List of (start, end) offsets
+    """
+    boundaries = [start]
+    chunk_size = (end - start) // max(chunk_count, 1)
+    for chunk in range(1, chunk_count):
+        match = _CHUNK_BOUNDARY_PATTERN.search(content, max(start + chunk * chunk_size, boundaries[-1]), end)
+        if not match:
+            break
+        boundaries.append(match.end() - 1) # next chunk starts at '#'
+    boundaries.append(end)
+    return [(chunk_start, chunk_end) for chunk_start, chunk_end in zip(boundaries, boundaries[1:]) if chunk_start < chunk_end]
+
+
+def scan_entities_parallel(file_path, content, start, end=None, workers=None):
+    """
+    Scans the DATA section of a STEP file with one worker process per chunk (see split_data_section) 
+    and merges the partial indexes. Every worker maps the file itself, only the offsets are sent back
+
+    Parameters:
+        file_path : String. Path to the STEP file (opened by the workers)
+        content : Bytes (or mmap). Content of the same file (used to find the chunk boundaries)
+        start, end : Integer. Offsets of the DATA section (default until the end of the file)
+        workers : Integer. Number of processes, default is the number of CPU cores
+
+    Returns:
+        Dictionary. entity id (int) -> (type, start, end) (same as scan_entities)
+    """
+    if end is None:
+        end = len(content)
+    workers = workers or os.cpu_count() or 1
+    chunks = split_data_section(content, start, end, workers)
+    if len(chunks) < 2:
+        return scan_entities(content, start, end)
+
+    entities = {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        partials = list(executor.map(_scan_chunk, [file_path] * len(chunks), chunks))
+    # Merged in reverse file order, so the first instance of an id wins like in scan_entities
+    for entity_ids, entity_types, starts, ends in reversed(partials):
+        entities.update(zip(entity_ids, zip(entity_types, starts, ends)))
+    return entities
+
+
+def _scan_chunk(file_path, chunk):
+    # Worker process: columns (arrays of offsets) are much cheaper to send back than one object per entity
+    content = open_step_file(file_path)
+    entity_ids, entity_types, starts, ends = array("q"), [], array("q"), array("q")
+    seen = set()
+    try:
+        for entity_id, entity_type, entity_start, entity_end in _iter_entity_tuples(content, *chunk):
+            if entity_id in seen:
+                continue
+            seen.add(entity_id)
+            entity_ids.append(entity_id)
+            entity_types.append(entity_type)
+            starts.append(entity_start)
+            ends.append(entity_end)
+    finally:
+        if isinstance(content, mmap.mmap):
+            content.close()
+    return entity_ids, entity_types, starts, ends
+
+
+def decode_parameters(text):
+    """
+    Decodes a STEP parameter list e.g. "'Frame','',#11,(#12,#13),$,.T.,LENGTH_MEASURE(1.)"
+
+    Returns:
+        List. Strings are unquoted (e.g. 'Frame' -> "Frame"), lists become nested lists and
+        all other parameters (references, numbers, enumerations, '$', typed parameters) are kept as text
+        e.g. ["Frame", "", "#11", ["#12", "#13"], "$", ".T.", "LENGTH_MEASURE(1.)"]
+    """
+    tokens = [match for match in _PARAMETER_TOKEN_PATTERN.finditer(text) if match.lastgroup not in ("ws", "comment")]
+    values, _ = _decode_list(text, tokens, 0)
+    return values
+
+
+def _decode_list(text, tokens, position):
+    # Decodes parameters until the closing bracket of the current list (or the end of the tokens)
+    values = []
+    expect_value = True
+    while position < len(tokens):
+        token = tokens[position]
+        kind = token.lastgroup
+        if kind == "close":
+            return values, position + 1
+        if kind == "comma":
+            if expect_value: # empty parameter e.g. '(,)'
+                values.append("")
+            expect_value = True
+            position += 1
+            continue
+        if kind == "string":
+            values.append(token.group()[1:-1].replace("''", "'"))
+            position += 1
+        elif kind == "open":
+            nested, position = _decode_list(text, tokens, position + 1)
+            values.append(nested)
+        else:
+            # Typed parameter e.g. LENGTH_MEASURE(1.) is kept as text
+            if position + 1 < len(tokens) and tokens[position + 1].lastgroup == "open":
+                _, end_position = _decode_list(text, tokens, position + 2)
+                values.append(text[token.start():tokens[end_position - 1].end()])
+                position = end_position
+            else:
+                values.append(token.group())
+                position += 1
+        expect_value = False
+    return values, position
+
+
+def get_parameter(parameters, index_path):
+    """
+    Returns a decoded parameter by its position e.g. "1" or "3.0" (first item of the list parameter at position 3)
+
+    Parameters:
+        parameters : List. Decoded parameters (see decode_parameters)
+        index_path : String. Positions separated by '.'
+
+    Returns:
+        Parameter (string or list) or None if the position does not exist
+    """
+    value = parameters
+    for position in str(index_path).split("."):
+        if not isinstance(value, list) or not position.isdigit() or int(position) >= len(value):
+            return None
+        value = value[int(position)]
+    return value
+
+
+def get_parameter_span(text, index_path):
+    """
+    Returns the span of a parameter inside a parameter list (see get_parameter), e.g. to replace it without
+    decoding and formatting the other parameters again
+
+    Parameters:
+        text : String. Parameter list without the outer brackets (see StepIndex.get_parameter_text)
+        index_path : String. Positions separated by '.' e.g. "3.0"
+
+    Returns:
+        Tuple (start, end, is_string) or None if the position does not exist. Empty parameters are not supported
+    """
+    target = [int(position) for position in str(index_path).split(".") if position.isdigit()]
+    if len(target) != len(str(index_path).split(".")):
+        return None
+    tokens = [match for match in _PARAMETER_TOKEN_PATTERN.finditer(text) if match.lastgroup not in ("ws", "comment")]
+    path = [0]
+    position = 0
+    while position < len(tokens):
+        token = tokens[position]
+        kind = token.lastgroup
+        if kind == "comma":
+            path[-1] += 1
+            position += 1
+            continue
+        if kind == "close":
+            path.pop()
+            if not path:
+                return None
+            position += 1
+            continue
+        if kind == "open" and target[:len(path)] == path and len(target) > len(path):
+            # Position is inside this list
+            path.append(0)
+            position += 1
+            continue
+        # Parameter: string, word, typed parameter e.g. LENGTH_MEASURE(1.) or a whole list
+        end_position = position
+        if kind == "open" or (position + 1 < len(tokens) and tokens[position + 1].lastgroup == "open"):
+            end_position = _find_closing_token(tokens, position if kind == "open" else position + 1)
+        if path == target:
+            return token.start(), tokens[end_position].end(), kind == "string"
+        position = end_position + 1
+    return None
+
+
+def _find_closing_token(tokens, position):
+    # Returns the position of the bracket that closes the bracket at tokens[position] (or the last token)
+    depth = 0
+    for end_position in range(position, len(tokens)):
+        kind = tokens[end_position].lastgroup
+        if kind == "open":
+            depth += 1
+        elif kind == "close":
+            depth -= 1
+            if depth == 0:
+                return end_position
+    return len(tokens) - 1
+
+
+def find_parameter(parameters, value, prefix=""):
+    """ Returns the position (see get_parameter) of the first parameter equal to value (depth-first) or None """
+    for position, parameter in enumerate(parameters):
+        index_path = f"{prefix}{position}"
+        if isinstance(parameter, list):
+            if format_parameter(parameter) == value:
+                return index_path
+            found = find_parameter(parameter, value, prefix=index_path + ".")
+            if found is not None:
+                return found
+        elif parameter == value:
+            return index_path
+    return None
+
+
+def format_parameter(value):
+    """ Formats a decoded parameter (see decode_parameters) as STEP text, e.g. ["#12", "#13"] -> "(#12,#13)" """
+    if isinstance(value, list):
+        return "(" + ",".join(format_parameter(item) if isinstance(item, list) else _format_item(item) for item in value) + ")"
+    return value
+
+
+def format_parameter_value(old_text, value):
+    """
+    Formats a new value for a parameter before it replaces the parameter text old_text (see get_parameter_span)
+    The value has to fit the type of the old parameter: string, integer, real, enumeration, entity reference or list
+
+    Parameters:
+        old_text : String. Current STEP text of the parameter e.g. "'Motor'", "12.5", ".T.", "#12" or "$"
+        value : New value e.g. "Motor v2", 13, "#14" or ["#12", "#13"]
+
+    Returns:
+        String. STEP text of the value, None if the value does not fit (e.g. '12.5[mm]' for a real, 'abc' for a reference)
+        Typed parameters (e.g. LENGTH_MEASURE(1.)) are never replaced by plain values
+    """
+    old_text = old_text.strip()
+    if isinstance(value, list):
+        return format_parameter(value) if old_text.startswith("(") else None
+    text = str(value).strip()
+    if old_text.startswith("'"):
+        return "'" + str(value).replace("'", "''") + "'"
+    if re.fullmatch(r"\.[A-Za-z0-9_]+\.", old_text):
+        enumeration = text.strip(".").upper()
+        return f".{enumeration}." if re.fullmatch(r"[A-Z_][A-Z0-9_]*", enumeration) else None
+    if re.fullmatch(r"#\d+", old_text):
+        return text if re.fullmatch(r"#\d+", text) else None
+    if re.fullmatch(r"[+-]?\d+", old_text):
+        number = _to_number(text)
+        return str(int(number)) if number is not None and number.is_integer() else None
+    if re.fullmatch(r"[+-]?\d+\.\d*(?:[eE][+-]?\d+)?", old_text) or old_text in ("$", "*"):
+        # Unset parameters ($, *) only get references and numbers, their type is not known here
+        if old_text in ("$", "*") and re.fullmatch(r"#\d+", text):
+            return text
+        number = _to_number(text)
+        return _format_real(number) if number is not None else None
+    return None
+
+
+def _to_number(text):
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _format_real(number):
+    # STEP reals always contain a '.' e.g. 12. or 1.E-05
+    mantissa, _, exponent = repr(number).upper().partition("E")
+    mantissa = mantissa.rstrip("0") if "." in mantissa else mantissa + "."
+    return mantissa + ("E" + exponent if exponent else "")
+
+
+def _format_item(item):
+    # Decoded strings lost their quotes, everything that is not a STEP token (reference, number, enum, $, *) gets quoted again
+    if re.fullmatch(r"#\d+|[+-]?\d[\d.]*(?:[eE][+-]?\d+)?|\.[A-Za-z0-9_]+\.|\$|\*|[A-Za-z0-9_]+\(.*\)", item, re.DOTALL):
+        return item
+    return "'" + item.replace("'", "''") + "'"
+
+
+class StepIndex:
+    """
+    Entity index of one STEP file content
+    The HEADER section and the entity index are read lazily: reading a header field does not touch DATA.
+    Parameters of an entity are decoded on first access and kept afterwards
+
+    Attributes:
+        content : Bytes or mmap. Content of the STEP file (see from_file)
+        fingerprint : Dictionary. File fingerprint of the content (see utils/file_utils.py) or None
+        file_path : String. Path of the memory-mapped file, big DATA sections are then scanned in parallel (see scan_entities_parallel)
+        workers : Integer. Number of processes for the parallel scan, default is the number of CPU cores
+        data_start : Integer. Offset of the first entity (after 'DATA;'), None if there is no DATA section
+        entities : Dictionary. entity id (int) -> (type, start, end), use get_entity for a StepEntity
+    """
+
+    def __init__(self, content, fingerprint=None, file_path=None, workers=None):
+        self.content = content
+        self.fingerprint = fingerprint
+        self.file_path = file_path
+        self.workers = workers
+        self._header_text = None
+        self._header = None
+        self._data_start = None
+        self._entities = None
+        self._parameters = {} # entity id -> decoded parameters
+
+    @classmethod
+    def from_file(cls, file_path, fingerprint=None, workers=None):
+        """ Creates the index of a memory-mapped STEP file (see open_step_file) """
+        return cls(open_step_file(file_path), fingerprint=fingerprint, file_path=file_path, workers=workers)
+
+    @property
+    def header_text(self):
+        """ Text of the HEADER section (see read_header_section) """
+        if self._header_text is None:
+            self._header_text = read_header_section(self.content) or ""
+        return self._header_text
+
+    @property
+    def header(self):
+        """ Parsed HEADER section (see parse_header), parsed once per file content """
+        if self._header is None:
+            self._header = parse_header(self.header_text)
+        return self._header
+
+    def get_header_value(self, section_name, attribute):
+        """ Returns a HEADER attribute e.g. ("FILE_NAME", "name") as text (see format_header_value) or None """
+        value = self.header.get(section_name.upper(), {}).get(attribute)
+        return None if value is None else format_header_value(value)
+
+    @property
+    def data_start(self):
+        if self._data_start is None:
+            self._data_start = find_data_section(self.content)
+        return self._data_start
+
+    @property
+    def entities(self):
+        if self._entities is None:
+            if self.data_start is None:
+                self._entities = {}
+            elif self.file_path and (self.workers or os.cpu_count() or 1) > 1 \
+                    and len(self.content) - self.data_start >= PARALLEL_SCAN_MIN_BYTES:
+                try:
+                    self._entities = scan_entities_parallel(self.file_path, self.content, self.data_start, workers=self.workers)
+                except (OSError, RuntimeError) as e: # e.g. no worker processes allowed, BrokenProcessPool
+                    logger.warning(f"Parallel scan of {self.file_path} failed, scanning in one process: {e}")
+                    self._entities = scan_entities(self.content, self.data_start)
+            else:
+                self._entities = scan_entities(self.content, self.data_start)
+        return self._entities
+
+    def iter_entities(self):
+        """ Iterates all entities in file order without building the index (see iter_entities) """
+        if self.data_start is None:
+            return iter(())
+        return iter_entities(self.content, self.data_start)
+
+    def get_entity(self, entity_id):
+        """ Returns StepEntity(type, start, end) of an entity id (e.g. 11458 or "#11458") or None """
+        entity = self.entities.get(_to_entity_id(entity_id))
+        return StepEntity._make(entity) if entity is not None else None
+
+    def get_parameter_text(self, entity_id):
+        """ Returns the raw parameter list of an entity (e.g. "#58,#116") or None """
+        entity = self.get_entity(entity_id)
+        if entity is None:
+            return None
+        return self.content[entity.start:entity.end].decode("utf-8", errors="replace")
+
+    def get_parameters(self, entity_id):
+        """ Returns the decoded parameters of an entity (see decode_parameters) or None if the entity does not exist """
+        entity_id = _to_entity_id(entity_id)
+        if entity_id not in self._parameters:
+            text = self.get_parameter_text(entity_id)
+            if text is None:
+                return None
+            self._parameters[entity_id] = decode_parameters(text)
+        return self._parameters[entity_id]
+
+    def close(self):
+        """ Closes the memory map (e.g. before the file is replaced on Windows) """
+        if isinstance(self.content, mmap.mmap):
+            self.content.close()
+
+
+def _to_entity_id(entity_id):
+    if isinstance(entity_id, str):
+        entity_id = int(entity_id.lstrip("#"))
+    return entity_id
@@ -0,0 +1,632 @@
+import logging
+import re
+from bisect import bisect_right
+from collections import namedtuple
+
+# Tokenizer and brace-aware syntax tree for the SysMLv2 textual notation
+# The tree is built once per file and used by the SysmlParser (file_parser.py) for all queries
+# NOTE: This is NOT a full SysMLv2 grammar. It only understands the statement structure
+# (keywords, names, types, multiplicities, values, 'about' clauses and '{...}' bodies)
+# which is needed to query and edit the models used inside this masters thesis
+
+logger = logging.getLogger(__name__)
+
+Token = namedtuple("Token", ["kind", "value", "start", "end"])
+
+_TOKEN_PATTERN = re.compile(r"""
+      (?P<ws>\s+)
+    | (?P<line_comment>//[^\n]*)
+    | (?P<comment>/\*.*?(?:\*/|\Z))
+    | (?P<string>"(?:[^"\\]|\\.)*")
+    | (?P<quoted_name>'(?:[^'\\]|\\.)*')
+    | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<name>[A-Za-z_]\w*)
+    | (?P<symbol>:>>|::>|::|:>|:=|<=|>=|==|!=|\.\.|->|.)
+""", re.VERBOSE | re.DOTALL)
+
+# Leading tokens that only modify a statement (e.g. 'public import ...', 'ref item ...', 'in x = ...')
+MODIFIERS = {"public", "private", "protected", "abstract", "variation", "readonly", "derived",
+             "ref", "in", "out", "inout", "individual", "snapshot", "timeslice", "end"}
+
+# Keywords that define the kind of a statement (e.g. 'part', 'attribute', 'constraint')
+KIND_KEYWORDS = {"package", "library", "import", "alias", "part", "attribute", "item", "port", "connect",
+                 "connection", "interface", "constraint", "metadata", "requirement", "require", "assume",
+                 "assert", "subject", "doc", "comment", "action", "state", "enum", "calc", "occurrence",
+                 "view", "viewpoint", "concern", "rendering", "allocation", "flow", "satisfy", "verify",
+                 "perform", "exhibit", "use", "case", "analysis", "verification", "individual", "stakeholder",
+                 "objective", "actor", "bind", "succession", "first", "then", "transition", "entry", "exit"}
+
+# Statement kinds that do not declare a name
+UNNAMED_KINDS = {"import", "connect", "doc", "comment", "require constraint", "assume constraint",
+                 "assert constraint", "bind", "succession", "first", "then", "satisfy", "verify", "perform", "exhibit"}
+
+# Keywords between the kind and the name e.g. 'attribute redefines massReqd = 400[g];'
+RELATIONSHIP_TOKENS = {"redefines", "subsets", "specializes", "references", ":>", ":>>", "::>"}
+
+
+def tokenize(text, start=0, end=None):
+    """
+    Splits SysMLv2 text into tokens. Whitespace and line comments ('// ...') are skipped.
+    Block comments ('/* ... */') are kept as 'comment' tokens, because 'doc /* ... */' ends with them.
+
+    Parameters:
+        text : String. Content of the SysMLv2 file
+        start, end : Integer. Part of the text that is tokenized (default whole text), offsets stay relative to text
+
+    Returns:
+        Generator of Token(kind, value, start, end). start/end are character offsets inside text
+        kind is one of 'comment', 'string', 'name', 'number', 'symbol'
+    """
+    for match in _TOKEN_PATTERN.finditer(text, start, len(text) if end is None else end):
+        kind = match.lastgroup
+        if kind == "ws" or kind == "line_comment":
+            continue
+        value = match.group()
+        if kind == "quoted_name":
+            # 'Systems Engineer' -> Systems Engineer
+            kind = "name"
+            value = value[1:-1]
+        yield Token(kind, value, match.start(), match.end())
+
+
+class SysmlNode:
+    """
+    Single statement of a SysMLv2 model e.g. 'part def Drone { ... }' or 'attribute mass = 50[g];'
+
+    Attributes:
+        kind : String. Statement keyword(s) e.g. 'package', 'part def', 'attribute', 'metadata', 'feature'
+        name : String. Declared name or None (e.g. for '@PCB about ...' or 'connect a to b;')
+        declared_type : String. Type after ':' e.g. 'FlightController' or 'ISQ::MassValue'
+        multiplicity : String. Content of '[...]' after the type e.g. '4' or '0..*'
+        value : String. Raw text after '=' / 'default' e.g. '12.2[mm]' or '"drone-001"'
+        about : List of Strings. Targets of a metadata 'about' clause e.g. ['DroneExample::PartDefinitions::Drone']
+        start, end : Integer. Character offsets of the whole statement (incl. '{...}' or ';')
+        name_span, value_span, body_span : Tuple (start, end) or None
+        header_end : Integer. Offset of the token that ends the statement header (';' or '{')
+    """
+    __slots__ = ("kind", "name", "declared_type", "multiplicity", "value", "about", "start", "end",
+                 "name_span", "value_span", "body_span", "header_end", "children", "parent")
+
+    def __init__(self, kind, start, parent=None):
+        self.kind = kind
+        self.name = None
+        self.declared_type = None
+        self.multiplicity = None
+        self.value = None
+        self.about = []
+        self.start = start
+        self.end = start
+        self.name_span = None
+        self.value_span = None
+        self.body_span = None
+        self.header_end = start
+        self.children = []
+        self.parent = parent
+
+    def __repr__(self):
+        return f"SysmlNode({self.kind!r}, {self.name!r}, {self.start}:{self.end})"
+
+    @property
+    def qualified_name(self):
+        """ Dot separated path of all named ancestors e.g. 'DroneExample.PartDefinitions.Drone' """
+        names = []
+        node = self
+        while node is not None:
+            if node.name:
+                names.append(node.name)
+            node = node.parent
+        return ".".join(reversed(names))
+
+    def iter_nodes(self):
+        """ Depth first iteration over this node and all nested nodes """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def find_children(self, kinds=None, name=None):
+        """ Returns direct children filtered by kind(s) and/or name """
+        if isinstance(kinds, str):
+            kinds = (kinds,)
+        return [child for child in self.children
+                if (kinds is None or child.kind in kinds) and (name is None or child.name == name)]
+
+
+def parse_sysml(text):
+    """
+    Parses SysMLv2 text into a tree of SysmlNode objects (single pass over the tokens)
+    Unbalanced braces do not raise, the tree is closed at the end of the text
+
+    Parameters:
+        text : String. Content of the SysMLv2 file
+
+    Returns:
+        SysmlNode. Root node with kind 'root' containing all top level statements as children
+    """
+    tokens = list(tokenize(text))
+    root = SysmlNode("root", 0)
+    root.end = len(text)
+    root.body_span = (0, len(text))
+    position = _parse_body(text, tokens, 0, root)
+    if position < len(tokens):
+        logger.warning(f"Unbalanced '}}' at offset {tokens[position].start}. Ignoring rest of the model.")
+    return root
+
+
+def _parse_body(text, tokens, position, parent):
+    """ Parses statements until the closing '}' of parent (or end of tokens). Returns position of that '}' """
+    token_count = len(tokens)
+    while position < token_count:
+        token = tokens[position]
+        if token.kind == "comment":
+            position += 1
+            continue
+        if token.kind == "symbol" and token.value == "}":
+            return position
+        if token.kind == "symbol" and token.value == ";":
+            position += 1  # Empty statement
+            continue
+        position = _parse_statement(text, tokens, position, parent)
+    return position
+
+
+def _parse_statement(text, tokens, position, parent):
+    """ Parses one statement starting at position and appends it to parent. Returns the next position """
+    token_count = len(tokens)
+    header = []
+    depth = 0 # depth of '(' and '[' inside the header
+    node = SysmlNode(None, tokens[position].start, parent)
+    terminator = None
+
+    while position < token_count:
+        token = tokens[position]
+        if token.kind == "comment":
+            position += 1
+            # 'doc /* ... */' and 'comment /* ... */' end with their comment
+            if header and header[0].value in ("doc", "comment"):
+                node.end = token.end
+                terminator = token
+                break
+            continue
+        if token.kind == "symbol":
+            if token.value in ("(", "["):
+                depth += 1
+            elif token.value in (")", "]"):
+                depth = max(depth - 1, 0)
+            elif depth == 0 and token.value in (";", "{", "}"):
+                terminator = token
+                break
+        header.append(token)
+        position += 1
+
+    if terminator is None or terminator.kind == "comment" or terminator.value == "}":
+        # Statement without ';' e.g. the expression inside 'require constraint { a <= b }'
+        node.header_end = header[-1].end if header else node.start
+        node.end = max(node.end, node.header_end)
+    elif terminator.value == ";":
+        node.header_end = terminator.start
+        node.end = terminator.end
+        position += 1
+    else: # '{'
+        node.header_end = terminator.start
+        position = _parse_body(text, tokens, position + 1, node)
+        if position < token_count:
+            node.body_span = (terminator.end, tokens[position].start)
+            node.end = tokens[position].end
+            position += 1
+        else:
+            logger.warning(f"Missing '}}' for statement at offset {node.start}")
+            node.body_span = (terminator.end, len(text))
+            node.end = len(text)
+
+    _classify(text, node, header)
+    parent.children.append(node)
+    return position
+
+
+def _classify(text, node, header):
+    """ Derives kind, name, type, multiplicity, value and about targets from the header tokens """
+    index = 0
+    count = len(header)
+    while index < count and header[index].kind == "name" and header[index].value in MODIFIERS:
+        index += 1
+
+    # Kind
+    if index < count and header[index].value == "@":
+        node.kind = "metadata"
+        index += 1
+    elif index < count and header[index].kind == "name" and header[index].value in KIND_KEYWORDS:
+        node.kind = header[index].value
+        index += 1
+        if index < count and header[index].value == "def":
+            node.kind += " def"
+            index += 1
+        elif node.kind in ("require", "assume", "assert") and index < count and header[index].value == "constraint":
+            node.kind += " constraint"
+            index += 1
+    elif index < count and (header[index].kind == "name" or header[index].value in RELATIONSHIP_TOKENS) \
+            and _declares_feature(header, index):
+        node.kind = "feature" # e.g. 'in massLimit : MassValue;' inside constraint def
+    else:
+        node.kind = "expression"
+        if header:
+            node.value_span = (header[index].start if index < count else header[0].start, header[-1].end)
+            node.value = text[node.value_span[0]:node.value_span[1]]
+        return
+
+    if node.kind in UNNAMED_KINDS:
+        return
+
+    # Short name e.g. requirement def <'1'> MassLimitationRequirement
+    if index < count and header[index].value == "<":
+        while index < count and header[index].value != ">":
+            index += 1
+        index += 1
+
+    while index < count and header[index].value in RELATIONSHIP_TOKENS:
+        index += 1
+
+    # Name (for '@PCB about ...' the single name is the type of the metadata usage)
+    if index < count and header[index].kind == "name" and header[index].value not in ("about", "default"):
+        name_token = header[index]
+        index += 1
+        if node.kind == "metadata" and (index >= count or header[index].value not in (":", "defined")):
+            node.declared_type, index = _read_qualified_name(header, index - 1)
+        else:
+            node.name = name_token.value
+            node.name_span = (name_token.start, name_token.end)
+
+    # Type and multiplicity
+    if index < count and header[index].value in (":", "defined"):
+        index += 2 if header[index].value == "defined" else 1 # 'defined by'
+        while index < count and header[index].value in RELATIONSHIP_TOKENS:
+            index += 1
+        node.declared_type, index = _read_qualified_name(header, index)
+    if index < count and header[index].value == "[":
+        closing = index
+        while closing < count and header[closing].value != "]":
+            closing += 1
+        if closing < count:
+            node.multiplicity = text[header[index].end:header[closing].start].strip()
+        index = closing + 1
+
+    # Remaining header: 'about' clause or value
+    while index < count:
+        token = header[index]
+        if token.value == "about":
+            target, index = _read_qualified_name(header, index + 1)
+            while target:
+                node.about.append(target)
+                if index < count and header[index].value == ",":
+                    target, index = _read_qualified_name(header, index + 1)
+                else:
+                    break
+            continue
+        if token.value in ("=", ":=", "default"):
+            index += 1
+            if token.value == "default" and index < count and header[index].value in ("=", ":="):
+                index += 1
+            if index < count:
+                node.value_span = (header[index].start, header[-1].end)
+                node.value = text[node.value_span[0]:node.value_span[1]]
+            break
+        index += 1
+
+
+def _declares_feature(header, index):
+    """ True if the header looks like a feature declaration 'name : Type' / 'name = value' (and not an expression) """
+    while index < len(header) and header[index].value in RELATIONSHIP_TOKENS:
+        index += 1
+    return index + 1 < len(header) and header[index].kind == "name" \
+        and header[index + 1].value in (":", "=", ":=", "default", "[")
+
+
+def _read_qualified_name(header, index):
+    """ Reads 'A::B::C' starting at index. Returns (qualified name or None, next index) """
+    parts = []
+    count = len(header)
+    while index < count and header[index].kind == "name":
+        parts.append(header[index].value)
+        index += 1
+        if index < count and header[index].value in ("::", "."):
+            index += 1
+        else:
+            break
+    return ("::".join(parts) if parts else None), index
+
+
+def apply_edits(text, edits):
+    """
+    Applies span replacements to a text in one sweep, everything outside of the spans is kept as it is
+
+    Parameters:
+        text : String. Content of the SysMLv2 file
+        edits : List of (start, end, replacement). Spans must not overlap, the order does not matter
+
+    Returns:
+        String. The edited text
+    """
+    pieces = []
+    position = 0
+    for start, end, replacement in sorted(edits, key=lambda edit: (edit[0], edit[1])):
+        if start < position:
+            raise ValueError(f"Overlapping edits at offset {start}")
+        pieces.append(text[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+class SysmlModel:
+    """
+    Parsed SysMLv2 file: content, syntax tree and derived indexes 
+    Indexes are built lazily on first use and belong to exactly one content (see fingerprint)
+    A model of changed content can be derived incrementally (see apply_edits and reparse), once it is committed 
+    it takes over the syntax tree of this model, which is parsed again if it is still used
+
+    Attributes:
+        content : String. Content of the SysMLv2 file
+        tree : SysmlNode. Root node of the syntax tree
+        fingerprint : Dictionary. File fingerprint of the content (see utils/file_utils.py) or None
+        tag_indexes : Dictionary. Inverted metadata tag indexes of this content (see SysmlParser.get_metadata_tag_index)
+        constraints : Dictionary. Compiled constraints of this content (see SysmlParser.compile_constraint)
+    """
+
+    def __init__(self, content, fingerprint=None, tree=None, source=None):
+        self.content = content
+        self.fingerprint = fingerprint
+        self.tag_indexes = {}
+        self.constraints = {}
+        # (model, its tree, function that turns that tree into the tree of this content) until commit() 
+        self._source = source
+        self._tree = tree if tree is not None or source is not None else parse_sysml(content)
+        self._qualified_index = None
+        self._definition_index = None
+        self._line_starts = None
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = parse_sysml(self.content)
+        return self._tree
+
+    def commit(self):
+        """
+        Takes over the syntax tree of the model this model has been derived from (see apply_edits and reparse), 
+        to be called once this model replaces the other one (e.g. stored in SYSML_MODEL_CACHE). The other model 
+        parses its content again if it is still used. Without commit both models keep a tree of their own content
+
+        Returns:
+            SysmlModel. This model
+        """
+        if self._source is None:
+            return self
+        source_model, source_tree, build_tree = self._source
+        self._source = None
+        if self._tree is None and source_model._tree is source_tree:
+            source_model._tree = None
+            source_model._qualified_index = None
+            source_model._definition_index = None
+            self._tree = build_tree()
+        return self
+
+    def apply_edits(self, edits, fingerprint=None):
+        """
+        Returns the model of the content with span edits applied (see apply_edits function), this model if nothing changes
+        If every edit replaces a whole value (e.g. '1.0[mm]' of 'attribute len = 1.0[mm];') by a simple value, 
+        nothing is parsed again: on commit() the values are set and the offsets of the following nodes are shifted.
+        Other edits are parsed again with reparse
+
+        Parameters:
+            edits : List of (start, end, replacement)
+            fingerprint : Dictionary. File fingerprint of the new content or None
+        """
+        content = apply_edits(self.content, edits)
+        if content == self.content:
+            return self
+        edits = sorted(edits, key=lambda edit: (edit[0], edit[1]))
+        value_nodes = {node.value_span: node for node in self.tree.iter_nodes() if node.value_span is not None}
+        if not all((start, end) in value_nodes and _is_simple_value(replacement) for start, end, replacement in edits):
+            return self.reparse(content, fingerprint)
+
+        tree = self.tree
+        def build_tree():
+            _shift_nodes(tree, edits)
+            for start, end, replacement in edits:
+                node = value_nodes[(start, end)]
+                node.value = replacement
+                node.value_span = (node.value_span[0], node.value_span[0] + len(replacement))
+            return tree
+        return SysmlModel(content, fingerprint, source=(self, tree, build_tree))
+
+    def reparse(self, content, fingerprint=None):
+        """
+        Returns the model of changed content (e.g. after the file has been changed by an editor), this model if nothing changes
+        Only the changed part is located with a text diff (common prefix and suffix). If it is inside the body of
+        one statement '{...}', only that body is tokenized and parsed again, on commit() it replaces the old body 
+        and the offsets of the following nodes are shifted. Otherwise the whole content is parsed
+
+        Parameters:
+            content : String. New content
+            fingerprint : Dictionary. File fingerprint of the new content or None
+        """
+        old_content = self.content
+        if content == old_content:
+            if fingerprint is not None:
+                self.fingerprint = fingerprint
+            return self
+        prefix = _common_prefix_length(old_content, content)
+        suffix = _common_suffix_length(old_content, content, min(len(old_content), len(content)) - prefix)
+        change_start, old_change_end, new_change_end = prefix, len(old_content) - suffix, len(content) - suffix
+
+        # Innermost statement whose body contains the whole change
+        node = None
+        candidates = self.tree.children
+        while candidates:
+            parent = next((child for child in candidates if child.body_span is not None and child.end - 1 == child.body_span[1]
+                           and child.body_span[0] <= change_start and old_change_end <= child.body_span[1]), None)
+            if parent is None:
+                break
+            node = parent
+            candidates = node.children
+        if node is None:
+            return SysmlModel(content, fingerprint)
+
+        # Body is parsed again up to its closing '}' (which has not been changed)
+        body_start, body_end = node.body_span[0], node.body_span[1] + new_change_end - old_change_end
+        tokens = list(tokenize(content, body_start, body_end + 1))
+        if not tokens or tokens[-1].start != body_end or tokens[-1].value != "}" \
+                or any(token.kind == "symbol" and token.value in ('"', "'") for token in tokens):
+            # e.g. unclosed string/comment or '}' inside the change, the structure outside of the body may be different
+            return SysmlModel(content, fingerprint)
+        body = SysmlNode(node.kind, node.start)
+        if _parse_body(content, tokens, 0, body) != len(tokens) - 1: # has to stop at the closing '}' of the body
+            return SysmlModel(content, fingerprint)
+
+        tree = self.tree
+        def build_tree():
+            node.children = []
+            _shift_nodes(tree, [(change_start, old_change_end, content[change_start:new_change_end])])
+            node.body_span = (body_start, body_end) # text inserted at the start of the body belongs to the body
+            for child in body.children:
+                child.parent = node
+            node.children = body.children
+            return tree
+        return SysmlModel(content, fingerprint, source=(self, tree, build_tree))
+
+    @property
+    def qualified_index(self):
+        """ Dictionary fully qualified name (e.g. 'DroneExample.PartDefinitions.Drone.fc') -> SysmlNode """
+        if self._qualified_index is None:
+            self._qualified_index = build_qualified_index(self.tree)
+        return self._qualified_index
+
+    def get_element(self, element_path):
+        """ Returns the node of a fully qualified element path or None (single dictionary lookup) """
+        return self.qualified_index.get(element_path)
+
+    def resolve_reference(self, reference, scope=None):
+        """
+        Returns the node a reference points to (e.g. 'about PartDefinitions::FlightController;') or None
+        Like the SysML name resolution the reference is looked up inside scope and its enclosing namespaces, 
+        then as fully qualified name. A single name that is not visible from scope is looked up 
+        as definition ('part def', 'metadata def', ...) anywhere in the model (first one wins)
+
+        Parameters:
+            reference : String. '::' or '.' separated name
+            scope : SysmlNode. Node that contains the reference (e.g. metadata usage), default is the root namespace
+        """
+        path = reference.replace("::", ".").strip(".")
+        while scope is not None:
+            prefix = scope.qualified_name
+            node = self.get_element(f"{prefix}.{path}" if prefix else path)
+            if node is not None:
+                return node
+            scope = scope.parent
+        node = self.get_element(path)
+        if node is None and "." not in path:
+            if self._definition_index is None:
+                self._definition_index = {}
+                for definition in self.tree.iter_nodes():
+                    if definition.name and definition.kind.endswith(" def"):
+                        self._definition_index.setdefault(definition.name, definition)
+            node = self._definition_index.get(path)
+        return node
+
+    def get_line_column(self, offset):
+        """ Returns (line, column) of a character offset, line is 1-based and column 0-based (same as tkinter 'line.column') """
+        if self._line_starts is None:
+            self._line_starts = [0] + [match.end() for match in re.finditer("\n", self.content)]
+        line = bisect_right(self._line_starts, offset)
+        return line, offset - self._line_starts[line - 1]
+
+    def get_text(self, span):
+        """ Returns the text of a span (start, end) e.g. node.body_span """
+        return self.content[span[0]:span[1]]
+
+
+def _is_simple_value(text):
+    """ True if text can replace a value without changing the statement structure e.g. '12.5[mm]' or '"drone-001"' """
+    if not text or text != text.strip() or "//" in text or "/*" in text:
+        return False
+    depth = 0
+    for token in tokenize(text):
+        if token.kind == "symbol":
+            if token.value in (";", "{", "}", '"', "'", "="):
+                return False
+            depth += {"(": 1, "[": 1, ")": -1, "]": -1}.get(token.value, 0)
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+def _shift_nodes(root, edits):
+    """ Moves all offsets of a tree behind span edits (sorted, not overlapping) by the length differences of the edits """
+    ends = [end for _, end, _ in edits]
+    shifts = [0]
+    for start, end, replacement in edits:
+        shifts.append(shifts[-1] + len(replacement) - (end - start))
+    if shifts[-1] == 0 and all(len(replacement) == end - start for start, end, replacement in edits):
+        return
+
+    def shift(offset):
+        return offset + shifts[bisect_right(ends, offset)]
+
+    for node in root.iter_nodes():
+        node.start = shift(node.start)
+        node.end = shift(node.end)
+        node.header_end = shift(node.header_end)
+        if node.name_span is not None:
+            node.name_span = (shift(node.name_span[0]), shift(node.name_span[1]))
+        if node.value_span is not None:
+            node.value_span = (shift(node.value_span[0]), shift(node.value_span[1]))
+        if node.body_span is not None:
+            node.body_span = (shift(node.body_span[0]), shift(node.body_span[1]))
+
+
+def _common_prefix_length(a, b):
+    """ Length of the common prefix of two strings (binary search, compared in C) """
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix_length(a, b, limit):
+    """ Length of the common suffix of two strings, at most limit characters """
+    low, high = 0, max(limit, 0)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:len(a) - low] == b[len(b) - middle:len(b) - low]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def build_qualified_index(root):
+    """
+    Builds the index fully qualified name -> SysmlNode for all named nodes of a tree
+    Unnamed nodes (e.g. 'require constraint {...}') are transparent. If a name is declared twice the first one wins
+
+    Parameters:
+        root : SysmlNode. Root node from parse_sysml
+
+    Returns:
+        Dictionary. e.g. {'DroneExample': <package>, 'DroneExample.PartDefinitions': <package>, ...}
+    """
+    index = {}
+    stack = [(child, "") for child in reversed(root.children)]
+    while stack:
+        node, prefix = stack.pop()
+        if node.name:
+            prefix = f"{prefix}.{node.name}" if prefix else node.name
+            index.setdefault(prefix, node)
+        stack.extend((child, prefix) for child in reversed(node.children))
+    return index
@@ -0,0 +1,363 @@
+import unittest
+import os
+import json
+import tempfile
+import mmap
+import shutil
+
+from file_parser import GerberParser, CodeParser, StepParser, compile_gerber_path
+from metadata_manager import MetadataManager
+from utils.config_utils import load_config
+from unittest import mock
+import step_index
+import code_metadata
+from code_metadata import SourceTreeIndex
+from step_index import StepIndex, format_parameter_value, decode_parameters, split_data_section, scan_entities, get_parameter, find_parameter, parse_header
+
+GERBER_JOB = {
+    "Header": {"GenerationSoftware": {"Vendor": "KiCad"}},
+    "GeneralSpecs": {"ProjectId": {"Name": "Hades"}, "Size": {"X": 15, "Y": 12.5}},
+    "DesignRules": [{"Layers": "Outer", "PadToPad": 0.2}, {"Layers": "Inner", "PadToPad": 0.15}]
+}
+
+CODE = '''@metadata("id", "fc-001", "", "string", "PCBDesign", "FlightController.id")
+@metadata("mass", "50", "g", "int", "PCBDesign", "FlightController.mass")
+class FlightController:
+    pass
+'''
+
+STEP = """ISO-10303-21;
+HEADER;
+FILE_DESCRIPTION(('drone'),'2;1');
+FILE_NAME('Drone','2025-01-01T00:00:00',('author'),('org'),'pre','sys','auth');
+FILE_SCHEMA(('AP242'));
+ENDSEC;
+DATA;
+#1=PRODUCT('Motor','Motor; brushless','',(#2));
+#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE('NAUO1','Frame','',#11,#12,$);
+#11=PRODUCT_DEFINITION('design','',#13,
+  #14);
+#12=(LENGTH_UNIT()NAMED_UNIT(*)SI_UNIT(.MILLI.,.METRE.));
+ENDSEC;
+END-ISO-10303-21;
+"""
+
+
+class TestDomainParsers(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = []
+
+    def tearDown(self):
+        for path in self.paths:
+            os.remove(path)
+
+    def write_temp_file(self, content, suffix):
+        temp_file = tempfile.NamedTemporaryFile("w", delete=False, suffix=suffix)
+        temp_file.write(content)
+        temp_file.close()
+        self.paths.append(temp_file.name)
+        return temp_file.name
+
+    def test_gerber_get_values(self):
+        parser = GerberParser(gerber_file_path=self.write_temp_file(json.dumps(GERBER_JOB), ".gbrjob"))
+        values = parser.get_values(["GeneralSpecs.Size.X", "GeneralSpecs.ProjectId.Name", "GeneralSpecs.Unknown"])
+        self.assertEqual(values, {"GeneralSpecs.Size.X": 15, "GeneralSpecs.ProjectId.Name": "Hades", "GeneralSpecs.Unknown": None})
+        self.assertEqual(parser.get_value("GeneralSpecs.Size.Y"), 12.5)
+
+    def test_gerber_list_indexes_and_cache(self):
+        gerber_path = self.write_temp_file(json.dumps(GERBER_JOB), ".gbrjob")
+        parser = GerberParser(gerber_file_path=gerber_path)
+        values = parser.get_values(["DesignRules[1].PadToPad", "DesignRules[0].Layers", "DesignRules[2].PadToPad", "DesignRules.0"])
+        self.assertEqual(values, {"DesignRules[1].PadToPad": 0.15, "DesignRules[0].Layers": "Outer",
+                                  "DesignRules[2].PadToPad": None, "DesignRules.0": None})
+        self.assertEqual(compile_gerber_path("DesignRules[0].PadToPad"), ("DesignRules", 0, "PadToPad"))
+        self.assertIsNone(compile_gerber_path("DesignRules..PadToPad"))
+        # Job file is parsed once for all parser instances until it changes
+        self.assertIs(GerberParser(gerber_file_path=gerber_path).get_job_file(), parser.get_job_file())
+        with open(gerber_path, "w") as f:
+            json.dump({"GeneralSpecs": {"Size": {"X": 20}}}, f)
+        self.assertEqual(parser.get_value("GeneralSpecs.Size.X"), 20)
+
+    def test_gerber_set_values(self):
+        gerber_path = self.write_temp_file(json.dumps(GERBER_JOB), ".gbrjob")
+        parser = GerberParser(gerber_file_path=gerber_path)
+        self.assertEqual(parser.get_value("GeneralSpecs.Size.X"), 15)
+        self.assertTrue(parser.set_values({"GeneralSpecs.Size.X": "20", "DesignRules[1].PadToPad": "0.1", "GeneralSpecs.ProjectId.Name": "Ares"}))
+        self.assertEqual(parser.get_values(["GeneralSpecs.Size.X", "DesignRules[1].PadToPad", "GeneralSpecs.ProjectId.Name"]),
+                         {"GeneralSpecs.Size.X": 20, "DesignRules[1].PadToPad": 0.1, "GeneralSpecs.ProjectId.Name": "Ares"})
+        with open(gerber_path) as f:
+            self.assertEqual(list(json.load(f)), ["Header", "GeneralSpecs", "DesignRules"])
+        # Unknown paths are not created, the file is not written
+        self.assertFalse(parser.set_values({"GeneralSpecs.Size.Z": 1}))
+        # Format of the file is kept, only the changed line differs
+        original = (json.dumps(dict(GERBER_JOB, Header={"Vendor": "Kicad µ"}), indent=2, ensure_ascii=False).replace("\n", "\r\n") + "\r\n").encode("utf-8")
+        with open(gerber_path, "wb") as f:
+            f.write(original)
+        self.assertTrue(parser.set_values({"GeneralSpecs.Size.Y": "13"}))
+        with open(gerber_path, "rb") as f:
+            content = f.read()
+        self.assertEqual(content, original.replace(b'"Y": 12.5', b'"Y": 13.0'))
+
+    def test_step_set_values(self):
+        step_path = self.write_temp_file(STEP, ".stp")
+        parser = StepParser(step_file_path=step_path)
+        old_index = parser.get_index()
+        self.assertTrue(parser.set_values({("DATA.#1=PRODUCT", "1"): "Motor's, v2", ("DATA.#1=PRODUCT", "3.0"): "#11",
+                                           ("DATA.#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE", "0"): "NAUO2"}))
+        # Only the parameter spans are replaced, the old memory map is closed
+        with open(step_path) as f:
+            content = f.read()
+        self.assertEqual(content, STEP.replace("'Motor; brushless','',(#2)", "'Motor''s, v2','',(#11)").replace("'NAUO1'", "'NAUO2'"))
+        self.assertTrue(old_index.content.closed)
+        self.assertEqual(parser.get_value("DATA.#1=PRODUCT", index="1"), "Motor's, v2")
+        self.assertEqual(parser.get_value("DATA.#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE"), "NAUO2")
+
+        # Overlapping parameters: only the first one is written
+        self.assertEqual(parser.set_values({("DATA.#1=PRODUCT", "3"): ["#2"], ("DATA.#1=PRODUCT", "3.0"): "#13"}),
+                         {("DATA.#1=PRODUCT", "3")})
+        with open(step_path) as f:
+            content = f.read()
+        self.assertIn("#1=PRODUCT('Motor','Motor''s, v2','',(#2));", content)
+        self.assertEqual(parser.set_values({"DATA.#99=PRODUCT": "x"}), set())
+        with open(step_path) as f:
+            self.assertEqual(f.read(), content)
+
+    def test_step_set_values_per_element(self):
+        step_path = self.write_temp_file(STEP.replace("ENDSEC;\nEND", "#20=CARTESIAN_POINT('',(0.,1.5,2.));\n"
+                                                      "#21=DIMENSIONAL_EXPONENTS(1,0,0,0,0,0,0);\n"
+                                                      "#22=PRODUCT_RELATED_PRODUCT_CATEGORY('part',$,(#1));\nENDSEC;\nEND"), ".stp")
+        parser = StepParser(step_file_path=step_path)
+        written = parser.set_values({"HEADER.FILE_NAME": "Drone2", ("DATA.#1=PRODUCT", "0"): "Motor2",
+                                     ("DATA.#20=CARTESIAN_POINT", "1.1"): "12.5[mm]", ("DATA.#20=CARTESIAN_POINT", "1.2"): "3",
+                                     ("DATA.#21=DIMENSIONAL_EXPONENTS", "0"): "2.5", ("DATA.#21=DIMENSIONAL_EXPONENTS", "1"): "2",
+                                     ("DATA.#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE", "3"): "abc",
+                                     ("DATA.#12=", "0"): "1", ("DATA.#22=PRODUCT_RELATED_PRODUCT_CATEGORY", "1"): "1e-5"})
+        # HEADER elements and values that do not fit the parameter type are skipped, the rest is written
+        self.assertEqual(written, {("DATA.#1=PRODUCT", "0"), ("DATA.#20=CARTESIAN_POINT", "1.2"),
+                                   ("DATA.#21=DIMENSIONAL_EXPONENTS", "1"), ("DATA.#22=PRODUCT_RELATED_PRODUCT_CATEGORY", "1")})
+        with open(step_path) as f:
+            content = f.read()
+        self.assertIn("FILE_NAME('Drone',", content)
+        self.assertIn("#1=PRODUCT('Motor2',", content)
+        self.assertIn("#20=CARTESIAN_POINT('',(0.,1.5,3.));", content)
+        self.assertIn("#21=DIMENSIONAL_EXPONENTS(1,2,0,0,0,0,0);", content)
+        self.assertIn("#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE('NAUO1','Frame','',#11,#12,$);", content)
+        self.assertIn("#22=PRODUCT_RELATED_PRODUCT_CATEGORY('part',1.E-05,(#1));", content)
+
+    def test_step_format_parameter_value(self):
+        self.assertEqual(format_parameter_value(".MILLI.", "centi"), ".CENTI.")
+        self.assertEqual(format_parameter_value(".T.", ".F."), ".F.")
+        self.assertIsNone(format_parameter_value(".T.", "1"))
+        self.assertEqual(format_parameter_value("#11", " #14"), "#14")
+        self.assertIsNone(format_parameter_value("#11", "abc"))
+        self.assertEqual(format_parameter_value("2.", "10"), "10.")
+        self.assertEqual(format_parameter_value("2.E+01", 1.5e20), "1.5E+20")
+        self.assertIsNone(format_parameter_value("2.", "nan"))
+        self.assertEqual(format_parameter_value("1", "4.0"), "4")
+        self.assertIsNone(format_parameter_value("1", "4.5"))
+        self.assertIsNone(format_parameter_value("LENGTH_MEASURE(1.)", "2."))
+        self.assertEqual(format_parameter_value("(#2)", ["#2", "#3"]), "(#2,#3)")
+
+    def test_code_get_values(self):
+        parser = CodeParser(code_file_path=self.write_temp_file(CODE, ".py"))
+        values = parser.get_values(["FlightController.mass", "FlightController.id", "FlightController.unknown"])
+        self.assertEqual(values, {"FlightController.mass": "50", "FlightController.id": "fc-001", "FlightController.unknown": None})
+        with self.assertRaises(ValueError):
+            parser.get_value("FlightController.unknown")
+
+    def test_code_metadata_ast_index(self):
+        code = CODE + """
+@metadata(name='speed', value=100, unit='rpm', dataType='int',
+          elementPath='Motor.speed')
+@metadata("voltage", "12", "V", "int")
+class Motor:
+    pass
+"""
+        parser = CodeParser(code_file_path=self.write_temp_file(code, ".py"))
+        records = parser.get_metadata_records()
+        self.assertEqual(list(records), ["FlightController.id", "FlightController.mass", "Motor.speed", "Motor.voltage"])
+        self.assertEqual(records["Motor.speed"].value, 100)
+        self.assertEqual(records["Motor.speed"].line, CODE.count("\n") + 2)
+        self.assertEqual(parser.get_value("Motor.voltage"), "12")
+        # Index is parsed once per file content
+        self.assertIs(CodeParser(code_file_path=parser.code_file_path).get_metadata_records(), records)
+        self.assertEqual(CodeParser(code_file_path=self.write_temp_file("class (:", ".py")).get_metadata_records(), {})
+
+    def test_code_source_tree_index(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        os.makedirs(os.path.join(root, "drivers", "__pycache__"))
+        for name in range(5):
+            with open(os.path.join(root, "drivers", f"motor{name}.py"), "w") as f:
+                f.write(f'@metadata("speed", "{name}00", "rpm", "int", "PCB", "Motor{name}.speed")\nclass Motor{name}:\n    pass\n')
+        with open(os.path.join(root, "fc.py"), "w") as f:
+            f.write(CODE)
+        with open(os.path.join(root, "drivers", "__pycache__", "skipped.py"), "w") as f:
+            f.write('@metadata("x", "1", "", "int", "PCB", "Skipped.x")\nclass Skipped:\n    pass\n')
+
+        parser = CodeParser(code_file_path=root)
+        parser.index_dir = os.path.join(root, "index")
+        self.assertEqual(parser.get_values(["Motor3.speed", "FlightController.mass", "Skipped.x"]),
+                         {"Motor3.speed": "300", "FlightController.mass": "50", "Skipped.x": None})
+        # Later lookups reuse the index until it is invalidated, the directory is not walked again
+        with mock.patch.object(SourceTreeIndex, "iter_source_files") as walk_mock:
+            self.assertEqual(parser.find_element("FlightController.mass"), (os.path.join(root, "fc.py"), 2, "50"))
+            self.assertEqual(parser.get_values(["Motor2.speed"]), {"Motor2.speed": "200"})
+        walk_mock.assert_not_called()
+        with open(os.path.join(root, "drivers", "motor2.py"), "w") as f:
+            f.write('@metadata("speed", "210", "rpm", "int", "PCB", "Motor2.speed")\nclass Motor2:\n    pass\n')
+        self.assertEqual(parser.get_values(["Motor2.speed"]), {"Motor2.speed": "200"})
+        parser.invalidate_source_tree_indexes()
+        self.assertEqual(parser.get_values(["Motor2.speed"]), {"Motor2.speed": "210"})
+
+        # Next run: persisted index is loaded, only changed files are parsed (in worker processes)
+        index_file_path = parser.get_source_tree_index().index_file_path
+        self.assertEqual(SourceTreeIndex(root, index_file_path).refresh(), 0)
+        with open(os.path.join(root, "drivers", "motor3.py"), "w") as f:
+            f.write('@metadata(name="speed", value="310", unit="rpm", dataType="int", elementPath="Motor3.speed")\nclass Motor3:\n    pass\n')
+        os.remove(os.path.join(root, "drivers", "motor4.py"))
+        with mock.patch.object(code_metadata, "PARALLEL_PARSE_MIN_FILES", 0):
+            tree_index = SourceTreeIndex(root, index_file_path, workers=2)
+            self.assertEqual(tree_index.refresh(), 1)
+        self.assertEqual(tree_index.get("Motor3.speed")[1].value, "310")
+        self.assertIsNone(tree_index.get("Motor4.speed"))
+
+    def test_step_get_values_header(self):
+        step_path = self.write_temp_file(STEP, ".stp")
+        parser = StepParser(step_file_path=step_path)
+        with mock.patch("utils.file_utils.hashlib.sha1") as sha1_mock:
+            values = parser.get_values(["FILE_NAME.name", "FILE_NAME.time_stamp", "FILE_NAME.unknown"])
+        self.assertEqual(values, {"FILE_NAME.name": "Drone", "FILE_NAME.time_stamp": "2025-01-01T00:00:00", "FILE_NAME.unknown": None})
+        # Header values are read without scanning (or hashing) the DATA section
+        sha1_mock.assert_not_called()
+        self.assertIsNone(parser.get_index()._entities)
+
+        # Index is keyed by modification time and size, a changed file is indexed again
+        with open(step_path, "w") as f:
+            f.write(STEP.replace("'Drone'", "'Drone2'"))
+        self.assertEqual(parser.get_value("FILE_NAME.name"), "Drone2")
+
+    def test_step_header_record(self):
+        header = parse_header("FILE_NAME(/* name */ 'Drone, v2','2025',('a','b'),('org'),'pre','sys','auth');"
+                              "FILE_SCHEMA(('AP242'));")
+        self.assertEqual(header["FILE_NAME"]["name"], "Drone, v2")
+        self.assertEqual(header["FILE_NAME"]["author"], ["a", "b"])
+        self.assertEqual(header["FILE_SCHEMA"], {"schema_identifiers": ["AP242"]})
+
+        parser = StepParser(step_file_path=self.write_temp_file(STEP, ".stp"))
+        self.assertEqual(parser.get_value("FILE_DESCRIPTION.implementation_level"), "2;1")
+        self.assertEqual(parser.get_value("FILE_SCHEMA.schema_identifiers"), "AP242")
+        self.assertIsNone(parser.get_value("FILE_POPULATION.name"))
+        # Header is parsed once per file content
+        with mock.patch.object(step_index, "parse_header") as parse_mock:
+            self.assertEqual(parser.get_value("FILE_NAME.author"), "author")
+        parse_mock.assert_not_called()
+
+    def test_step_entity_index(self):
+        with open(self.write_temp_file(STEP, ".stp"), "rb") as f:
+            step_index = StepIndex(f.read())
+        self.assertEqual(sorted(step_index.entities), [1, 10, 11, 12])
+        self.assertEqual(step_index.get_entity("#11").type, "PRODUCT_DEFINITION")
+        self.assertEqual(step_index.get_entity(12).type, "")
+        self.assertIsNone(step_index.get_entity(2))
+        # ';' inside strings does not end the entity, parameters are only decoded on access
+        self.assertEqual(step_index.get_parameter_text(1), "'Motor','Motor; brushless','',(#2)")
+        self.assertEqual(step_index._parameters, {})
+        self.assertEqual(step_index.get_parameters(1), ["Motor", "Motor; brushless", "", ["#2"]])
+        self.assertEqual(step_index.get_parameters(11), ["design", "", "#13", "#14"])
+
+    def test_step_file_is_memory_mapped_and_streamed(self):
+        step_index = StepIndex.from_file(self.write_temp_file(STEP, ".stp"))
+        self.assertIsInstance(step_index.content, mmap.mmap)
+        entities = step_index.iter_entities()
+        self.assertEqual(next(entities)[0], 1)
+        self.assertEqual([entity_id for entity_id, _ in entities], [10, 11, 12])
+        self.assertIsNone(step_index._entities)
+        self.assertEqual(step_index.get_parameters("#10")[:2], ["NAUO1", "Frame"])
+        step_index.close()
+
+    def test_step_parallel_scan(self):
+        step_path = self.write_temp_file(STEP.replace("DATA;\n", "DATA;\n" + "".join(
+            f"#{entity_id}=CARTESIAN_POINT('',(0.,{entity_id}.5,0.));\n" for entity_id in range(100, 400))), ".stp")
+        with mock.patch.object(step_index, "PARALLEL_SCAN_MIN_BYTES", 0):
+            parallel_index = StepIndex.from_file(step_path, workers=3)
+            entities = parallel_index.entities
+        self.assertEqual(len(entities), 304)
+        self.assertEqual(entities, scan_entities(parallel_index.content, parallel_index.data_start))
+
+        chunks = split_data_section(parallel_index.content, parallel_index.data_start, len(parallel_index.content), 3)
+        self.assertEqual(len(chunks), 3)
+        for chunk_start, _ in chunks[1:]:
+            self.assertEqual(parallel_index.content[chunk_start:chunk_start + 1], b"#")
+        parallel_index.close()
+
+    def test_step_scan_quoted_semicolons(self):
+        content = b"#1=PRODUCT('a;''b''',';',$);\n#2=PRODUCT('x'';y');\n#3=PRODUCT('unterminated;\n"
+        entities = scan_entities(content)
+        self.assertEqual(sorted(entities), [1, 2])
+        self.assertEqual(content[entities[1][1]:entities[1][2]], b"'a;''b''',';',$")
+        self.assertEqual(content[entities[2][1]:entities[2][2]], b"'x'';y'")
+
+    def test_decode_parameters(self):
+        self.assertEqual(decode_parameters("'it''s',(#1,(2.5,.T.)),$,LENGTH_MEASURE(1.),*"),
+                         ["it's", ["#1", ["2.5", ".T."]], "$", "LENGTH_MEASURE(1.)", "*"])
+
+    def test_step_get_value_data(self):
+        step_path = self.write_temp_file(STEP, ".stp")
+        parser = StepParser(step_file_path=step_path)
+        # '#1' must not match '#10' / '#11'
+        self.assertEqual(parser.get_value("DATA.#1=PRODUCT"), "Motor")
+        self.assertEqual(parser.get_value("DATA.#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE"), "NAUO1")
+        self.assertIsNone(parser.get_value("DATA.#99=PRODUCT"))
+        # index is only built again after the file has changed
+        self.assertIs(StepParser(step_file_path=step_path).get_index(), parser.get_index())
+
+    def test_step_value_index(self):
+        parser = StepParser(step_file_path=self.write_temp_file(STEP, ".stp"))
+        self.assertEqual(parser.get_value("DATA.#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE", index="3"), "#11")
+        self.assertEqual(parser.get_value("DATA.#1=PRODUCT", index="3.0"), "#2")
+        self.assertEqual(parser.get_value("DATA.#1=PRODUCT", index="3"), "(#2)")
+        self.assertIsNone(parser.get_value("DATA.#1=PRODUCT", index="7"))
+        values = parser.get_values([("DATA.#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE", "4"), "FILE_NAME.name"])
+        self.assertEqual(values, {("DATA.#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE", "4"): "#12", "FILE_NAME.name": "Drone"})
+
+        self.assertEqual(parser.find_value_index("DATA.#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE", "#12"), "4")
+        self.assertEqual(parser.find_value_index("DATA.#1=PRODUCT", "#2"), "3.0")
+        self.assertIsNone(parser.find_value_index("DATA.#1=PRODUCT", "#99"))
+        self.assertEqual(get_parameter(["a", ["b", ["c"]]], "1.1.0"), "c")
+        self.assertEqual(find_parameter(["a", ["b", ["c"]]], "c"), "1.1.0")
+
+    def test_step_index_discovery_writes_mapping_once(self):
+        step_path = self.write_temp_file(STEP, ".stp")
+        mapping_path = self.write_temp_file(json.dumps({"SysMLv2": [], "Mappings": [], "STEP": [
+            {"uuid": "step-0", "elementPath": "DATA.#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE", "value": "#12", "index": "", "filePath": step_path},
+            {"uuid": "step-1", "elementPath": "DATA.#1=PRODUCT", "value": "#2", "filePath": step_path},
+            {"uuid": "step-2", "elementPath": "DATA.#11=PRODUCT_DEFINITION", "value": "#13", "index": "2", "filePath": step_path}]}), ".json")
+        self.paths.append(mapping_path + ".log")
+        tool = MetadataManager(config=load_config("config/default_config.json"), stepparser=StepParser())
+        tool.mapping_file_path = mapping_path
+        store = tool.get_mapping_store()
+        with mock.patch.object(store, "save", wraps=store.save) as save_mock:
+            self.assertEqual(tool.discover_step_indexes(), 2)
+        save_mock.assert_called_once()
+        self.assertEqual(store.get_element("step-0")["index"], "4")
+        self.assertEqual(store.get_element("step-1")["index"], "3.0")
+        self.assertEqual(store.get_element("step-2")["index"], "2")
+        # Reading values does not change the mapping
+        self.assertEqual(tool.get_domain_values("STEP", step_path, [("DATA.#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE", "4")]),
+                         {("DATA.#10=NEXT_ASSEMBLY_USAGE_OCCURRENCE", "4"): "#12"})
+        self.assertEqual(tool.discover_step_indexes(), 0)
+
+    def test_step_index_not_found_is_searched_again(self):
+        step_path = self.write_temp_file(STEP, ".stp")
+        tool = MetadataManager(config=load_config("config/default_config.json"), stepparser=StepParser())
+        self.assertEqual(tool.find_domain_element_index("STEP", step_path, "DATA.#1=PRODUCT", "#2"), "3.0")
+        # Unknown values keep an empty index, discover_step_indexes searches them again
+        with self.assertLogs(tool.logger, level="WARNING"):
+            self.assertEqual(tool.find_domain_element_index("STEP", step_path, "DATA.#1=PRODUCT", "#99"), "")
+        self.assertEqual(tool.find_domain_element_index("GerberJobFile", step_path, "GeneralSpecs.Size.X", "15"), "0")
+
+
+if __name__ == "__main__":
+    unittest.main()
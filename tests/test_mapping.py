@@ -2,10 +2,15 @@ import unittest
 from unittest import mock # for mocking to simulate the behavior of external dependencies and objects
 import os
 import tempfile
+import shutil
 import json
 from datetime import datetime
 from metadata_manager import MetadataManager 
+from mapping_store import MappingStore
+from sysml_syntax import SysmlModel
+from file_parser import GerberParser, SysmlParser, StepParser
 from utils.config_utils import load_config
+from utils.file_utils import write_file_atomic
 import time
 
 
@@ -23,6 +28,7 @@ class TestMapMetadata(unittest.TestCase):
 
         mock_gerberparser = mock.Mock()
         mock_gerberparser.get_value.return_value = "abc" # 12.5
+        mock_gerberparser.get_values.side_effect = lambda element_paths: {path: "abc" for path in element_paths}
        
 
         self.tool = MetadataManager(config=DEFAULT_CONFIG, 
@@ -47,6 +53,9 @@ class TestMapMetadata(unittest.TestCase):
 
     def tearDown(self):
         os.remove(self.temp_mapping_path)
+        for path in (self.temp_mapping_path + ".log", os.path.splitext(self.temp_mapping_path)[0] + ".state.json"):
+            if os.path.exists(path):
+                os.remove(path)
         os.remove(self.sysml_path)
         os.remove(self.domain_path)
 
@@ -151,6 +160,7 @@ class TestMapMetadata(unittest.TestCase):
             print(f"Warning: Duration exceeded threshold of {threshold} seconds")
 
         # Lade Mapping-File und prüfe, ob alle Einträge vorhanden sind
+        self.assertTrue(self.tool.export_mapping())
         with open(self.tool.mapping_file_path, "r") as f:
             data = json.load(f)
 
@@ -204,4 +214,340 @@ class TestMapMetadata(unittest.TestCase):
         error_detection_rate = (detected_errors / num_errors) * 100
         print(f"\nError detection rate: {error_detection_rate:.2f}% ({detected_errors} of {num_errors} detected)")
 
-        self.assertGreaterEqual(error_detection_rate, 90.0, "error detection rate is below 90%")
\ No newline at end of file
+        self.assertGreaterEqual(error_detection_rate, 90.0, "error detection rate is below 90%")
+
+class TestUpdateSysmlModel(unittest.TestCase):
+
+    def setUp(self):
+        sysml_file = tempfile.NamedTemporaryFile("w", delete=False, suffix=".sysml")
+        sysml_file.write(
+            "package P {\n"
+            "    part def partA {\n"
+            "        attribute len = 1.0[mm];\n"
+            "        attribute width = 2.0[mm];\n"
+            "        attribute name = \"old\";\n"
+            "    }\n"
+            "}\n")
+        sysml_file.close()
+        self.sysml_path = sysml_file.name
+        self.domain_path = tempfile.NamedTemporaryFile(delete=False, suffix=".gbrjob").name
+        self.mapping_path = tempfile.NamedTemporaryFile(delete=False, suffix=".json").name
+
+        domain_values = {"Size.X": 12.5, "Size.Y": 7.5, "ProjectId.Name": "new"}
+        mock_gerberparser = mock.Mock()
+        mock_gerberparser.get_value.side_effect = lambda elementPath: domain_values[elementPath]
+        mock_gerberparser.get_values.side_effect = lambda element_paths: {path: domain_values[path] for path in element_paths}
+
+        mapping = {"SysMLv2": [], "Mappings": [], "GerberJobFile": []}
+        for index, (sysml_element, domain_element, unit) in enumerate(
+                [("len", "Size.X", "mm"), ("width", "Size.Y", "mm"), ("name", "ProjectId.Name", "")]):
+            mapping["SysMLv2"].append({"uuid": f"sysml-{index}", "value": "", "unit": unit,
+                                       "elementPath": f"P.partA.{sysml_element}", "filePath": self.sysml_path})
+            mapping["GerberJobFile"].append({"uuid": f"domain-{index}", "value": "", "unit": unit,
+                                             "elementPath": domain_element, "filePath": self.domain_path})
+            mapping["Mappings"].append({"sourceUUID": f"domain-{index}", "targetUUID": f"sysml-{index}"})
+        with open(self.mapping_path, "w") as f:
+            json.dump(mapping, f)
+
+        self.tool = MetadataManager(config=load_config("config/default_config.json"), gerberparser=mock_gerberparser)
+        self.tool.mapping_file_path = self.mapping_path
+
+    def tearDown(self):
+        for path in (self.sysml_path, self.domain_path, self.mapping_path):
+            os.remove(path)
+        for path in (self.mapping_path + ".log", os.path.splitext(self.mapping_path)[0] + ".state.json"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_all_updates_written_once_per_file(self):
+        with mock.patch("metadata_manager.write_file_atomic", wraps=write_file_atomic) as write_mock:
+            self.tool.update_sysml_model()
+        self.assertEqual([call.args[0] for call in write_mock.call_args_list].count(self.sysml_path), 1)
+
+        with open(self.sysml_path) as f:
+            content = f.read()
+        self.assertIn("attribute len = 12.5[mm];", content)
+        self.assertIn("attribute width = 7.5[mm];", content)
+        self.assertIn('attribute name = "new";', content)
+
+        # Nothing changed in the domain file -> SysMLv2 file is not rewritten again
+        with mock.patch("metadata_manager.write_file_atomic") as write_mock:
+            self.tool.update_sysml_model()
+        write_mock.assert_not_called()
+
+        # Domain files are read again (no state), values are the same -> cached model keeps its syntax tree
+        os.remove(os.path.splitext(self.mapping_path)[0] + ".state.json")
+        model = SysmlParser(config={}, sysml_path=self.sysml_path).get_model()
+        tree = model.tree
+        with mock.patch("metadata_manager.write_file_atomic") as write_mock, mock.patch("sysml_syntax.parse_sysml") as parse_mock:
+            tool = MetadataManager(config=load_config("config/default_config.json"), gerberparser=self.tool.fp_gerber)
+            tool.mapping_file_path = self.mapping_path
+            tool.update_sysml_model()
+        self.assertNotIn(self.sysml_path, [call.args[0] for call in write_mock.call_args_list])
+        parse_mock.assert_not_called()
+        self.assertIs(SysmlParser(config={}, sysml_path=self.sysml_path).get_model().tree, tree)
+
+    def test_partial_update_only_reads_mapped_sources(self):
+        with mock.patch.object(self.tool, "discover_step_indexes") as discover_mock:
+            self.tool.update_sysml_model(mapping_entries=[{"sourceUUID": "domain-1", "targetUUID": "sysml-1"}])
+        self.tool.fp_gerber.get_values.assert_called_once_with(["Size.Y"])
+        self.assertEqual(discover_mock.call_args.kwargs["domain_elements"], [])
+        with open(self.sysml_path) as f:
+            content = f.read()
+        self.assertIn("attribute width = 7.5[mm];", content)
+        self.assertIn("attribute len = 1.0[mm];", content)
+
+    def test_span_edits_keep_formatting(self):
+        content = ("package P {\n"
+                   "\tpart def partA {\n"
+                   "\t\tattribute len=1.0 [mm] ; // length\n"
+                   "\t\tattribute width : LengthValue;\n"
+                   "\t\tpart def partB { attribute len = 3.0[mm]; }\n"
+                   "\t}\n"
+                   "}\n")
+        model = SysmlModel(content)
+        updated = self.tool.update_values_in_sysml_model(model, [
+            ("P.partA.len", "12.5", "mm"), ("P.partA.width", 7, "mm"), ("P.partA.partB.len", "a", ""), ("P.partA.len", 13, "mm")])
+        self.assertEqual(updated, content.replace("1.0 [mm]", "13.0[mm]").replace("LengthValue;", "LengthValue = 7.0[mm];")
+                         .replace("= 3.0[mm]", '= "a"'))
+        self.assertEqual(self.tool.update_value_in_sysml_model(content.splitlines(keepends=True), "P.partA.unknown", "1", "mm"),
+                         content.splitlines(keepends=True))
+
+    def test_unchanged_domain_files_are_not_read_again(self):
+        self.tool.update_sysml_model()
+        # All three values are extracted with one call for the domain file
+        self.tool.fp_gerber.get_values.assert_called_once_with(["Size.X", "Size.Y", "ProjectId.Name"])
+
+        # New manager (e.g. next program start) uses the state file next to the mapping
+        tool = MetadataManager(config=load_config("config/default_config.json"), gerberparser=self.tool.fp_gerber)
+        tool.mapping_file_path = self.mapping_path
+        tool.update_sysml_model()
+        self.assertEqual(self.tool.fp_gerber.get_values.call_count, 1)
+
+        with open(self.domain_path, "w") as f:
+            f.write("changed")
+        tool.update_sysml_model()
+        self.assertEqual(self.tool.fp_gerber.get_values.call_count, 2)
+        self.tool.fp_gerber.get_value.assert_not_called()
+
+    def test_map_metadata_bulk(self):
+        with open(self.mapping_path, "w") as f:
+            json.dump({"SysMLv2": [], "Mappings": []}, f)
+        spec = {"sysml_path": self.sysml_path, "sysml_element_value": "1.0", "sysml_element_unit": "mm",
+                "domain_file_format": "GerberJobFile", "domain_path": self.domain_path,
+                "domain_element_value": "1.0", "domain_element_unit": "mm"}
+        specs = [
+            dict(spec, sysml_element_path="P.partA.len", domain_element_path="Size.X"),
+            dict(spec, sysml_element_path="P.partA.width", domain_element_path="Size.Y"),
+            dict(spec, sysml_element_path="P.partA.len", domain_element_path="ProjectId.Name"), # already mapped in this batch
+            dict(spec, sysml_element_path="P.partA.unknown", domain_element_path="Size.X"), # invalid sysml element path
+            dict(spec, sysml_element_path="P.partA.name", domain_element_path="ProjectId.Name", domain_element_unit="cm"), # unit mismatch
+            {"sysml_path": self.sysml_path}, # incomplete spec
+        ]
+        with mock.patch("metadata_manager.messagebox") as messagebox_mock, \
+                mock.patch("metadata_manager.write_file_atomic", wraps=write_file_atomic) as write_mock, \
+                mock.patch.object(MappingStore, "save", autospec=True, side_effect=MappingStore.save) as save_mock:
+            result = self.tool.map_metadata_bulk(specs)
+
+        self.assertEqual(len(result["mapped"]), 2)
+        self.assertEqual([error["index"] for error in result["errors"]], [2, 3, 4, 5])
+        messagebox_mock.showerror.assert_not_called()
+        messagebox_mock.showinfo.assert_not_called()
+        self.assertEqual(save_mock.call_count, 1)
+        self.assertEqual([call.args[0] for call in write_mock.call_args_list].count(self.sysml_path), 1)
+
+        with open(self.sysml_path) as f:
+            content = f.read()
+        self.assertIn("attribute len = 12.5[mm];", content)
+        self.assertIn("attribute width = 7.5[mm];", content)
+        self.assertEqual(len(MappingStore(self.mapping_path).get_mapping()["Mappings"]), 2)
+
+    def test_map_metadata_bulk_rollback(self):
+        with open(self.mapping_path, "w") as f:
+            json.dump({"SysMLv2": [], "Mappings": []}, f)
+        spec = {"sysml_path": self.sysml_path, "sysml_element_path": "P.partA.len", "sysml_element_value": "1.0",
+                "sysml_element_unit": "mm", "domain_file_format": "GerberJobFile", "domain_path": self.domain_path,
+                "domain_element_path": "Size.X", "domain_element_value": "1.0", "domain_element_unit": "mm"}
+        with mock.patch.object(MappingStore, "save", return_value=False):
+            result = self.tool.map_metadata_bulk([spec])
+        self.assertEqual(result["mapped"], [])
+        self.assertEqual(result["errors"][-1]["error"], "Could not save mapping")
+
+        # New elements and mappings are rolled back, the next save does not write them
+        store = self.tool.get_mapping_store()
+        self.assertIsNone(store.find_element("SysMLv2", "P.partA.len"))
+        self.assertEqual(store.get_mapping()["Mappings"], [])
+        self.assertTrue(store.save())
+        self.assertEqual(MappingStore(self.mapping_path).get_mapping(), {"SysMLv2": [], "Mappings": []})
+
+    def test_map_metadata_bulk_step_value_not_found(self):
+        step_path = tempfile.NamedTemporaryFile(delete=False, suffix=".stp").name
+        self.addCleanup(os.remove, step_path)
+        with open(step_path, "w") as f:
+            f.write("ISO-10303-21;\nHEADER;\nFILE_NAME('Drone');\nENDSEC;\nDATA;\n#20=CARTESIAN_POINT('',(0.,1.5,2.));\nENDSEC;\n"
+                    "END-ISO-10303-21;\n")
+        with open(self.mapping_path, "w") as f:
+            json.dump({"SysMLv2": [], "Mappings": []}, f)
+        tool = MetadataManager(config=load_config("config/default_config.json"), stepparser=StepParser())
+        tool.mapping_file_path = self.mapping_path
+
+        # Value is not found in the STEP file -> mapping is created without position
+        result = tool.map_metadata_bulk([{"sysml_path": self.sysml_path, "sysml_element_path": "P.partA.len",
+                                          "sysml_element_value": "1.0", "sysml_element_unit": "mm", "domain_file_format": "STEP",
+                                          "domain_path": step_path, "domain_element_path": "DATA.#20=CARTESIAN_POINT",
+                                          "domain_element_value": "1.6", "domain_element_unit": "mm"}])
+        self.assertEqual(len(result["mapped"]), 1)
+        self.assertEqual(result["errors"], [])
+        store = tool.get_mapping_store()
+        step_element = store.get_element(result["mapped"][0]["sourceUUID"])
+        self.assertEqual(step_element["index"], "")
+        # The STEP file is not read without position, the SysMLv2 model gets the mapped value
+        with open(self.sysml_path) as f:
+            self.assertIn("attribute len = 1.6[mm];", f.read())
+
+        # Position is found by the next discovery e.g. after the value has been corrected
+        store.update_element(step_element["uuid"], {"value": "1.5"})
+        tool.update_sysml_model()
+        self.assertEqual(store.get_element(step_element["uuid"])["index"], "1.1")
+        with open(self.sysml_path) as f:
+            self.assertIn("attribute len = 1.5[mm];", f.read())
+
+    def test_update_domain_models(self):
+        with open(self.domain_path, "w") as f:
+            json.dump({"ProjectId": {"Name": "old"}, "Size": {"X": 1.0, "Y": 2}}, f)
+        with open(self.sysml_path, "w") as f:
+            f.write('package P {\n    part def partA {\n        attribute len = 3.5[mm];\n'
+                    '        attribute width = 2.0[mm];\n        attribute name = "pushed";\n    }\n}\n')
+        store = self.tool.get_mapping_store()
+        for index, value in enumerate([1.0, 2, "old"]):
+            store.update_element(f"domain-{index}", {"value": value})
+        store.save()
+        self.tool.fp_gerber = GerberParser()
+
+        with mock.patch("file_parser.write_file_atomic", wraps=write_file_atomic) as write_mock:
+            self.assertTrue(self.tool.update_domain_models())
+        # One write for the domain file, keys keep their order and numbers stay numbers
+        self.assertEqual(write_mock.call_count, 1)
+        with open(self.domain_path) as f:
+            self.assertEqual(list(json.load(f).items()), [("ProjectId", {"Name": "pushed"}), ("Size", {"X": 3.5, "Y": 2})])
+        # Domain values are stored as the file parser reads them back, the next synchronization changes nothing
+        self.assertEqual(MappingStore(self.mapping_path).get_element("domain-0")["value"], 3.5)
+        self.assertEqual(MappingStore(self.mapping_path).get_element("sysml-0")["value"], "3.5")
+        with mock.patch.object(MappingStore, "update_element") as update_mock:
+            self.assertTrue(self.tool.update_sysml_model())
+        update_mock.assert_not_called()
+
+
+class TestMappingStore(unittest.TestCase):
+
+    def setUp(self):
+        self.mapping_path = tempfile.NamedTemporaryFile(delete=False, suffix=".json").name
+        mapping = {
+            "SysMLv2": [{"uuid": "sysml-0", "elementPath": "P.partA.len", "filePath": "model.sysml"}],
+            "Mappings": [{"sourceUUID": "domain-0", "targetUUID": "sysml-0"}],
+            "GerberJobFile": [{"uuid": "domain-0", "elementPath": "Size.X", "filePath": "job.gbrjob"}]
+        }
+        with open(self.mapping_path, "w") as f:
+            json.dump(mapping, f)
+        self.store = MappingStore(self.mapping_path)
+
+    def tearDown(self):
+        os.remove(self.mapping_path)
+        if os.path.exists(self.mapping_path + ".log"):
+            os.remove(self.mapping_path + ".log")
+
+    def test_index_lookups(self):
+        self.assertEqual(self.store.get_element("domain-0")["elementPath"], "Size.X")
+        self.assertEqual(self.store.get_domain("sysml-0"), "SysMLv2")
+        self.assertIsNotNone(self.store.find_element("SysMLv2", "P.partA.len"))
+        self.assertIsNotNone(self.store.find_element("GerberJobFile", "Size.X", file_path="job.gbrjob"))
+        self.assertIsNone(self.store.find_element("GerberJobFile", "Size.X", file_path="other.gbrjob"))
+
+        entry, source, target = next(self.store.iter_mappings())
+        self.assertEqual((source["uuid"], target["uuid"]), ("domain-0", "sysml-0"))
+
+    def test_add_element_and_reload_after_external_change(self):
+        self.store.add_element("STEP", {"uuid": "step-0", "elementPath": "FILE_NAME.name", "filePath": "a.stp"})
+        self.assertEqual(self.store.get_domain("step-0"), "STEP")
+        self.assertTrue(self.store.save())
+
+        with open(self.mapping_path) as f:
+            data = json.load(f)
+        data["SysMLv2"].append({"uuid": "sysml-1", "elementPath": "P.partA.width", "filePath": "model.sysml"})
+        with open(self.mapping_path, "w") as f:
+            json.dump(data, f)
+        self.assertIsNotNone(self.store.find_element("SysMLv2", "P.partA.width"))
+        self.assertIsNotNone(self.store.get_element("step-0"))
+
+    def test_unsaved_changes_survive_reload(self):
+        self.store.add_element("SysMLv2", {"uuid": "sysml-1", "elementPath": "P.partA.width", "filePath": "model.sysml"})
+        self.store.update_element("domain-0", {"value": "42"})
+        with open(self.mapping_path) as f:
+            data = json.load(f)
+        data["GerberJobFile"] = []
+        with open(self.mapping_path, "w") as f:
+            json.dump(data, f)
+
+        # update of the removed element cannot be applied again -> reported by save
+        self.assertIsNotNone(self.store.get_element("sysml-1"))
+        self.assertIsNone(self.store.get_element("domain-0"))
+        self.assertFalse(self.store.save())
+        self.assertEqual(MappingStore(self.mapping_path).get_domain("sysml-1"), "SysMLv2")
+        self.assertFalse(self.store.update_element("domain-0", {"value": "43"}))
+
+    def test_missing_mapping_file_is_empty_mapping(self):
+        mapping_path = os.path.join(tempfile.mkdtemp(), "mapping.json")
+        store = MappingStore(mapping_path)
+        store.add_element("SysMLv2", {"uuid": "sysml-1", "elementPath": "P.partA.width", "filePath": "model.sysml"})
+        with mock.patch.object(store, "load", wraps=store.load) as load_mock:
+            self.assertIsNotNone(store.get_element("sysml-1"))
+            load_mock.assert_not_called()
+        self.assertTrue(store.save())
+        self.assertEqual(MappingStore(mapping_path).get_domain("sysml-1"), "SysMLv2")
+        shutil.rmtree(os.path.dirname(mapping_path))
+
+    def test_changes_are_appended_to_log_and_replayed(self):
+        with open(self.mapping_path) as f:
+            original = f.read()
+        self.store.add_element("SysMLv2", {"uuid": "sysml-1", "elementPath": "P.partA.width", "filePath": "model.sysml"})
+        self.store.add_mapping({"sourceUUID": "domain-0", "targetUUID": "sysml-1"})
+        self.store.update_element("domain-0", {"value": "42"})
+        self.assertTrue(self.store.save())
+
+        # mapping.json is untouched, a new store replays the log
+        with open(self.mapping_path) as f:
+            self.assertEqual(f.read(), original)
+        store = MappingStore(self.mapping_path)
+        self.assertEqual(store.get_domain("sysml-1"), "SysMLv2")
+        self.assertEqual(store.get_element("domain-0")["value"], "42")
+        self.assertEqual(len(store.get_mapping()["Mappings"]), 2)
+
+        # an incomplete last line (e.g. crash while writing) is ignored
+        with open(self.mapping_path + ".log", "a") as f:
+            f.write('{"op": "element", "dom')
+        self.assertEqual(len(MappingStore(self.mapping_path).get_mapping()["SysMLv2"]), 2)
+
+    def test_export_compacts_log_into_mapping_file(self):
+        store = MappingStore(self.mapping_path, compact_after=2)
+        store.add_element("SysMLv2", {"uuid": "sysml-1", "elementPath": "P.partA.width", "filePath": "model.sysml"})
+        self.assertTrue(store.save())
+        store.add_mapping({"sourceUUID": "domain-0", "targetUUID": "sysml-1"})
+        self.assertTrue(store.save())
+        self.assertTrue(os.path.exists(self.mapping_path + ".log"))
+
+        store.update_element("sysml-1", {"value": "1"})
+        self.assertTrue(store.save()) # as many log entries as mapping.json has entries (3) -> compacted
+        self.assertFalse(os.path.exists(self.mapping_path + ".log"))
+        with open(self.mapping_path) as f:
+            data = json.load(f)
+        self.assertEqual(len(data["SysMLv2"]), 2)
+        self.assertEqual(len(data["Mappings"]), 2)
+
+        # Threshold grows with the mapping (5 entries now)
+        for value in range(4):
+            store.update_element("sysml-1", {"value": str(value)})
+            self.assertTrue(store.save())
+        self.assertTrue(os.path.exists(self.mapping_path + ".log"))
+        store.update_element("sysml-1", {"value": "5"})
+        self.assertTrue(store.save())
+        self.assertFalse(os.path.exists(self.mapping_path + ".log"))
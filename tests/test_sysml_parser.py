@@ -0,0 +1,322 @@
+import unittest
+import os
+import tempfile
+import shutil
+from unittest import mock
+
+import file_parser
+from file_parser import SysmlParser, CodeParser
+from utils.file_utils import write_file_atomic
+from sysml_syntax import parse_sysml, SysmlModel
+from utils.file_utils import FileCache
+from constraint_expression import ConstraintError, Quantity, compile_expression
+
+SYSML_MODEL = """package DroneExample {
+    metadata def PCBDesign{
+        attribute isCritical : Boolean;
+    }
+    @PCBDesign about
+        DroneExample::PartDefinitions::FlightController; // tagged part
+
+    package PartDefinitions{
+        part def FlightController {
+            attribute id = "fc-001";
+            attribute mass = 50[g];
+            attribute mass_actual : MassValue;
+
+            part def pcb {
+                attribute max_length = 12.2[mm];
+            }
+        }
+        part def Drone {
+            part fc : FlightController;
+            part motor : Motor[4];
+            constraint massCheck : MassConstraint{
+                in partMasses = (fc.mass, motor.mass);
+                in massLimit = 1000[g];
+            }
+        }
+        part def Motor {
+            doc /* Brushless motor; used 4 times */
+            attribute mass = 60[g];
+        }
+    }
+
+    package Constraints{
+        constraint def MassConstraint{
+            in partMasses : MassValue[0..*];
+            in massLimit : MassValue;
+
+            sum(partMasses) <= massLimit
+        }
+    }
+}
+"""
+
+
+def dump_tree(root):
+    """ Returns all nodes of a syntax tree with their offsets for comparisons """
+    return [(node.kind, node.name, node.declared_type, node.value, node.start, node.end,
+             node.name_span, node.value_span, node.body_span, node.header_end) for node in root.iter_nodes()]
+
+
+class TestSysmlParser(unittest.TestCase):
+
+    def setUp(self):
+        temp_file = tempfile.NamedTemporaryFile("w", delete=False, suffix=".sysml")
+        temp_file.write(SYSML_MODEL)
+        temp_file.close()
+        self.sysml_path = temp_file.name
+        self.parser = SysmlParser(config={}, sysml_path=self.sysml_path)
+
+    def tearDown(self):
+        os.remove(self.sysml_path)
+
+    def test_syntax_tree_structure(self):
+        tree = parse_sysml(SYSML_MODEL)
+        package = tree.children[0]
+        self.assertEqual((package.kind, package.name), ("package", "DroneExample"))
+
+        motor = next(node for node in tree.iter_nodes() if node.name == "motor")
+        self.assertEqual(motor.kind, "part")
+        self.assertEqual(motor.declared_type, "Motor")
+        self.assertEqual(motor.multiplicity, "4")
+        self.assertEqual(motor.qualified_name, "DroneExample.PartDefinitions.Drone.motor")
+
+        usage = next(node for node in tree.iter_nodes() if node.kind == "metadata")
+        self.assertEqual(usage.declared_type, "PCBDesign")
+        self.assertEqual(usage.about, ["DroneExample::PartDefinitions::FlightController"])
+
+    def test_check_metadata_exist(self):
+        self.assertEqual(self.parser.check_metadata_exist(), ["PCBDesign"])
+
+    def test_get_metadata_about_elements_stops_at_nested_block(self):
+        result = self.parser.get_metadata_about_elements()
+        names = [attribute["name"] for attribute in result["FlightController"]]
+        # attributes of the nested 'part def pcb' and attributes without value are not part of the tagged element
+        self.assertEqual(names, ["id", "mass"])
+        self.assertEqual(result["FlightController"][1]["unit"], "g")
+        self.assertEqual(result["FlightController"][1]["metadata_tag"], "PCBDesign")
+
+    def test_iter_metadata_elements_resolves_all_about_targets(self):
+        content = SYSML_MODEL.replace("DroneExample::PartDefinitions::FlightController; // tagged part",
+                                      "DroneExample::PartDefinitions::FlightController, PartDefinitions::FlightController::pcb;\n"
+                                      "    metadata PCBDesign about PartDefinitions::Drone::fc, Unknown;")
+        with open(self.sysml_path, "w") as file:
+            file.write(content)
+
+        elements = self.parser.iter_metadata_elements()
+        self.assertNotIsInstance(elements, (list, dict))
+        records = [(tag, element.qualified_name, record["name"], record["value"]) for tag, element, record in elements]
+        self.assertEqual(records, [
+            ("PCBDesign", "DroneExample.PartDefinitions.FlightController", "id", "fc-001"),
+            ("PCBDesign", "DroneExample.PartDefinitions.FlightController", "mass", "50"),
+            ("PCBDesign", "DroneExample.PartDefinitions.FlightController.pcb", "max_length", "12.2"),
+            # part usage gets the attributes of its definition
+            ("PCBDesign", "DroneExample.PartDefinitions.Drone.fc", "id", "fc-001"),
+            ("PCBDesign", "DroneExample.PartDefinitions.Drone.fc", "mass", "50"),
+        ])
+        self.assertEqual(list(self.parser.get_metadata_about_elements()), ["FlightController", "pcb", "fc"])
+        self.assertEqual(list(self.parser.iter_metadata_elements(metadata_name="Other")), [])
+
+    def test_metadata_tag_index(self):
+        tag_index = self.parser.get_metadata_tag_index()
+        model = self.parser.get_model()
+        self.assertIs(self.parser.get_metadata_tag_index(), tag_index) # built once per content
+        texts = [model.get_text(span) for span in tag_index["PCBDesign"]]
+        self.assertEqual(len(texts), 2)
+        self.assertTrue(texts[0].startswith("@PCBDesign about"))
+        self.assertTrue(texts[1].startswith("part def FlightController {"))
+        self.assertTrue(texts[1].endswith("}"))
+        self.assertIn("attribute max_length = 12.2[mm];", texts[1]) # nested block
+
+        start, end = self.parser.get_metadata_tag_index(nested=False)["PCBDesign"][1]
+        self.assertEqual(model.get_text((start, end)), "part def FlightController {")
+        self.assertEqual(model.get_line_column(start), (9, 8))
+
+    def test_validate_elementPath(self):
+        self.assertTrue(self.parser.validate_elementPath("DroneExample.PartDefinitions.FlightController.pcb.max_length"))
+        self.assertTrue(self.parser.validate_elementPath("DroneExample.PartDefinitions.Drone.fc"))
+        self.assertFalse(self.parser.validate_elementPath("DroneExample.PartDefinitions.FlightController.max_length"))
+        self.assertFalse(self.parser.validate_elementPath("DroneExample.Unknown"))
+
+    def test_qualified_name_index(self):
+        node = self.parser.get_element("DroneExample.PartDefinitions.FlightController.pcb.max_length")
+        self.assertEqual(node.kind, "attribute")
+        self.assertEqual(node.value, "12.2[mm]")
+        self.assertEqual(SYSML_MODEL[node.start:node.end], "attribute max_length = 12.2[mm];")
+        self.assertEqual(self.parser.get_element("DroneExample.PartDefinitions.Drone.motor").declared_type, "Motor")
+        self.assertIsNone(self.parser.get_element("DroneExample.PartDefinitions.pcb"))
+
+    def test_model_is_only_reparsed_after_file_change(self):
+        model = self.parser.get_model()
+        self.assertIs(self.parser.get_model(), model)
+
+        with open(self.sysml_path, "a") as file:
+            file.write("package Added { part def NewPart; }\n")
+        self.assertIsNot(self.parser.get_model(), model)
+        self.assertTrue(self.parser.validate_elementPath("Added.NewPart"))
+
+    def test_model_is_shared_between_parser_instances(self):
+        other_parser = SysmlParser(config={}, sysml_path=self.sysml_path)
+        self.assertIs(other_parser.get_model(), self.parser.get_model())
+
+    def test_reparse_only_changed_body(self):
+        model = SysmlModel(SYSML_MODEL)
+        content = SYSML_MODEL.replace("attribute mass = 60[g];", "attribute mass = 65[g];\n            attribute kv = 920;")
+        with mock.patch("sysml_syntax.parse_sysml") as parse:
+            updated = model.reparse(content).commit()
+            self.assertEqual(dump_tree(updated.tree), dump_tree(parse_sysml(content)))
+            parse.assert_not_called()
+        self.assertEqual(updated.get_element("DroneExample.PartDefinitions.Motor.kv").value, "920")
+
+        # Changes of the structure outside of one body are parsed completely
+        content = SYSML_MODEL.replace("part def Motor {", "part def Motor ")
+        self.assertEqual(dump_tree(SysmlModel(SYSML_MODEL).reparse(content).tree), dump_tree(parse_sysml(content)))
+
+    def test_value_edits_shift_following_nodes(self):
+        model = SysmlModel(SYSML_MODEL)
+        nodes = [model.get_element("DroneExample.PartDefinitions.FlightController.mass"),
+                 model.get_element("DroneExample.PartDefinitions.FlightController.pcb.max_length")]
+        edits = [(nodes[0].value_span[0], nodes[0].value_span[1], "1250.5[g]"), (nodes[1].value_span[0], nodes[1].value_span[1], "8[mm]")]
+        with mock.patch("sysml_syntax.parse_sysml") as parse:
+            # Without commit the derived model does not touch the tree of the model it is derived from
+            uncommitted = model.apply_edits(edits)
+            tree = model.tree
+            updated = model.apply_edits(edits).commit()
+            updated.tree
+            parse.assert_not_called()
+        self.assertIsNot(uncommitted.tree, tree)
+        self.assertEqual(dump_tree(updated.tree), dump_tree(parse_sysml(updated.content)))
+        self.assertEqual(dump_tree(uncommitted.tree), dump_tree(updated.tree))
+        self.assertEqual(dump_tree(model.tree), dump_tree(parse_sysml(SYSML_MODEL)))
+        # Edits that do not change the content return the same model
+        self.assertIs(updated.apply_edits([(nodes[0].value_span[0], nodes[0].value_span[1], nodes[0].value)]), updated)
+
+        # A value that changes the structure is parsed again
+        edits = [(nodes[0].value_span[0], nodes[0].value_span[1], "1; attribute extra = 2")]
+        updated = SysmlModel(SYSML_MODEL).apply_edits(edits)
+        self.assertIsNotNone(updated.get_element("DroneExample.PartDefinitions.FlightController.extra"))
+
+    def test_changed_file_is_derived_from_previous_model(self):
+        model = self.parser.get_model()
+        with open(self.sysml_path) as file:
+            content = file.read()
+        with open(self.sysml_path, "w") as file:
+            file.write(content.replace("attribute mass = 50[g];", "attribute mass = 505[g];"))
+        with mock.patch.object(model, "reparse", wraps=model.reparse) as reparse:
+            self.assertEqual(self.parser.get_element("DroneExample.PartDefinitions.FlightController.mass").value, "505[g]")
+            reparse.assert_called_once()
+
+    def test_file_cache_evicts_least_recently_used(self):
+        loaded = []
+        cache = FileCache(loader=lambda path, content, fingerprint: loaded.append(path) or content, max_entries=2)
+        paths = []
+        for index in range(3):
+            temp_file = tempfile.NamedTemporaryFile("w", delete=False, suffix=".sysml")
+            temp_file.write(f"package P{index};")
+            temp_file.close()
+            paths.append(temp_file.name)
+        try:
+            cache.get(paths[0])
+            cache.get(paths[1])
+            cache.get(paths[0]) # hit, paths[1] is now least recently used
+            cache.get(paths[2]) # evicts paths[1]
+            self.assertEqual(len(loaded), 3)
+            cache.get(paths[0])
+            self.assertEqual(len(loaded), 3)
+            cache.get(paths[1])
+            self.assertEqual(len(loaded), 4)
+        finally:
+            for path in paths:
+                os.remove(path)
+
+    def test_generate_code_writes_changed_modules_only(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        code_parser = CodeParser()
+        generated = code_parser.generate_code_from_sysml(sysml_file_path=self.sysml_path, output_dir=output_dir)
+        module_path = os.path.join(output_dir, "generated_code", "FlightController.py")
+        self.assertEqual(sorted(generated), sorted([module_path, os.path.join(output_dir, "generated_code", "__init__.py")]))
+        self.assertIn('@metadata("mass", "50", "g", "int", "PCBDesign", "FlightController.mass")', generated[module_path])
+        self.assertEqual(CodeParser(code_file_path=module_path).get_value("FlightController.id"), "fc-001")
+
+        # Nothing changed -> nothing written
+        with mock.patch("file_parser.write_file_atomic", wraps=write_file_atomic) as write_mock:
+            code_parser.generate_code_from_sysml(sysml_file_path=self.sysml_path, output_dir=output_dir)
+        write_mock.assert_not_called()
+
+        # Part is not tagged anymore -> its module is removed
+        with open(self.sysml_path, "w") as f:
+            f.write(SYSML_MODEL.replace("DroneExample::PartDefinitions::FlightController", "DroneExample::PartDefinitions::Motor"))
+        with mock.patch("file_parser.write_file_atomic", wraps=write_file_atomic) as write_mock:
+            generated = code_parser.generate_code_from_sysml(sysml_file_path=self.sysml_path, output_dir=output_dir)
+        self.assertEqual(write_mock.call_count, 2)
+        self.assertEqual(sorted(os.listdir(os.path.join(output_dir, "generated_code"))), ["Motor.py", "__init__.py"])
+
+    def test_generate_code_for_other_language(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        generated = CodeParser().generate_code(sysml_file_path=self.sysml_path, language="c", output_dir=output_dir)
+        self.assertEqual(sorted(os.path.basename(path) for path in generated), ["FlightController.h", "parts.h"])
+        header = generated[os.path.join(output_dir, "FlightController.h")]
+        self.assertIn("#define FLIGHTCONTROLLER_MASS 50\n", header)
+        self.assertIn('#define FLIGHTCONTROLLER_ID "fc-001"\n', header)
+        self.assertIn('#include "FlightController.h"', generated[os.path.join(output_dir, "parts.h")])
+        self.assertEqual(CodeParser().generate_code(sysml_file_path=self.sysml_path, language="unknown", output_dir=output_dir), {})
+
+        # Environment (and its compiled templates) is shared, bytecode is cached for the next program run
+        environment = file_parser.get_template_environment()
+        self.assertIs(environment.get_template("c/part.h.j2"), environment.get_template("c/part.h.j2"))
+        self.assertTrue(os.listdir(file_parser.TEMPLATE_CACHE_DIR))
+
+    def test_find_constraint_definition_and_usage(self):
+        name, body = self.parser.find_constraint_definitions(self.sysml_path, "MassConstraint")
+        self.assertEqual(name, "MassConstraint")
+        self.assertIn("sum(partMasses) <= massLimit", body)
+
+        usage_name, usage_body = self.parser.find_constraint_usages(self.sysml_path, "MassConstraint")
+        self.assertEqual(usage_name, "massCheck")
+        self.assertIn("in massLimit = 1000[g];", usage_body)
+
+
+    def test_verify_constraint(self):
+        # fc.mass + 4 * motor.mass
+        self.assertEqual(self.parser.verify_constraint(self.sysml_path, "MassConstraint"),
+                         "Constraint massCheck (290[g] <= 1000[g]) verified -> (TRUE)")
+        # Compiled once per model content, references are resolved again after a file change
+        self.assertIs(self.parser.compile_constraint("MassConstraint"), self.parser.compile_constraint("MassConstraint"))
+        with open(self.sysml_path, "w") as file:
+            file.write(SYSML_MODEL.replace("attribute mass = 60[g];", "attribute mass = 0.3[kg];"))
+        self.assertEqual(self.parser.verify_constraint(self.sysml_path, "MassConstraint"),
+                         "Constraint massCheck (1250[g] <= 1000[g]) violated -> (FALSE)")
+        self.assertTrue(self.parser.verify_constraint(self.sysml_path, "Unknown").startswith("Verification failed"))
+
+    def test_verify_constraint_of_example_drone(self):
+        sysml_path = os.path.join(os.path.dirname(__file__), "..", "models", "se_domain", "example_drone_verification.sysml")
+        parser = SysmlParser(config={}, sysml_path=sysml_path)
+        self.assertEqual(parser.verify_constraint(sysml_path, "MassConstraint"),
+                         "Constraint massCheck (895[g] <= 1000[g]) verified -> (TRUE)")
+
+    def test_compile_expression(self):
+        def evaluate(text, **values):
+            return compile_expression(text).evaluate({(name,): (lambda value=value: value) for name, value in values.items()})
+
+        self.assertEqual(evaluate("(1[kg] + 500[g]) * 2"), Quantity(3.0, "kg"))
+        self.assertEqual(evaluate("max(1[m], (50[cm], 3[mm])) - 1 [m]"), Quantity(0.0, "m"))
+        self.assertEqual(evaluate("-2 ** 2 + 10 % 4"), Quantity(-2.0, ""))
+        self.assertTrue(evaluate("sum(masses) / size(masses) < limit and not false",
+                                 masses=[Quantity(10.0, "g"), [Quantity(20.0, "g")] * 2], limit=Quantity(0.1, "kg")))
+
+        expression = compile_expression("sum(partMasses) <= massLimit")
+        self.assertIs(compile_expression("sum(partMasses) <= massLimit"), expression)
+        self.assertEqual(expression.operator, "<=")
+        self.assertEqual(expression.references, {("partMasses",), ("massLimit",)})
+
+        for text in ["1 +", "1[g] + 1[m]", "unknown(1)", "(1, 2) + 1", "1 2", "missing < 1"]:
+            with self.assertRaises(ConstraintError):
+                evaluate(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
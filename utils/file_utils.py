@@ -0,0 +1,238 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+HASH_CHUNK_SIZE = 1024 * 1024 # bytes read at once when hashing files
+
+def get_file_fingerprint(file_path, content=None, hash_content=True):
+    """
+    Creates a fingerprint of a file to detect changes without comparing the whole content.
+
+    Args:
+        file_path (str): The path to the file.
+        content (bytes, optional): Already loaded file content (avoids reading the file twice).
+            If not provided the file is hashed in chunks, so memory stays flat for big files (e.g. STEP assemblies).
+        hash_content (bool, optional): If False the content is not hashed ("hash" is None), changes are only 
+            detected by modification time and size (e.g. STEP files of several hundred MB).
+
+    Returns:
+        dict: {"mtime": ..., "size": ..., "hash": ...} or None if the file cannot be read.
+    """
+    logger = logging.getLogger("file_utils: get_file_fingerprint")
+    try:
+        stat = os.stat(file_path)
+        if not hash_content:
+            file_hash = None
+        elif content is None:
+            file_hash = hashlib.sha1()
+            with open(file_path, "rb") as file:
+                for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+                    file_hash.update(chunk)
+        else:
+            file_hash = hashlib.sha1(content)
+    except OSError as e:
+        logger.error(f"Error reading file {file_path} in {__name__}: {e}")
+        return None
+    return {
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": file_hash.hexdigest() if file_hash is not None else None
+    }
+
+def has_file_changed(file_path, fingerprint):
+    """
+    Checks if a file has changed since the fingerprint was taken.
+    Only hashes the content if modification time or size differ (e.g. after 'touch' or git checkout).
+    Fingerprints without hash (see get_file_fingerprint) count every change of modification time or size.
+
+    Args:
+        file_path (str): The path to the file.
+        fingerprint (dict): Fingerprint from get_file_fingerprint().
+
+    Returns:
+        bool: True if the content has changed (or the file is missing), otherwise False.
+    """
+    if not fingerprint:
+        return True
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return True
+    if stat.st_mtime_ns == fingerprint["mtime"] and stat.st_size == fingerprint["size"]:
+        return False
+    if fingerprint["hash"] is None:
+        return True
+    current = get_file_fingerprint(file_path)
+    if current is None or current["hash"] != fingerprint["hash"]:
+        return True
+    # Same content, only the modification time moved -> remember the new one to skip hashing next time
+    fingerprint["mtime"] = current["mtime"]
+    return False
+
+
+def write_file_atomic(file_path, content, mode="w", before_replace=None):
+    """
+    Writes content to a file atomically: the content is written to a temporary file in the same
+    directory, which then replaces the target file. Readers never see a half written file.
+
+    Args:
+        file_path (str): The path to the file to be written.
+        content (str, bytes or iterable): The new file content, an iterable of chunks is written chunk by chunk.
+        mode (str): "w" for text or "wb" for binary content.
+        before_replace (callable, optional): Called after the content has been written, right before the 
+            target file is replaced (e.g. to close a memory map of the target file).
+
+    Returns:
+        bool: True if the file was written successfully, otherwise False.
+    """
+    logger = logging.getLogger("file_utils: write_file_atomic")
+    directory = os.path.dirname(os.path.abspath(file_path))
+    temp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(mode, dir=directory, prefix=".tmp_", suffix=os.path.basename(file_path), delete=False) as temp_file:
+            temp_path = temp_file.name
+            if isinstance(content, (str, bytes)):
+                temp_file.write(content)
+            else:
+                temp_file.writelines(content)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, temp_path) # Keep permissions of the original file
+        if before_replace is not None:
+            before_replace()
+        os.replace(temp_path, file_path)
+        return True
+    except OSError as e:
+        logger.error(f"Error writing file {file_path} in {__name__}: {e}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+
+class FileCache:
+    """
+    Process wide LRU cache for objects derived from files (e.g. parsed models and their indexes).
+    Entries are keyed by (path, mtime, size, content hash), so an unchanged file is never parsed twice,
+    no matter how many parser instances ask for it. Least recently used entries are evicted when
+    the number of entries or the summed size of the cached files exceeds the limits.
+
+    Attributes:
+        loader (callable): loader(file_path, content, fingerprint) -> object, content is the raw file content (bytes).
+        max_entries (int): Maximum number of cached files.
+        max_bytes (int): Maximum summed size of the cached files in bytes.
+        read_content (bool): If False the file is not read into memory, the loader gets content=None
+            and has to open the file itself (e.g. memory-mapped STEP files).
+        hash_content (bool): If False entries are keyed by (path, mtime, size) only, the file is not read 
+            to hash it (see get_file_fingerprint).
+    """
+
+    def __init__(self, loader, max_entries=32, max_bytes=256 * 1024 * 1024, read_content=True, hash_content=True):
+        self.logger = logging.getLogger("file_utils: FileCache")
+        self.loader = loader
+        self.read_content = read_content
+        self.hash_content = hash_content
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # (path, mtime, size, hash) -> object
+        self.latest_keys = {} # path -> key of the latest known version of the file
+        self.cached_bytes = 0
+        self.lock = threading.RLock()
+
+    def get(self, file_path):
+        """
+        Returns the cached object for the current content of file_path, loads it if necessary.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            object: Result of the loader or None if the file cannot be read.
+        """
+        path = os.path.abspath(file_path)
+        with self.lock:
+            key = self.latest_keys.get(path)
+            if key in self.entries:
+                fingerprint = {"mtime": key[1], "size": key[2], "hash": key[3]}
+                if not has_file_changed(path, fingerprint):
+                    if fingerprint["mtime"] != key[1]:
+                        # Only touched, same content -> keep the entry under the new modification time
+                        key = self._rekey(key, (path, fingerprint["mtime"], key[2], key[3]))
+                    self.entries.move_to_end(key)
+                    return self.entries[key]
+
+            content = None
+            if self.read_content:
+                try:
+                    with open(path, "rb") as file:
+                        content = file.read()
+                except OSError as e:
+                    self.logger.error(f"Error reading file {path} in {__name__}: {e}")
+                    return None
+            fingerprint = get_file_fingerprint(path, content=content, hash_content=self.hash_content)
+            if fingerprint is None:
+                return None
+            return self.put(path, content, fingerprint)
+
+    def put(self, file_path, content, fingerprint, value=None):
+        """
+        Stores an object for the given file content, e.g. after the file has been written by this program.
+        If no value is provided the loader is called.
+
+        Returns:
+            object: The cached object.
+        """
+        path = os.path.abspath(file_path)
+        key = (path, fingerprint["mtime"], fingerprint["size"], fingerprint["hash"])
+        with self.lock:
+            if key in self.entries and value is None:
+                self.entries.move_to_end(key)
+            else:
+                if value is None:
+                    value = self.loader(path, content, fingerprint)
+                if key not in self.entries:
+                    self.cached_bytes += fingerprint["size"]
+                self.entries[key] = value
+            self.latest_keys[path] = key
+            self._evict()
+            return self.entries[key]
+
+    def get_latest(self, file_path):
+        """
+        Returns the cached object of the latest known version of file_path without checking the file, or None.
+        e.g. for loaders that derive the object of the changed file from the previous one
+        """
+        with self.lock:
+            key = self.latest_keys.get(os.path.abspath(file_path))
+            return self.entries.get(key)
+
+    def invalidate(self, file_path=None):
+        """ Removes all cached versions of file_path (or everything if no path is given) """
+        with self.lock:
+            if file_path is None:
+                self.entries.clear()
+                self.latest_keys.clear()
+                self.cached_bytes = 0
+                return
+            path = os.path.abspath(file_path)
+            for key in [key for key in self.entries if key[0] == path]:
+                self.cached_bytes -= key[2]
+                del self.entries[key]
+            self.latest_keys.pop(path, None)
+
+    def _rekey(self, old_key, new_key):
+        self.entries[new_key] = self.entries.pop(old_key)
+        self.latest_keys[new_key[0]] = new_key
+        return new_key
+
+    def _evict(self):
+        # Never evict the most recently used entry, even if it is bigger than max_bytes
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.cached_bytes > self.max_bytes):
+            key, _ = self.entries.popitem(last=False)
+            self.cached_bytes -= key[2]
+            if self.latest_keys.get(key[0]) == key:
+                del self.latest_keys[key[0]]